@@ -0,0 +1,350 @@
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from extensions import db
+from database import analytics_session
+from models import Report, ReportRollup
+import archive
+
+
+def _as_date(value):
+    """SQLite returns date() results as strings, Postgres as date objects"""
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def _live(source):
+    """Freshness of data read straight from the database"""
+    return {'source': source, 'as_of': datetime.utcnow().isoformat()}
+
+
+class SQLAggregator:
+    """Aggregation engine that pushes report counting down into SQL GROUP BY queries
+
+    Each query runs once on the reports table and once on the archive; the
+    grouped results are summed here, so both keep using their own indexes.
+    """
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+
+    def snapshot(self):
+        """Aggregator to share across the queries of one multi-part report"""
+        return SnapshotAggregator.load(self.session)
+
+    def freshness(self):
+        """Where the numbers come from and how current they are"""
+        return _live('database')
+
+    def _merged(self, build):
+        """{group: count} summed over `build(model)` of every reports table"""
+        totals = {}
+        for model in archive.MODELS:
+            for *group, n in build(model):
+                totals[tuple(group)] = totals.get(tuple(group), 0) + n
+        return totals
+
+    def count_reports(self):
+        """Total number of reports"""
+        return sum(self.session.query(func.count(model.id)).scalar() or 0
+                   for model in archive.MODELS)
+
+    def count_by_query(self, column_name, model=Report):
+        column = getattr(model, column_name)
+        count = func.count(model.id)
+        return (self.session.query(column, count)
+                .filter(column.isnot(None))
+                .group_by(column)
+                .order_by(count.desc(), column))
+
+    def count_by(self, column_name):
+        """Return [(value, count), ...] ordered by count desc, then value"""
+        totals = self._merged(lambda model: self.count_by_query(column_name, model))
+        return sorted(((value, n) for (value,), n in totals.items()),
+                      key=lambda row: (-row[1], row[0]))
+
+    def count_finalized(self):
+        """Number of reports marked as finalized"""
+        return sum(self.session.query(func.count(model.id))
+                   .filter(model.finalized.is_(True))
+                   .scalar() or 0 for model in archive.MODELS)
+
+    def daily_counts_query(self, since, model=Report):
+        day = func.date(model.timestamp)
+        return (self.session.query(day, func.count(model.id))
+                .filter(model.timestamp >= since)
+                .group_by(day)
+                .order_by(day))
+
+    def daily_counts(self, since):
+        """Return [(date, count), ...] for reports submitted on or after `since`"""
+        totals = self._merged(lambda model: self.daily_counts_query(since, model))
+        return sorted((_as_date(d), n) for (d,), n in totals.items())
+
+    def daily_counts_by_type_query(self, since, model=Report):
+        day = func.date(model.timestamp)
+        return (self.session.query(day, model.type, func.count(model.id))
+                .filter(model.timestamp >= since)
+                .group_by(day, model.type)
+                .order_by(day, model.type))
+
+    def daily_counts_by_type(self, since):
+        """Return [(date, type, count), ...] for reports submitted on or after `since`"""
+        totals = self._merged(lambda model: self.daily_counts_by_type_query(since, model))
+        return sorted((_as_date(d), t, n) for (d, t), n in totals.items())
+
+    def bucket_counts_query(self, window, by_type=False, model=Report):
+        dialect = self.session.get_bind().dialect.name
+        columns = [window.bucket_sql(model.timestamp, dialect)]
+        if by_type:
+            columns.append(model.type)
+        return (self.session.query(*columns, func.count(model.id))
+                .filter(model.timestamp >= window.start, model.timestamp < window.end)
+                .group_by(*columns)
+                .order_by(*columns))
+
+    def bucket_counts(self, window, by_type=False):
+        """Return [(bucket, [type,] count), ...] for a TrendWindow, bucketed in SQL"""
+        if self.session.get_bind().dialect.name not in ('sqlite', 'postgresql'):
+            return SnapshotAggregator.load(self.session).bucket_counts(window, by_type)
+        # collect() sums rows of the same bucket
+        return window.collect([row for model in archive.MODELS
+                               for row in self.bucket_counts_query(window, by_type, model)])
+
+
+class SnapshotAggregator:
+    """Aggregation engine over a single in-memory snapshot of the reports table
+
+    The snapshot is loaded with one column-projected query per table (no
+    description or notes) so that every statistic and chart of one request reuses the same scan.
+    """
+
+    COLUMNS = ['type', 'language', 'status', 'finalized', 'timestamp']
+    CATEGORICAL = ['type', 'language', 'status']
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.loaded_at = datetime.utcnow().isoformat()
+
+    @classmethod
+    def load(cls, session=None):
+        """Read the analytic columns of every report, archived ones included"""
+        import pandas as pd
+        session = session or db.session
+        rows = [row for model in archive.MODELS
+                for row in session.query(model.type, model.language, model.status,
+                                         model.finalized, model.timestamp)]
+        frame = pd.DataFrame.from_records(rows, columns=cls.COLUMNS)
+        for column in cls.CATEGORICAL:
+            frame[column] = frame[column].astype('category')
+        frame['finalized'] = frame['finalized'].fillna(False).astype(bool)
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        return cls(frame)
+
+    def snapshot(self):
+        return self
+
+    def freshness(self):
+        return {'source': 'database', 'as_of': self.loaded_at}
+
+    def count_reports(self):
+        """Total number of reports"""
+        return len(self.frame)
+
+    def count_by(self, column_name):
+        """Return [(value, count), ...] ordered by count desc, then value"""
+        counts = self.frame[column_name].value_counts()
+        rows = [(value, int(n)) for value, n in counts.items() if n > 0]
+        return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+    def count_finalized(self):
+        """Number of reports marked as finalized"""
+        return int(self.frame['finalized'].sum())
+
+    def _since(self, since):
+        return self.frame[self.frame['timestamp'] >= since]
+
+    def daily_counts(self, since):
+        """Return [(date, count), ...] for reports submitted on or after `since`"""
+        days = self._since(since)['timestamp'].dt.date
+        return [(d, int(n)) for d, n in days.value_counts().sort_index().items()]
+
+    def daily_counts_by_type(self, since):
+        """Return [(date, type, count), ...] for reports submitted on or after `since`"""
+        frame = self._since(since)
+        counts = (frame.groupby([frame['timestamp'].dt.date, 'type'], observed=True)
+                  .size())
+        return [(d, t, int(n)) for (d, t), n in counts.items() if n > 0]
+
+    def bucket_counts(self, window, by_type=False):
+        """Return [(bucket, [type,] count), ...] for a TrendWindow"""
+        timestamps = self.frame['timestamp']
+        frame = self.frame[(timestamps >= window.start) & (timestamps < window.end)]
+        keys = [window.bucket_frame(frame['timestamp'])]
+        if by_type:
+            keys.append(frame['type'])
+        counts = frame.groupby(keys, observed=True).size()
+        rows = [(*(key if by_type else (key,)), n) for key, n in counts.items()]
+        return window.collect(rows)
+
+
+class RollupAggregator:
+    """Aggregation engine over the per-day report_rollups counters
+
+    The rollup table grows with days x types x languages x statuses rather
+    than with the number of reports, so these queries cost the same however
+    large the reports table gets. Trends have day granularity: the cutoff is
+    applied to whole days.
+    """
+
+    def __init__(self, session=None):
+        self.session = session or db.session
+
+    def snapshot(self):
+        # Rollup queries are already cheap; no need to materialize anything
+        return self
+
+    def freshness(self):
+        # Counters are updated in the same transaction as the reports
+        return _live('rollups')
+
+    def count_reports(self):
+        """Total number of reports"""
+        return self.session.query(func.sum(ReportRollup.count)).scalar() or 0
+
+    def count_by(self, column_name, **filters):
+        """Return [(value, count), ...] ordered by count desc, then value
+
+        Keyword arguments filter on other rollup dimensions, e.g. language='en'.
+        """
+        column = getattr(ReportRollup, column_name)
+        total = func.sum(ReportRollup.count)
+        rows = (self.session.query(column, total)
+                .filter_by(**filters)
+                .group_by(column)
+                .having(total > 0)
+                .order_by(total.desc(), column)
+                .all())
+        return [(value, int(n)) for value, n in rows]
+
+    def count_finalized(self):
+        """Number of reports marked as finalized"""
+        return int(self.session.query(func.sum(ReportRollup.count))
+                   .filter(ReportRollup.finalized.is_(True))
+                   .scalar() or 0)
+
+    def daily_counts(self, since):
+        """Return [(date, count), ...] for the days from `since` on"""
+        total = func.sum(ReportRollup.count)
+        rows = (self.session.query(ReportRollup.day, total)
+                .filter(ReportRollup.day >= since.date())
+                .group_by(ReportRollup.day)
+                .having(total > 0)
+                .order_by(ReportRollup.day)
+                .all())
+        return [(_as_date(d), int(n)) for d, n in rows]
+
+    def daily_counts_by_type(self, since):
+        """Return [(date, type, count), ...] for the days from `since` on"""
+        total = func.sum(ReportRollup.count)
+        rows = (self.session.query(ReportRollup.day, ReportRollup.type, total)
+                .filter(ReportRollup.day >= since.date())
+                .group_by(ReportRollup.day, ReportRollup.type)
+                .having(total > 0)
+                .order_by(ReportRollup.day, ReportRollup.type)
+                .all())
+        return [(_as_date(d), t, int(n)) for d, t, n in rows]
+
+    def bucket_counts(self, window, by_type=False):
+        """Return [(bucket, [type,] count), ...] for a TrendWindow
+
+        Day, week and month buckets of UTC windows are summed from the
+        per-day counters; hourly or non-UTC buckets need the report
+        timestamps and go to the reports table.
+        """
+        dialect = self.session.get_bind().dialect.name
+        if window.granularity == 'hour' or not window.utc_aligned or \
+                dialect not in ('sqlite', 'postgresql'):
+            return SQLAggregator(self.session).bucket_counts(window, by_type)
+        columns = [window.bucket_sql(ReportRollup.day, dialect, convert=False)]
+        if by_type:
+            columns.append(ReportRollup.type)
+        total = func.sum(ReportRollup.count)
+        last_day = (window.end - timedelta(microseconds=1)).date()
+        rows = (self.session.query(*columns, total)
+                .filter(ReportRollup.day >= window.start.date(), ReportRollup.day <= last_day)
+                .group_by(*columns)
+                .having(total > 0)
+                .all())
+        return window.collect(rows)
+
+
+class StoreAggregator:
+    """Aggregation engine over the columnar SnapshotStore
+
+    Trend queries map only the months from their cutoff on; the full-table
+    counts map every partition once and reuse the frame.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._full = None
+        self._checked = False
+
+    def _ensure_fresh(self):
+        if not self._checked:
+            self.store.ensure_fresh()
+            self._checked = True
+
+    def _frame(self, since=None):
+        self._ensure_fresh()
+        if since is None:
+            if self._full is None:
+                self._full = SnapshotAggregator(self.store.load())
+            return self._full
+        return SnapshotAggregator(self.store.load(since))
+
+    def snapshot(self):
+        return self
+
+    def freshness(self):
+        self._ensure_fresh()
+        return self.store.freshness()
+
+    def count_reports(self):
+        return self._frame().count_reports()
+
+    def count_by(self, column_name):
+        return self._frame().count_by(column_name)
+
+    def count_finalized(self):
+        return self._frame().count_finalized()
+
+    def daily_counts(self, since):
+        return self._frame(since).daily_counts(since)
+
+    def daily_counts_by_type(self, since):
+        return self._frame(since).daily_counts_by_type(since)
+
+    def bucket_counts(self, window, by_type=False):
+        return self._frame(window.start).bucket_counts(window, by_type)
+
+
+def default_aggregator():
+    """Rollup counters unless ANALYTICS_USE_ROLLUPS is turned off
+
+    Reads go through the analytics engine when one is configured.
+    """
+    session = analytics_session()
+    if current_app.config.get('ANALYTICS_USE_ROLLUPS', True):
+        return RollupAggregator(session)
+    return SQLAggregator(session)
+
+
+def default_trend_aggregator(fallback):
+    """The columnar snapshot store when it is enabled, else `fallback`"""
+    from extensions import snapshot_store
+    if snapshot_store.enabled:
+        return snapshot_store.aggregator()
+    return fallback
@@ -1,64 +1,52 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-from io import BytesIO
-import base64
-from models import Report
-from sqlalchemy import func
-from extensions import db
-from datetime import datetime, timedelta
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-
-# Set up seaborn if available, fallback gracefully if not
-try:
-    import seaborn as sns
-    sns.set_palette("husl")
-    SEABORN_AVAILABLE = True
-except ImportError:
-    SEABORN_AVAILABLE = False
-
-
+import archive
+import latency
+import locations
+from aggregations import default_aggregator, default_trend_aggregator
+from database import analytics_session
+import charts
+from timebuckets import TrendWindow, DEFAULT_MAX_POINTS
+from flask import current_app
+from metrics import ANALYTICS_SECONDS, instrument_methods
+
+
+@instrument_methods(ANALYTICS_SECONDS)
 class ReportAnalytics:
     """Analytics class for generating statistics and visualizations from incident reports"""
 
-    def __init__(self):
-        # Set style for better looking charts
-        if SEABORN_AVAILABLE:
-            plt.style.use('seaborn-v0_8')
-        else:
-            plt.style.use('default')
+    def __init__(self, aggregator=None, trend_aggregator=None):
+        # Counts and series come from the aggregator; only row-level callers
+        # need get_reports_dataframe()
+        self.aggregator = aggregator or default_aggregator()
+        # Trend series may come from the columnar snapshot store instead
+        self.trend_aggregator = trend_aggregator or (
+            self.aggregator if aggregator else default_trend_aggregator(self.aggregator))
+
+    # Row-level columns of get_reports_dataframe()
+    FRAME_COLUMNS = ['id', 'type', 'description', 'location', 'language', 'status',
+                     'timestamp', 'finalized']
 
     def get_reports_dataframe(self):
-        """Convert reports from database to pandas DataFrame"""
-        reports = Report.query.all()
-        data = []
-        for report in reports:
-            data.append({
-                'id': report.id,
-                'type': report.type,
-                'description': report.description,
-                'location': report.location,
-                'language': report.language,
-                'status': report.status,
-                'timestamp': report.timestamp,
-                'finalized': report.finalized
-            })
-        return pd.DataFrame(data)
+        """Reports and archived reports as a pandas DataFrame (row-level data)"""
+        import pandas as pd
+        session = analytics_session()
+        rows = [row for model in archive.MODELS
+                for row in session.query(*(getattr(model, column)
+                                           for column in self.FRAME_COLUMNS))]
+        return pd.DataFrame.from_records(rows, columns=self.FRAME_COLUMNS)
 
     def get_category_statistics(self):
         """Get statistical summary of reports by category"""
-        df = self.get_reports_dataframe()
-        if df.empty:
+        total_reports = self.aggregator.count_reports()
+        if not total_reports:
             return {
                 'total_reports': 0,
                 'category_counts': {},
                 'category_percentages': {}
             }
 
-        # Count reports by type
-        category_counts = df['type'].value_counts().to_dict()
-        total_reports = len(df)
+        # Count reports by type (ordered by count, so the first is the mode)
+        counts = self.aggregator.count_by('type')
+        category_counts = dict(counts)
         category_percentages = {
             k: round((v/total_reports)*100, 2) for k, v in category_counts.items()}
 
@@ -66,148 +54,213 @@ class ReportAnalytics:
             'total_reports': total_reports,
             'category_counts': category_counts,
             'category_percentages': category_percentages,
-            'most_common_category': df['type'].mode().iloc[0] if not df.empty else None,
-            'unique_categories': df['type'].nunique()
+            'most_common_category': counts[0][0] if counts else None,
+            'unique_categories': len(counts)
         }
 
-    def generate_category_chart(self):
-        """Generate pie chart showing distribution of report categories"""
-        df = self.get_reports_dataframe()
-        if df.empty:
+    def get_category_chart_data(self):
+        """Series behind the category chart: {'labels', 'values'}"""
+        counts = self.aggregator.count_by('type')
+        if not counts:
             return None
+        return {
+            'labels': [k for k, _ in counts],
+            'values': [v for _, v in counts]
+        }
 
-        plt.figure(figsize=(10, 8))
-        category_counts = df['type'].value_counts()
-
-        # Create pie chart
-        plt.pie(category_counts.values, labels=category_counts.index,
-                autopct='%1.1f%%', startangle=90)
-        plt.title('Distribution of Incident Reports by Category',
-                  fontsize=16, fontweight='bold')
+    def _window(self, days, window):
+        if window is not None:
+            return window
+        return TrendWindow.last_days(
+            days, max_points=current_app.config.get('TRENDS_MAX_POINTS', DEFAULT_MAX_POINTS))
+
+    def get_trends_data(self, days=30, window=None):
+        """Series behind the trends chart: report counts per time bucket
+
+        `window` (a TrendWindow) overrides the default of the last N days.
+        Empty buckets are included with a count of 0.
+        """
+        window = self._window(days, window)
+        counts = dict(self.trend_aggregator.bucket_counts(window))
+        if not counts:
+            return None
+        return dict(window.describe(),
+                    dates=window.buckets,
+                    counts=[counts.get(bucket, 0) for bucket in window.buckets])
+
+    def get_category_trends_data(self, days=30, window=None):
+        """Series behind the category trends chart: counts per bucket and category"""
+        window = self._window(days, window)
+        rows = self.trend_aggregator.bucket_counts(window, by_type=True)
+        if not rows:
+            return None
 
-        # Convert to base64 string
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', dpi=300)
-        buffer.seek(0)
-        chart_data = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
+        index = {bucket: i for i, bucket in enumerate(window.buckets)}
+        series = {}
+        for bucket, category, n in rows:
+            series.setdefault(category, [0] * len(index))[index[bucket]] = n
+        return dict(window.describe(),
+                    dates=window.buckets,
+                    series=dict(sorted(series.items())))
+
+    def get_chart_data(self, name, days=30, window=None):
+        """Series behind the named chart ('categories', 'trends' or 'category_trends')"""
+        if name == 'categories':
+            return self.get_category_chart_data()
+        if name == 'trends':
+            return self.get_trends_data(days, window)
+        if name == 'category_trends':
+            return self.get_category_trends_data(days, window)
+        raise ValueError(f'Unknown chart: {name}')
+
+    def get_freshness(self, name=None):
+        """Source and as-of time of the numbers, for one chart or for all of them"""
+        if name in ('trends', 'category_trends'):
+            return self.trend_aggregator.freshness()
+        if name is not None:
+            return self.aggregator.freshness()
+        return {
+            'statistics': self.aggregator.freshness(),
+            'trends': self.trend_aggregator.freshness()
+        }
 
-        return chart_data
+    def get_review_latency(self, since, until, by=(), quantiles=latency.DEFAULT_QUANTILES,
+                           **filters):
+        """Time from submission to finalization of reports finalized in [since, until)
+
+        Percentiles come from merging the per-day sketches of the window, so
+        the cost grows with days and groups, not with reports. `by` breaks
+        them down by 'type' and/or 'language'; keyword arguments filter on
+        either.
+        """
+        groups = latency.sketches(since, until, by, session=analytics_session(), **filters)
+        overall = latency.LatencySketch()
+        for sketch in groups.values():
+            overall.merge(sketch)
+        result = {
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'unit': 'seconds',
+            'relative_accuracy': latency.RELATIVE_ACCURACY,
+            'overall': overall.summary(quantiles)
+        }
+        if by:
+            rows = sorted(groups.items(), key=lambda item: (-item[1].count, item[0]))
+            result['groups'] = [dict(zip(by, group), **sketch.summary(quantiles))
+                                for group, sketch in rows]
+        return result
+
+    def get_hotspots(self, since, until, limit=10, type_=None, cell_precision=None):
+        """Most reported locations (or geohash cells) among reports submitted in [since, until)
+
+        Served from the per-day location counters; see locations.hotspots.
+        """
+        rows = locations.hotspots(since, until, limit, type_=type_,
+                                  cell_precision=cell_precision, session=analytics_session())
+        if cell_precision:
+            hotspots = [{'cell': cell, 'center': locations.geohash_center(cell), 'count': n}
+                        for cell, n in rows]
+        else:
+            hotspots = [{'location': location.label, 'key': location.key,
+                         'geohash': location.geohash, 'count': n} for location, n in rows]
+        return {
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'type': type_,
+            'hotspots': hotspots
+        }
 
-    def generate_trends_chart(self, days=30):
-        """Generate line chart showing report trends over time"""
-        df = self.get_reports_dataframe()
-        if df.empty:
+    def generate_category_chart(self):
+        """Generate pie chart showing distribution of report categories"""
+        data = self.get_category_chart_data()
+        if data is None:
             return None
+        return charts.render_chart_base64('categories', data)
 
-        # Filter to last N days
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        df = df[df['timestamp'] >= cutoff_date]
-
-        if df.empty:
+    def generate_trends_chart(self, days=30, window=None):
+        """Generate line chart showing report trends over time"""
+        data = self.get_trends_data(days, window)
+        if data is None:
             return None
+        return charts.render_chart_base64('trends', data)
 
-        # Group by date
-        df['date'] = df['timestamp'].dt.date
-        daily_counts = df.groupby('date').size()
-
-        plt.figure(figsize=(12, 6))
-        plt.plot(daily_counts.index, daily_counts.values,
-                 marker='o', linewidth=2, markersize=6)
-        plt.title(
-            f'Daily Report Trends (Last {days} days)', fontsize=16, fontweight='bold')
-        plt.xlabel('Date')
-        plt.ylabel('Number of Reports')
-        plt.xticks(rotation=45)
-        plt.grid(True, alpha=0.3)
-
-        # Convert to base64 string
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', dpi=300)
-        buffer.seek(0)
-        chart_data = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-
-        return chart_data
-
-    def generate_category_trends_chart(self, days=30):
+    def generate_category_trends_chart(self, days=30, window=None):
         """Generate stacked bar chart showing category trends over time"""
-        df = self.get_reports_dataframe()
-        if df.empty:
+        data = self.get_category_trends_data(days, window)
+        if data is None:
             return None
+        return charts.render_chart_base64('category_trends', data)
 
-        # Filter to last N days
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        df = df[df['timestamp'] >= cutoff_date]
-
-        if df.empty:
-            return None
-
-        # Group by date and category
-        df['date'] = df['timestamp'].dt.date
-        pivot_df = df.groupby(['date', 'type']).size().unstack(fill_value=0)
-
-        plt.figure(figsize=(14, 8))
-        pivot_df.plot(kind='bar', stacked=True, ax=plt.gca())
-        plt.title(
-            f'Report Categories by Day (Last {days} days)', fontsize=16, fontweight='bold')
-        plt.xlabel('Date')
-        plt.ylabel('Number of Reports')
-        plt.xticks(rotation=45)
-        plt.legend(title='Category', bbox_to_anchor=(
-            1.05, 1), loc='upper left')
-
-        # Convert to base64 string
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', dpi=300)
-        buffer.seek(0)
-        chart_data = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-
-        return chart_data
+    def get_dashboard_chart_data(self, days=30, window=None):
+        """Series behind the dashboard charts: {chart name: series or None without data}"""
+        return {
+            'categories': self.get_category_chart_data(),
+            'trends': self.get_trends_data(days, window),
+            'category_trends': self.get_category_trends_data(days, window)
+        }
 
     def get_language_statistics(self):
         """Get statistics about reports by language"""
-        df = self.get_reports_dataframe()
-        if df.empty:
+        total = self.aggregator.count_reports()
+        if not total:
             return {}
 
-        language_counts = df['language'].value_counts().to_dict()
-        total = len(df)
+        counts = self.aggregator.count_by('language')
+        language_counts = dict(counts)
         language_percentages = {k: round((v/total)*100, 2)
                                 for k, v in language_counts.items()}
 
         return {
             'language_counts': language_counts,
             'language_percentages': language_percentages,
-            'most_common_language': df['language'].mode().iloc[0] if not df.empty else None
+            'most_common_language': counts[0][0] if counts else None
         }
 
     def get_status_statistics(self):
         """Get statistics about report status"""
-        df = self.get_reports_dataframe()
-        if df.empty:
+        total = self.aggregator.count_reports()
+        if not total:
             return {}
 
-        status_counts = df['status'].value_counts().to_dict()
-        total = len(df)
+        status_counts = dict(self.aggregator.count_by('status'))
         status_percentages = {k: round((v/total)*100, 2)
                               for k, v in status_counts.items()}
 
         return {
             'status_counts': status_counts,
             'status_percentages': status_percentages,
-            'finalized_count': df['finalized'].sum(),
-            'pending_count': len(df[df['status'] == 'pending'])
+            'finalized_count': self.aggregator.count_finalized(),
+            'pending_count': status_counts.get('pending', 0)
         }
 
-    def generate_comprehensive_report(self):
-        """Generate a comprehensive analytics report"""
-        return {
-            'category_stats': self.get_category_statistics(),
-            'language_stats': self.get_language_statistics(),
-            'status_stats': self.get_status_statistics(),
-            'category_chart': self.generate_category_chart(),
-            'trends_chart': self.generate_trends_chart(),
-            'category_trends_chart': self.generate_category_trends_chart()
+    def generate_comprehensive_report(self, chart_data=False, include_charts=True):
+        """Generate a comprehensive analytics report
+
+        All statistics and charts are computed from one snapshot of the
+        aggregator (for the reports table, a single scan). With
+        chart_data=True the report carries the chart series under
+        'chart_data' instead of base64 images, for rendering on a
+        ChartRenderPool; with include_charts=False only the statistics are
+        returned.
+        """
+        aggregator = self.aggregator.snapshot()
+        trend_aggregator = aggregator if self.trend_aggregator is self.aggregator \
+            else self.trend_aggregator.snapshot()
+        snapshot = ReportAnalytics(aggregator=aggregator, trend_aggregator=trend_aggregator)
+        report = {
+            'category_stats': snapshot.get_category_statistics(),
+            'language_stats': snapshot.get_language_statistics(),
+            'status_stats': snapshot.get_status_statistics(),
+            'freshness': snapshot.get_freshness()
         }
+        if not include_charts:
+            return report
+        if chart_data:
+            report['chart_data'] = snapshot.get_dashboard_chart_data()
+        else:
+            report.update({
+                'category_chart': snapshot.generate_category_chart(),
+                'trends_chart': snapshot.generate_trends_chart(),
+                'category_trends_chart': snapshot.generate_category_trends_chart()
+            })
+        return report
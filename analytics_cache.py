@@ -0,0 +1,264 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_MISSING = object()
+
+# Lookups keep their counters and access times in process and write them
+# to the cache file after this many lookups or seconds, or with the next set
+_FLUSH_LOOKUPS = 100
+_FLUSH_SECONDS = 5
+
+# Caches initialised in this process; all of them are invalidated on commit
+_caches = set()
+
+
+def mark_reports_changed(session):
+    """Flag the session so the data version is bumped once it commits"""
+    session.info['reports_changed'] = True
+
+
+class AnalyticsCache:
+    """Versioned cache for analytics results and rendered charts
+
+    Entries live in a small SQLite file so that every worker process on the
+    host shares them. Each entry is tagged with the data version it was
+    computed from; the version is bumped whenever a write to the reports
+    table commits, which invalidates every older entry at once. Entries also
+    expire after a TTL and the least recently used ones are evicted when the
+    entry or byte limits are exceeded.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.enabled = False
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._touched = {}
+        self._lookups = 0
+        self._flushed_at = time.monotonic()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ANALYTICS_CACHE_ENABLED', True)
+        self.path = app.config.get('ANALYTICS_CACHE_PATH') or \
+            os.path.join(app.instance_path, 'analytics_cache.db')
+        self.ttl = app.config.get('ANALYTICS_CACHE_TTL', 300)
+        self.max_entries = app.config.get('ANALYTICS_CACHE_MAX_ENTRIES', 256)
+        self.max_bytes = app.config.get('ANALYTICS_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        app.extensions['analytics_cache'] = self
+
+        if not event.contains(Session, 'after_flush', _track_report_writes):
+            event.listen(Session, 'after_flush', _track_report_writes)
+            event.listen(Session, 'after_commit', _bump_after_commit)
+            event.listen(Session, 'after_rollback', _clear_after_rollback)
+        _caches.add(self)
+
+    def _connect(self):
+        # One connection per thread and process; sqlite3 connections must
+        # not be shared across threads or survive a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at
+                ON cache_entries (accessed_at);
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_meta (name, value) VALUES
+                ('data_version', 0), ('hits', 0), ('misses', 0),
+                ('evictions', 0), ('expirations', 0);
+        ''')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _incr(conn, name, amount=1):
+        conn.execute('UPDATE cache_meta SET value = value + ? WHERE name = ?',
+                     (amount, name))
+
+    def data_version(self):
+        """Current data version of the reports table"""
+        row = self._connect().execute(
+            "SELECT value FROM cache_meta WHERE name = 'data_version'").fetchone()
+        return row[0]
+
+    def bump_version(self):
+        """Invalidate every cached entry by moving to a new data version"""
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._incr(conn, 'data_version')
+            # Entries from older versions can never be hit again
+            conn.execute('DELETE FROM cache_entries WHERE version < '
+                         "(SELECT value FROM cache_meta WHERE name = 'data_version')")
+
+    def get(self, key, default=None):
+        """Return the cached value for `key` at the current data version
+
+        A plain read; expired entries are left for the next set or eviction
+        to replace.
+        """
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT e.value, e.created_at FROM cache_entries e, cache_meta m '
+            "WHERE e.key = ? AND m.name = 'data_version' AND e.version = m.value",
+            (key,)).fetchone()
+        if row is None:
+            self._record(conn, 'misses')
+            return default
+        if self.ttl and now - row[1] > self.ttl:
+            self._record(conn, 'expirations', 'misses')
+            return default
+        self._record(conn, 'hits', touched=(key, now))
+        return pickle.loads(row[0])
+
+    def _record(self, conn, *counters, touched=None):
+        """Count a lookup in process, flushing the batch when it is due"""
+        with self._pending_lock:
+            for name in counters:
+                self._pending[name] = self._pending.get(name, 0) + 1
+            if touched is not None:
+                self._touched[touched[0]] = touched[1]
+            self._lookups += 1
+            due = (self._lookups >= _FLUSH_LOOKUPS
+                   or time.monotonic() - self._flushed_at >= _FLUSH_SECONDS)
+        if due:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._write_pending(conn)
+
+    def _write_pending(self, conn):
+        """Apply the batched counters and access times in the caller's transaction"""
+        with self._pending_lock:
+            pending, touched = self._pending, self._touched
+            self._pending, self._touched = {}, {}
+            self._lookups = 0
+            self._flushed_at = time.monotonic()
+        for name, amount in pending.items():
+            self._incr(conn, name, amount)
+        if touched:
+            conn.executemany(
+                'UPDATE cache_entries SET accessed_at = MAX(accessed_at, ?) WHERE key = ?',
+                [(at, key) for key, at in touched.items()])
+
+    def set(self, key, value, version=None):
+        """Store `value` under `key` for the given (or current) data version"""
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            current = conn.execute(
+                "SELECT value FROM cache_meta WHERE name = 'data_version'").fetchone()[0]
+            if version is not None and version != current:
+                # The data changed while the value was being computed
+                return
+            self._write_pending(conn)
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries '
+                '(key, version, value, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, current, payload, len(payload), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the size limits hold"""
+        count, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries').fetchone()
+        evicted = 0
+        if count > self.max_entries or total > self.max_bytes:
+            rows = conn.execute(
+                'SELECT key, size FROM cache_entries ORDER BY accessed_at').fetchall()
+            for key, size in rows:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                count -= 1
+                total -= size
+                evicted += 1
+        if evicted:
+            self._incr(conn, 'evictions', evicted)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss"""
+        if not self.enabled:
+            return compute()
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            # Tag the result with the version it was computed from so that a
+            # concurrent write does not leave a stale entry behind
+            version = self.data_version()
+            value = compute()
+            self.set(key, value, version=version)
+        return value
+
+    def clear(self):
+        """Remove every entry but keep the counters"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM cache_entries')
+
+    def stats(self):
+        """Hit/miss/eviction counters shared by all worker processes
+
+        Other processes' counters can lag by up to one flush batch.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._write_pending(conn)
+        stats = dict(conn.execute('SELECT name, value FROM cache_meta').fetchall())
+        count, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries').fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': count,
+            'bytes': total,
+            'hit_ratio': round(stats['hits'] / lookups, 4) if lookups else None,
+            'enabled': self.enabled
+        })
+        return stats
+
+
+def _track_report_writes(session, flush_context):
+    from models import Report
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Report):
+            mark_reports_changed(session)
+            return
+
+
+def _bump_after_commit(session):
+    if session.info.pop('reports_changed', False):
+        for cache in _caches:
+            if cache.enabled:
+                cache.bump_version()
+
+
+def _clear_after_rollback(session):
+    session.info.pop('reports_changed', None)
@@ -1,7 +1,9 @@
 from flask import Flask, request
 from config import Config
-from extensions import db, migrate, cors
-from routes import reports_bp
+from extensions import db, migrate, cors, analytics_cache, chart_pool, write_buffer, \
+    snapshot_store, metrics, event_broker, static_assets
+from routes import reports_bp, api_bp
+from database import init_db
 import datetime
 
 
@@ -9,11 +11,10 @@ import datetime
 
 
 def create_app():
-    # Serve the React build static files
+    # The React build is served by static_assets (see serve_react)
     app = Flask(
         __name__,
-        static_folder="client/build",
-        static_url_path="",
+        static_folder=None,
         template_folder="Templates"
     )
     app.config.from_object(Config)
@@ -21,10 +22,22 @@ def create_app():
     app.config['SECRET_KEY'] = 'equilink-secret-key'
 
     # Initialize extensions
-    db.init_app(app)
+    # Engine options, SQLite pragmas and the optional analytics engine
+    init_db(app)
     migrate.init_app(app, db)
     cors.init_app(app)
+    analytics_cache.init_app(app)
+    chart_pool.init_app(app)
+    write_buffer.init_app(app)
+    snapshot_store.init_app(app)
+    # Report counter deltas pushed to /reports/events subscribers
+    event_broker.init_app(app)
+    # Precompressed, cache-friendly React build files
+    static_assets.init_app(app)
+    # Latency histograms, per-request SQL counts and /metrics
+    metrics.init_app(app)
     app.register_blueprint(reports_bp, url_prefix='/reports')
+    app.register_blueprint(api_bp, url_prefix='/api')
     # Catch-all route to serve React app
 
     # Add a health check endpoint for the React app to check connectivity
@@ -37,7 +50,8 @@ def create_app():
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve_react(path):
-        return app.send_static_file('index.html')
+        # Build files, or the app shell for client-side routes
+        return static_assets.serve(path)
     return app
 
 
@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime, timedelta
+from flask import abort
+from sqlalchemy import delete, insert, select, tuple_
+from analytics_cache import mark_reports_changed
+from extensions import db
+from filelocks import try_lock
+from models import ArchivedReport, Report
+import search
+
+# Columns moved with each report
+COLUMNS = ('id', 'timestamp', 'type', 'description', 'location', 'language', 'status',
+           'finalized', 'notes', 'client_id', 'updated_at', 'finalized_at', 'location_id')
+
+# Every table holding reports, hot first: most lookups stop there
+MODELS = (Report, ArchivedReport)
+
+
+# Reading both tables
+
+def get(report_id, session=None):
+    """A report by id, from the reports table or the archive"""
+    session = session or db.session
+    return session.get(Report, report_id) or session.get(ArchivedReport, report_id)
+
+
+def get_or_404(report_id):
+    report = get(report_id)
+    if report is None:
+        abort(404)
+    return report
+
+
+def get_many(ids, session=None, columns=None):
+    """{id: report} for the ids found in either table
+
+    With `columns` (names), rows of those columns are returned instead of
+    model instances.
+    """
+    session = session or db.session
+    found = {}
+    for model in MODELS:
+        missing = [report_id for report_id in ids if report_id not in found]
+        if not missing:
+            break
+        if columns:
+            query = session.query(*(getattr(model, column) for column in columns))
+        else:
+            query = session.query(model)
+        found.update((row.id, row) for row in query.filter(model.id.in_(missing)))
+    return found
+
+
+def find_client_ids(client_ids, session=None):
+    """{client id: report id} for the client ids stored in either table"""
+    session = session or db.session
+    found = {}
+    for model in MODELS:
+        missing = [client_id for client_id in client_ids if client_id not in found]
+        if not missing:
+            break
+        found.update(session.query(model.client_id, model.id).filter(model.client_id.in_(missing)))
+    return found
+
+
+def iter_merged(statements, key, session, chunk_size=5000):
+    """Yield lists of rows of several statements, merged in `key` order
+
+    Each statement must already be ordered by `key`; each is streamed with
+    a server-side cursor where the driver supports one, so merging costs no
+    sort and holds one chunk per statement in memory.
+    """
+    results = [session.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+               for stmt in statements]
+    rows = heapq.merge(*results, key=key)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield chunk
+
+
+# Moving reports
+
+def cutoff(days):
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def candidates_query(before, after=None, limit=500):
+    """Keys of finalized reports submitted and last changed before `before`
+
+    Walks the (timestamp, id) index from the oldest report, continuing
+    after the `after` key.
+    """
+    stmt = select(Report.timestamp, Report.id).where(
+        Report.timestamp < before, Report.finalized.is_(True), Report.updated_at < before)
+    if after is not None:
+        stmt = stmt.where(tuple_(Report.timestamp, Report.id) > after)
+    return stmt.order_by(Report.timestamp, Report.id).limit(limit)
+
+
+def move(ids, before, session=None):
+    """Move reports into the archive in one transaction; returns how many moved
+
+    Reports changed since they were picked (no longer finalized before
+    `before`) stay where they are.
+    """
+    session = session or db.session
+    rows = session.execute(
+        delete(Report)
+        .where(Report.id.in_(ids), Report.finalized.is_(True), Report.updated_at < before)
+        .returning(*(getattr(Report, column) for column in COLUMNS))).all()
+    if rows:
+        now = datetime.utcnow()
+        session.execute(insert(ArchivedReport),
+                        [dict(row._mapping, archived_at=now) for row in rows])
+        # The reports' search triggers dropped them; the archive has its own index
+        search.index_archived([row._mapping for row in rows], session)
+        # Core deletes do not pass through the session's flush tracking
+        mark_reports_changed(session)
+    session.commit()
+    return len(rows)
+
+
+def _lock(directory):
+    os.makedirs(directory, exist_ok=True)
+    lock = open(os.path.join(directory, '.archive.lock'), 'w')
+    if not try_lock(lock):
+        lock.close()
+        return None
+    return lock
+
+
+def run(days, batch_size=500, pause=0.05, lock_dir=None, session=None):
+    """Archive finalized reports older than `days`; returns how many moved
+
+    Each batch is picked in a read-only transaction and moved in a short
+    write transaction of its own, with a pause in between so that report
+    submissions never wait long for the write lock. An interrupted run
+    loses nothing and the next one carries on. Returns None when another
+    process is archiving.
+    """
+    session = session or db.session
+    lock = _lock(lock_dir) if lock_dir else None
+    if lock_dir and lock is None:
+        return None
+    try:
+        before = cutoff(days)
+        moved, after = 0, None
+        while True:
+            keys = session.execute(candidates_query(before, after, batch_size)).all()
+            session.rollback()
+            if not keys:
+                return moved
+            after = tuple(keys[-1])
+            moved += move([report_id for _, report_id in keys], before, session)
+            if len(keys) < batch_size:
+                return moved
+            time.sleep(pause)
+    finally:
+        if lock is not None:
+            lock.close()
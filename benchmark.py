@@ -0,0 +1,809 @@
+"""Performance checks for the report backend
+
+Each check runs against a throwaway SQLite database and prints its results
+as JSON, e.g.
+
+    python benchmark.py writes --reports 2000 --threads 8
+    python benchmark.py concurrency --seconds 10
+    python benchmark.py export --rows 1000000
+    python benchmark.py search --rows 1000000
+    python benchmark.py duplicates --rows 200000
+    python benchmark.py startup
+    python benchmark.py load --rows 50000 --requests 200 --threads 8 --output before.json
+    python benchmark.py load --baseline before.json
+    python benchmark.py queries --rows 5000
+
+Checks that report a pass/fail outcome exit with status 1 on failure.
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+
+def _create_app(tmpdir):
+    """Import the app against a fresh database inside `tmpdir`"""
+    # Config reads the environment on import
+    os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+    os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(tmpdir, 'cache.db')
+    os.environ['CHART_ARTIFACT_DIR'] = os.path.join(tmpdir, 'charts')
+    os.environ['REPORT_SPILL_DIR'] = os.path.join(tmpdir, 'spill')
+    from app import app
+    from flask_migrate import upgrade
+    # Migrate rather than create_all, so triggers and search tables exist
+    with app.app_context():
+        upgrade()
+    return app
+
+
+# Report text: a few incident words, then a long tail of made-up words, drawn
+# with Zipf frequencies like natural language
+_WORDS = ('the a was at near and of on in to bus stop station street park road '
+          'market school office hospital night morning evening harassed followed '
+          'threatened shouted pushed touched stared groped robbed attacked refused '
+          'denied insulted light broken dark crowded unsafe police guard driver '
+          'conductor man men woman group stranger colleague manager teacher '
+          'phone bag money camera report again twice every day week').split()
+_SYLLABLES = ('ka', 'ri', 'to', 'ne', 'mu', 'sa', 'lo', 'vi', 'de', 'pa', 'go', 'zu')
+VOCABULARY = _WORDS + [''.join(word) for word in itertools.islice(
+    itertools.product(_SYLLABLES, repeat=4), 5000 - len(_WORDS))]
+_CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def _descriptions(count, seed=0):
+    """`count` synthetic report descriptions of 5 to 40 words"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ' '.join(rng.choices(VOCABULARY, cum_weights=_CUM_WEIGHTS, k=rng.randint(5, 40)))
+
+
+def _uniform_rows(count):
+    """Reports cycling through a few types, languages and statuses over the last year"""
+    types = ('harassment', 'safety', 'discrimination', 'other')
+    languages = ('en', 'hi', 'ta', 'te')
+    statuses = ('pending', 'approved', 'rejected')
+    now = datetime.utcnow()
+    descriptions = _descriptions(count, seed=count)
+    for i in range(count):
+        status = statuses[i % 3]
+        yield {
+            'id': str(uuid.uuid4()),
+            'timestamp': now - timedelta(minutes=i % (365 * 24 * 60)),
+            'type': types[i % 4],
+            'description': next(descriptions),
+            'location': f'Block {i % 97}',
+            'language': languages[i % 4],
+            'status': status,
+            'finalized': status != 'pending',
+        }
+
+
+def _seed_reports(app, count, chunk_size=10000, rows=None):
+    """Bulk insert `count` synthetic reports (by default from _uniform_rows)"""
+    from extensions import db
+    from models import Report
+    rows = rows if rows is not None else _uniform_rows(count)
+    with app.app_context():
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            db.session.execute(db.insert(Report), chunk)
+            db.session.commit()
+
+
+def _submit(app, count, threads):
+    """POST `count` reports from `threads` concurrent clients
+
+    Returns (seconds, reports sent, error status codes).
+    """
+    per_thread = count // threads
+    errors = []
+
+    def client(worker):
+        http = app.test_client()
+        for i in range(per_thread):
+            response = http.post('/reports', json={
+                'type': 'other', 'description': f'benchmark {worker}-{i}',
+                'location': 'bench', 'language': 'en'})
+            if response.status_code not in (200, 201, 202):
+                errors.append(response.status_code)
+
+    workers = [threading.Thread(target=client, args=(w,)) for w in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, per_thread * threads, errors
+
+
+def _stored_reports(app):
+    from extensions import db
+    from models import Report
+    with app.app_context():
+        return db.session.query(Report).count()
+
+
+def _count_suppressed(app):
+    import duplicates
+    with app.app_context():
+        return duplicates.count_suppressed()
+
+
+def bench_writes(args, app):
+    """Per-request commit vs the write-behind buffer"""
+    from extensions import write_buffer
+    results = {}
+    for mode, write_behind in (('per_request_commit', False), ('write_behind', True)):
+        before = _stored_reports(app)
+        write_buffer.enabled = write_behind
+        elapsed, sent, errors = _submit(app, args.reports, args.threads)
+        drain_start = time.perf_counter()
+        write_buffer.flush(timeout=60)
+        results[mode] = {
+            'reports': sent,
+            'seconds': round(elapsed, 3),
+            'reports_per_second': round(sent / elapsed, 1),
+            'drain_seconds': round(time.perf_counter() - drain_start, 3),
+            'stored': _stored_reports(app) - before,
+            'errors': len(errors),
+        }
+    write_buffer.enabled = False
+    results['speedup'] = round(results['write_behind']['reports_per_second'] /
+                               results['per_request_commit']['reports_per_second'], 2)
+    return results
+
+
+def bench_concurrency(args, app):
+    """Parallel report writes and dashboard reads must not hit lock errors"""
+    from sqlalchemy.exc import OperationalError
+    from extensions import analytics_cache
+    # Every read has to reach the database
+    analytics_cache.enabled = False
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    deadline = time.monotonic() + args.seconds
+    counts = {'writes': 0, 'reads': 0}
+    lock_errors = []
+    other_errors = []
+
+    def run(kind, request):
+        http = app.test_client()
+        while time.monotonic() < deadline:
+            try:
+                response = request(http)
+                if response.status_code >= 500:
+                    other_errors.append(f'{kind}: HTTP {response.status_code}')
+                counts[kind] += 1
+            except OperationalError as e:
+                (lock_errors if 'locked' in str(e) else other_errors).append(f'{kind}: {e.orig}')
+
+    def write(http):
+        return http.post('/reports', json={'type': 'safety', 'description': 'concurrency',
+                                           'location': 'bench', 'language': 'en'})
+
+    def read(http):
+        http.get('/reports/analytics/stats?charts=none')
+        return http.get('/api/reports?include_counts=1&limit=50')
+
+    workers = [threading.Thread(target=run, args=('writes', write)) for _ in range(args.threads)]
+    workers += [threading.Thread(target=run, args=('reads', read)) for _ in range(args.threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    result = {
+        'seconds': args.seconds,
+        'threads': {'writers': args.threads, 'readers': args.threads},
+        'requests': counts,
+        'lock_errors': len(lock_errors),
+        'other_errors': len(other_errors),
+        'first_errors': (lock_errors + other_errors)[:5],
+        'passed': not lock_errors and not other_errors,
+    }
+    return result
+
+
+def bench_export(args, app):
+    """Peak memory of streaming exports must not grow with the export size"""
+    import export
+    formats = ['csv', 'ndjson'] + (['parquet'] if export.parquet_available() else [])
+    sizes = (args.rows // 10, args.rows)
+    results = {'rows': list(sizes), 'formats': {}}
+    seeded = 0
+    for size in sizes:
+        _seed_reports(app, size - seeded)
+        seeded = size
+        for fmt in formats:
+            with app.app_context():
+                gc.collect()
+                tracemalloc.start()
+                start = time.perf_counter()
+                written = sum(len(chunk) for chunk in export.export_reports(fmt, {}))
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            results['formats'].setdefault(fmt, []).append({
+                'rows': size,
+                'seconds': round(elapsed, 2),
+                'bytes': written,
+                'peak_mib': round(peak / 2 ** 20, 2),
+            })
+    # Ten times the rows may not need more than 1.5x the memory
+    results['passed'] = all(small['peak_mib'] * 1.5 >= large['peak_mib']
+                            for small, large in results['formats'].values())
+    return results
+
+
+def bench_search(args, app):
+    """Ranked full-text search over --rows reports must answer within 100 ms
+
+    Queries cover terms from the head to the tail of the word frequency
+    distribution, phrases, prefixes, OR, exclusions and a language filter.
+    Each runs a first page of 50 results with snippets.
+    """
+    import search
+    from extensions import db
+    _seed_reports(app, args.rows)
+    words = VOCABULARY
+    queries = [words[12], words[40], words[300], words[3000],
+               f'{words[15]} {words[30]}', f'"{words[11]} {words[12]}"', 'harass*',
+               f'{words[100]} OR {words[200]}', f'{words[25]} -{words[40]}']
+    timings = []
+    results = {'rows': args.rows, 'queries': []}
+    with app.app_context():
+        for q, language in [(q, None) for q in queries] + [(queries[0], 'hi')]:
+            matches = db.session.execute(
+                db.text('SELECT count(*) FROM report_search WHERE report_search MATCH :match'),
+                {'match': search.fts5_query(q, language)}).scalar()
+            runs = []
+            for _ in range(5):
+                start = time.perf_counter()
+                hits, _ = search.search_reports(q, language, limit=50)
+                runs.append((time.perf_counter() - start) * 1000)
+            timings.extend(runs)
+            results['queries'].append({'q': q, 'language': language, 'matches': matches,
+                                       'hits': len(hits), 'median_ms': round(sorted(runs)[2], 1)})
+    timings.sort()
+    results['p50_ms'] = round(timings[len(timings) // 2], 1)
+    results['p95_ms'] = round(timings[int(len(timings) * 0.95)], 1)
+    results['passed'] = results['p95_ms'] < 100
+    return results
+
+
+def bench_duplicates(args, app):
+    """Duplicate lookups at submission must not slow down with the table size
+
+    At --rows/10 and --rows reports (signed by the backfill job), times
+    indexing 500 edited copies of stored reports and 500 new texts one by
+    one, as create_report does, and measures how many copies are found.
+    """
+    import duplicates
+    from sqlalchemy import func
+    from extensions import db
+    from models import Report
+    results = {'sizes': []}
+    seeded = 0
+    for size in (args.rows // 10, args.rows):
+        _seed_reports(app, size - seeded)
+        seeded = size
+        with app.app_context():
+            start = time.perf_counter()
+            duplicates.backfill()
+            backfill_seconds = time.perf_counter() - start
+
+            # Copies with one word replaced, of texts long enough to stay
+            # above the similarity threshold
+            rng = random.Random(size)
+            stored = (db.session.query(Report.id, Report.description)
+                      .filter(func.length(Report.description) >= 120)
+                      .order_by(func.random()).limit(500).all())
+            copies = []
+            for report_id, description in stored:
+                words = description.split()
+                words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+                copies.append((report_id, ' '.join(words)))
+            fresh = list(_descriptions(500, seed=size + 1))
+
+            timings, found, false_positives = [], 0, 0
+            for text, original in [(t, rid) for rid, t in copies] + [(t, None) for t in fresh]:
+                start = time.perf_counter()
+                match = duplicates.index_reports([{'id': str(uuid.uuid4()), 'description': text}])
+                timings.append((time.perf_counter() - start) * 1000)
+                if original and match:
+                    found += 1
+                elif not original and match:
+                    false_positives += 1
+            db.session.rollback()
+        timings.sort()
+        results['sizes'].append({
+            'rows': size,
+            'backfill_seconds': round(backfill_seconds, 1),
+            'suppressed': _count_suppressed(app),
+            'lookup_p50_ms': round(timings[len(timings) // 2], 2),
+            'lookup_p95_ms': round(timings[int(len(timings) * 0.95)], 2),
+            'copies_found': found / len(copies),
+            'new_texts_flagged': false_positives / len(fresh),
+        })
+    small, large = results['sizes']
+    # Ten times the reports may not make a lookup more than twice as slow
+    results['passed'] = large['lookup_p95_ms'] <= 2 * small['lookup_p95_ms'] + 1 and \
+        large['copies_found'] >= 0.9
+    return results
+
+
+# Realistic report mix for the load check: the report form's incident types
+# and languages with skewed frequencies, more reports in recent weeks and
+# at commuting hours, older reports more likely reviewed
+REPORT_TYPES = {
+    'sexualHarassment': 18, 'verbalAbuse': 14, 'unsafeConditions': 11, 'bullying': 9,
+    'physicalViolence': 7, 'genderDiscrimination': 7, 'policyViolation': 5,
+    'environmentalHazards': 4, 'retaliation': 4, 'equipmentFailure': 4,
+    'raceDiscrimination': 3, 'ageDiscrimination': 3, 'ethicsViolation': 3,
+    'religionDiscrimination': 2, 'disabilityDiscrimination': 2, 'fraud': 2, 'dataPrivacy': 2,
+}
+PHRASES = {
+    'en': ['I was harassed near the bus stop', 'my manager made inappropriate comments',
+           'the lights in the parking lot are broken', 'a colleague keeps shouting at me',
+           'someone followed me from the station', 'the fire exit is blocked again',
+           'I was passed over for promotion because of my age',
+           'there is exposed wiring in the workshop'],
+    'hi': ['बस स्टॉप के पास मुझे परेशान किया गया', 'मेरे मैनेजर ने अनुचित टिप्पणी की',
+           'पार्किंग की बत्तियाँ खराब हैं', 'एक सहकर्मी मुझ पर चिल्लाता है',
+           'स्टेशन से किसी ने मेरा पीछा किया', 'आपातकालीन निकास बंद है'],
+    'es': ['me acosaron cerca de la parada de autobús', 'mi jefe hizo comentarios inapropiados',
+           'las luces del estacionamiento están rotas', 'un compañero me grita todos los días',
+           'alguien me siguió desde la estación', 'la salida de emergencia está bloqueada'],
+    'ta': ['பேருந்து நிறுத்தம் அருகே என்னை துன்புறுத்தினார்கள்',
+           'என் மேலாளர் தகாத கருத்துகள் கூறினார்', 'வாகன நிறுத்துமிட விளக்குகள் உடைந்துள்ளன',
+           'ஒரு சக ஊழியர் என்னைப் பார்த்து கத்துகிறார்'],
+    'fr': ["j'ai été harcelée près de l'arrêt de bus", 'mon responsable a fait des remarques déplacées',
+           "l'éclairage du parking est en panne", 'un collègue me crie dessus',
+           "quelqu'un m'a suivie depuis la gare", 'la sortie de secours est bloquée'],
+    'te': ['బస్ స్టాప్ దగ్గర నన్ను వేధించారు', 'నా మేనేజర్ అనుచిత వ్యాఖ్యలు చేశారు',
+           'పార్కింగ్ లైట్లు పనిచేయడం లేదు'],
+    'ml': ['ബസ് സ്റ്റോപ്പിന് സമീപം എന്നെ ശല്യപ്പെടുത്തി',
+           'എന്റെ മാനേജർ അനുചിതമായ അഭിപ്രായങ്ങൾ പറഞ്ഞു', 'പാർക്കിംഗിലെ ലൈറ്റുകൾ കേടാണ്'],
+    'kn': ['ಬಸ್ ನಿಲ್ದಾಣದ ಬಳಿ ನನಗೆ ಕಿರುಕುಳ ನೀಡಲಾಯಿತು', 'ನನ್ನ ಮ್ಯಾನೇಜರ್ ಅನುಚಿತ ಟೀಕೆಗಳನ್ನು ಮಾಡಿದರು',
+           'ಪಾರ್ಕಿಂಗ್ ದೀಪಗಳು ಕೆಟ್ಟಿವೆ'],
+}
+LANGUAGE_WEIGHTS = {'en': 45, 'hi': 15, 'es': 10, 'ta': 8, 'fr': 6, 'te': 6, 'ml': 5, 'kn': 5}
+LOCATIONS = ['Central Station', 'Main Street bus stop', 'Office tower B', 'City Hospital',
+             'North Market', 'Riverside Park', 'Warehouse 3', 'Metro Line 2', 'Tech Park gate',
+             'University campus', 'Airport road', 'Old town square'] + \
+    [f'Block {n}' for n in range(1, 41)]
+# Relative report volume per hour of the day
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 10, 9, 6, 5, 5, 5, 5, 6, 8, 10, 10, 8, 6, 4, 3, 2]
+
+
+def _report_fields(rng):
+    """Form fields of one synthetic submission"""
+    language = rng.choices(list(LANGUAGE_WEIGHTS), weights=list(LANGUAGE_WEIGHTS.values()))[0]
+    phrases = rng.sample(PHRASES[language], rng.randint(1, min(3, len(PHRASES[language]))))
+    # Names, places and other details: made-up words with a long tail
+    details = rng.choices(VOCABULARY, cum_weights=_CUM_WEIGHTS, k=rng.randint(2, 12))
+    return {
+        'type': rng.choices(list(REPORT_TYPES), weights=list(REPORT_TYPES.values()))[0],
+        'description': '. '.join(phrases) + '. ' + ' '.join(details),
+        'location': rng.choices(LOCATIONS, cum_weights=_CUM_WEIGHTS[:len(LOCATIONS)])[0],
+        'language': language,
+    }
+
+
+def _realistic_rows(count, days=365, seed=0):
+    """Reports with the REPORT_TYPES / LANGUAGE_WEIGHTS mix over the last `days` days"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for _ in range(count):
+        # Volume grows linearly towards today
+        age_days = int(days * (1 - rng.random() ** 0.5))
+        timestamp = (now - timedelta(days=age_days)).replace(
+            hour=rng.choices(range(24), weights=HOUR_WEIGHTS)[0],
+            minute=rng.randrange(60), second=rng.randrange(60))
+        # Recent reports are mostly still waiting for review
+        if rng.random() < (0.8 if age_days < 7 else 0.15):
+            status = 'pending'
+        else:
+            status = 'approved' if rng.random() < 0.75 else 'rejected'
+        yield dict(_report_fields(rng), id=str(uuid.uuid4()),
+                   timestamp=min(timestamp, now), status=status,
+                   finalized=status != 'pending')
+
+
+def _load_targets(app, rng):
+    """{name: (method, path factory, json body factory)} for the load check"""
+    from extensions import db
+    from models import Report
+    with app.app_context():
+        ids = [row[0] for row in db.session.query(Report.id).order_by(db.func.random()).limit(1000)]
+    client = app.test_client()
+    # The job id is the rendered chart's ETag, or in the 202 job handle
+    response = client.get('/reports/analytics/charts/trends.png')
+    job_id = response.headers.get('ETag', '').strip('"') or response.get_json()['job_id']
+    languages = list(LANGUAGE_WEIGHTS)
+
+    def fixed(path):
+        return lambda: path
+    return {
+        'get_report': ('GET', lambda: f'/reports/{rng.choice(ids)}', None),
+        'report_statuses': ('POST', fixed('/reports/status'), lambda: {'ids': rng.sample(ids, 50)}),
+        'admin_list': ('GET', fixed('/reports/admin/reports'), None),
+        'admin_list_language': ('GET', lambda: f'/reports/admin/reports?language={rng.choice(languages)}',
+                                None),
+        'analytics_stats': ('GET', fixed('/reports/analytics/stats'), None),
+        'analytics_stats_nocharts': ('GET', fixed('/reports/analytics/stats?charts=none'), None),
+        'analytics_categories': ('GET', fixed('/reports/analytics/categories'), None),
+        'analytics_trends': ('GET', fixed('/reports/analytics/trends'), None),
+        'analytics_trends_year': ('GET', fixed('/reports/analytics/trends?days=365&granularity=week'),
+                                  None),
+        'analytics_chart_png': ('GET', fixed('/reports/analytics/charts/category_trends.png'), None),
+        'analytics_chart_json': ('GET', fixed('/reports/analytics/charts/trends.json'), None),
+        'analytics_chart_job': ('GET', fixed(f'/reports/analytics/charts/jobs/{job_id}'), None),
+        'analytics_summary': ('GET', fixed('/reports/analytics/summary'), None),
+        'analytics_hotspots': ('GET', fixed('/reports/analytics/hotspots?days=365'), None),
+        'analytics_cache': ('GET', fixed('/reports/analytics/cache'), None),
+        # Last: every submission invalidates the cached analytics
+        'create_report': ('POST', fixed('/reports'), lambda: _report_fields(rng)),
+    }
+
+
+def _latency_summary(timings, errors, elapsed):
+    """Throughput and nearest-rank percentiles of one endpoint's timings (seconds)"""
+    timings = sorted(timings)
+
+    def percentile(p):
+        return round(timings[min(len(timings) - 1, int(len(timings) * p))] * 1000, 2)
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(timings[-1] * 1000, 2),
+    }
+
+
+def _drive_test_client(app, targets, requests):
+    """Sequential requests through the Flask test client: latency without HTTP"""
+    client = app.test_client()
+    results = {}
+    for name, (method, path, body) in targets.items():
+        timings, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            sent = time.perf_counter()
+            response = client.open(path(), method=method, json=body() if body else None)
+            timings.append(time.perf_counter() - sent)
+            errors += response.status_code >= 400
+        results[name] = _latency_summary(timings, errors, time.perf_counter() - start)
+    return results
+
+
+def _drive_http(app, targets, requests, clients):
+    """`clients` concurrent HTTP clients against a threaded in-process server"""
+    import http.client
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {}
+    try:
+        for name, (method, path, body) in targets.items():
+            timings, errors = [], []
+
+            def client(count):
+                conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+                for _ in range(count):
+                    payload = json.dumps(body()) if body else None
+                    headers = {'Content-Type': 'application/json'} if body else {}
+                    sent = time.perf_counter()
+                    try:
+                        conn.request(method, path(), body=payload, headers=headers)
+                        response = conn.getresponse()
+                        response.read()
+                        status = response.status
+                    except (OSError, http.client.HTTPException):
+                        conn.close()
+                        conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+                        status = None
+                    timings.append(time.perf_counter() - sent)
+                    if status is None or status >= 400:
+                        errors.append(status)
+                conn.close()
+
+            workers = [threading.Thread(target=client, args=(requests // clients,))
+                       for _ in range(clients)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            results[name] = _latency_summary(timings, len(errors), time.perf_counter() - start)
+    finally:
+        server.shutdown()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results, baseline, tolerance):
+    """Endpoints whose p95 grew or throughput fell by more than `tolerance`"""
+    regressions = []
+    for driver, endpoints in results.items():
+        for name, current in endpoints.items():
+            before = baseline.get('results', {}).get(driver, {}).get(name)
+            if not before:
+                continue
+            if current['p95_ms'] > before['p95_ms'] * (1 + tolerance) + 1:
+                regressions.append({'driver': driver, 'endpoint': name, 'metric': 'p95_ms',
+                                    'baseline': before['p95_ms'], 'current': current['p95_ms']})
+            if current['throughput_rps'] < before['throughput_rps'] / (1 + tolerance):
+                regressions.append({'driver': driver, 'endpoint': name, 'metric': 'throughput_rps',
+                                    'baseline': before['throughput_rps'],
+                                    'current': current['throughput_rps']})
+    return regressions
+
+
+def bench_load(args, app):
+    """Throughput and p50/p95/p99 latency of the report and analytics endpoints
+
+    Seeds --rows realistic reports, then sends --requests requests to each
+    endpoint, first one at a time through the Flask test client, then from
+    --threads concurrent HTTP clients. --output saves the results; with
+    --baseline (a previous --output) the check fails on endpoints whose p95
+    grew or whose throughput fell by more than --tolerance.
+    """
+    import locations
+    import rollups
+    from extensions import db
+    _seed_reports(app, args.rows, rows=_realistic_rows(args.rows, seed=args.seed))
+    with app.app_context():
+        rollups.rebuild()
+        locations.backfill(chunk_size=10000)
+        db.session.remove()
+    rng = random.Random(args.seed)
+    targets = _load_targets(app, rng)
+    result = {
+        'meta': {
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'rows': args.rows,
+            'requests_per_endpoint': args.requests,
+            'clients': args.threads,
+            'seed': args.seed,
+            'started_at': datetime.utcnow().isoformat(),
+        },
+        'results': {
+            'test_client': _drive_test_client(app, targets, args.requests),
+            'http': _drive_http(app, targets, args.requests, args.threads),
+        },
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        result['baseline_commit'] = baseline.get('meta', {}).get('commit')
+        result['regressions'] = _compare(result['results'], baseline, args.tolerance)
+        result['passed'] = not result['regressions']
+    return result
+
+
+# Most SQL statements one uncached request to each endpoint may issue; the
+# queries check fails when an endpoint goes over, e.g. after an N+1 query
+# slips in. Raise a budget only together with the change that needs it.
+QUERY_BUDGETS = {
+    'get_report': 1,
+    'report_statuses': 1,
+    'admin_list': 4,
+    'admin_list_language': 4,
+    'analytics_stats': 10,
+    'analytics_stats_nocharts': 7,
+    'analytics_categories': 3,
+    'analytics_trends': 2,
+    'analytics_trends_year': 2,
+    'analytics_chart_png': 1,
+    'analytics_chart_json': 1,
+    'analytics_chart_job': 0,
+    'analytics_summary': 8,
+    'analytics_hotspots': 2,
+    'analytics_cache': 0,
+    # One more when the location is new
+    'create_report': 9,
+}
+
+# Endpoints run again with ANALYTICS_USE_ROLLUPS off: their cold request must
+# read each reports table exactly once, without the text columns
+SNAPSHOT_TARGETS = ('analytics_stats', 'analytics_stats_nocharts')
+_TABLE_READ = re.compile(r'\b(?:FROM|JOIN) (reports|report_archive)\b')
+_TEXT_COLUMNS = ('description', 'notes')
+
+
+def _table_reads(statements):
+    """{table: [statement, ...]} of the statements reading reports or report_archive"""
+    reads = {'reports': [], 'report_archive': []}
+    for statement in statements:
+        for table in set(_TABLE_READ.findall(statement)):
+            reads[table].append(statement)
+    return reads
+
+
+def bench_queries(args, app):
+    """SQL statements issued per request by each endpoint of the load check
+
+    Seeds --rows realistic reports and counts the statements of one request
+    to each endpoint with a before_cursor_execute listener, first with the
+    analytics cache cleared, then again with it warm. Fails when a cold
+    request issues more statements than its QUERY_BUDGETS entry, or when a
+    SNAPSHOT_TARGETS request without rollups does not load its snapshot
+    with one projected SELECT per table.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    import locations
+    import rollups
+    from extensions import analytics_cache, db
+    _seed_reports(app, args.rows, rows=_realistic_rows(args.rows, seed=args.seed))
+    with app.app_context():
+        rollups.rebuild()
+        locations.backfill(chunk_size=10000)
+        db.session.remove()
+    targets = _load_targets(app, random.Random(args.seed))
+    client = app.test_client()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(' '.join(statement.split()))
+
+    def run(method, path, body):
+        del statements[:]
+        response = client.open(path(), method=method, json=body() if body else None)
+        return response.status_code, list(statements)
+
+    def measure(method, path, body):
+        with app.app_context():
+            analytics_cache.clear()
+        status, cold = run(method, path, body)
+        _, warm = run(method, path, body)
+        return {'status': status, 'cold': len(cold), 'warm': len(warm)}, cold
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    use_rollups = app.config.get('ANALYTICS_USE_ROLLUPS', True)
+    results, over, unprojected = {}, [], []
+    try:
+        for name, (method, path, body) in targets.items():
+            results[name], cold = measure(method, path, body)
+            budget = results[name]['budget'] = QUERY_BUDGETS.get(name)
+            if budget is not None and len(cold) > budget:
+                results[name]['statements'] = [s[:160] for s in cold]
+                over.append(name)
+
+        # SQLAggregator path: the whole request shares one SnapshotAggregator
+        app.config['ANALYTICS_USE_ROLLUPS'] = False
+        for name in SNAPSHOT_TARGETS:
+            result, cold = measure(*targets[name])
+            reads = _table_reads(cold)
+            result['table_reads'] = {table: len(found) for table, found in reads.items()}
+            results[name + '_norollups'] = result
+            if any(len(found) != 1 or any(column in found[0] for column in _TEXT_COLUMNS)
+                   for found in reads.values()):
+                result['statements'] = [s[:160] for s in cold]
+                unprojected.append(name + '_norollups')
+    finally:
+        app.config['ANALYTICS_USE_ROLLUPS'] = use_rollups
+        event.remove(Engine, 'before_cursor_execute', count)
+    return {'rows': args.rows, 'endpoints': results, 'over_budget': over,
+            'unprojected_scans': unprojected, 'passed': not over and not unprojected}
+
+
+# Loaded on first analytics, chart or export use only
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'seaborn', 'pyarrow')
+
+# Runs in a fresh interpreter: imports the app, then submits one report
+_STARTUP_PROBE = '''
+import json, resource, sys
+from app import app
+heavy = %r
+loaded = {'import': [m for m in heavy if m in sys.modules]}
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+status = app.test_client().post('/reports', json={
+    'type': 'other', 'description': 'startup probe', 'location': 'bench',
+    'language': 'en'}).status_code
+loaded['request'] = [m for m in heavy if m in sys.modules]
+print(json.dumps({'loaded': loaded, 'import_rss_kb': rss_kb, 'status': status,
+                  'request_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+''' % (HEAVY_MODULES,)
+
+
+def bench_startup(args, app):
+    """Importing the app and serving a report submission must not load the
+    analytics stack
+
+    Uses python -X importtime in a fresh interpreter against the benchmark
+    database. numpy may load on the first submission (duplicate detection);
+    pandas, matplotlib, seaborn and pyarrow may not load at all.
+    """
+    probe = subprocess.run([sys.executable, '-X', 'importtime', '-c', _STARTUP_PROBE],
+                           cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True, check=True)
+    result = json.loads(probe.stdout.strip().splitlines()[-1])
+    # "import time: self [us] | cumulative | package", nested by indentation
+    imports = []
+    for line in probe.stderr.splitlines():
+        if line.startswith('import time:') and 'self [us]' not in line:
+            own, cumulative, name = line[len('import time:'):].split('|')
+            imports.append((name.strip(), int(own), int(cumulative)))
+    app_ms = next(cumulative for name, _, cumulative in imports if name == 'app') / 1000
+    slowest = sorted(imports, key=lambda entry: -entry[1])[:10]
+    result.update({
+        'app_import_ms': round(app_ms, 1),
+        'modules_imported': len(imports),
+        'slowest_modules_ms': {name: round(own / 1000, 1) for name, own, _ in slowest},
+    })
+    result['passed'] = result['status'] in (201, 202) and not result['loaded']['import'] \
+        and set(result['loaded']['request']) <= {'numpy'}
+    return result
+
+
+CHECKS = {
+    'duplicates': bench_duplicates,
+    'export': bench_export,
+    'load': bench_load,
+    'queries': bench_queries,
+    'search': bench_search,
+    'startup': bench_startup,
+    'concurrency': bench_concurrency,
+    'writes': bench_writes,
+}
+
+# Seeded reports per check unless --rows is given
+DEFAULT_ROWS = {'load': 50000, 'queries': 5000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('check', choices=sorted(CHECKS))
+    parser.add_argument('--reports', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    if args.rows is None:
+        args.rows = DEFAULT_ROWS.get(args.check, 1000000)
+    # Windows cannot delete the database while the app still holds it open
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmpdir:
+        app = _create_app(tmpdir)
+        result = CHECKS[args.check](args, app)
+    print(json.dumps(result, indent=2))
+    # Checks with a pass/fail outcome fail the process for CI
+    if result.get('passed') is False:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import charts
+from metrics import CHART_JOB_SECONDS, CHART_RENDER_SECONDS
+
+MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+
+
+class ChartRenderPool:
+    """Background chart rendering on a pool of worker processes
+
+    A job is identified by a hash of the chart name, its data and the render
+    options, so identical requests share one job. Workers write finished
+    artifacts into a directory on local disk, which lets any web worker on
+    the host report the status of a job or serve its artifact.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self._executor = None
+        self._next_cleanup = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('CHART_ARTIFACT_DIR') or \
+            os.path.join(app.instance_path, 'charts')
+        self.max_workers = app.config.get('CHART_RENDER_WORKERS', 2)
+        self.pending_timeout = app.config.get('CHART_RENDER_TIMEOUT', 120)
+        self.artifact_ttl = app.config.get('CHART_ARTIFACT_TTL', 3600)
+        self.cleanup_interval = app.config.get('CHART_CLEANUP_INTERVAL', 300)
+        self._next_cleanup = 0
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['chart_pool'] = self
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the web process' database
+                # connections, threads or pyplot state
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=charts.apply_style)
+            return self._executor
+
+    @staticmethod
+    def job_id(name, data, fmt='png', dpi=charts.SCREEN_DPI):
+        """Deterministic id for a chart job"""
+        payload = json.dumps([name, data, fmt, dpi], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, f'{job_id}.{suffix}')
+
+    def submit(self, name, data, fmt='png', dpi=charts.SCREEN_DPI):
+        """Queue a chart for rendering and return its job id
+
+        Returns immediately; if the same chart is already rendered or being
+        rendered no new work is queued.
+        """
+        if name not in charts.RENDERERS:
+            raise ValueError(f'Unknown chart: {name}')
+        if fmt not in MIMETYPES:
+            raise ValueError(f'Unsupported chart format: {fmt}')
+        self._maybe_cleanup()
+        job_id = self.job_id(name, data, fmt, dpi)
+        if self.status(job_id) in ('done', 'pending'):
+            return job_id
+
+        marker = self._path(job_id, 'pending')
+        try:
+            # O_EXCL makes the marker a cross-process lock on the job
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+        except FileExistsError:
+            if self.status(job_id) == 'pending':
+                return job_id
+            os.utime(marker)
+        self._clear_error(job_id)
+
+        submitted = time.perf_counter()
+        future = self._get_executor().submit(
+            charts.render_to_file, self._path(job_id, fmt), name, data, fmt, dpi)
+        future.add_done_callback(lambda f: self._finish(job_id, f, (name, fmt, submitted)))
+        return job_id
+
+    def _finish(self, job_id, future, timing=None):
+        error = future.exception()
+        if timing is not None:
+            name, fmt, submitted = timing
+            CHART_JOB_SECONDS.observe(time.perf_counter() - submitted, chart=name, format=fmt,
+                                      outcome='error' if error is not None else 'done')
+            if error is None:
+                CHART_RENDER_SECONDS.observe(future.result(), chart=name, format=fmt)
+        if error is not None:
+            with open(self._path(job_id, 'error'), 'w') as f:
+                f.write(str(error))
+        try:
+            os.remove(self._path(job_id, 'pending'))
+        except FileNotFoundError:
+            pass
+
+    def _clear_error(self, job_id):
+        try:
+            os.remove(self._path(job_id, 'error'))
+        except FileNotFoundError:
+            pass
+
+    def artifact_path(self, job_id):
+        """Path of the finished artifact for a job, or None"""
+        for fmt in MIMETYPES:
+            path = self._path(job_id, fmt)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def status(self, job_id):
+        """One of 'done', 'pending', 'error' or 'unknown'"""
+        if self.artifact_path(job_id):
+            return 'done'
+        marker = self._path(job_id, 'pending')
+        try:
+            if time.time() - os.path.getmtime(marker) < self.pending_timeout:
+                return 'pending'
+        except FileNotFoundError:
+            pass
+        if os.path.exists(self._path(job_id, 'error')):
+            return 'error'
+        return 'unknown'
+
+    def error(self, job_id):
+        """Error message of a failed job"""
+        try:
+            with open(self._path(job_id, 'error')) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job leaves the pending state and return its status"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            status = self.status(job_id)
+            if status != 'pending':
+                return status
+            if deadline is not None and time.time() >= deadline:
+                return status
+            time.sleep(0.05)
+
+    def handle(self, job_id, url):
+        """JSON description of a job for API responses"""
+        return {'job_id': job_id, 'status': self.status(job_id), 'url': url}
+
+    def _maybe_cleanup(self):
+        """Run cleanup() at most once per cleanup interval in this process"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_cleanup:
+                return
+            self._next_cleanup = now + self.cleanup_interval
+        self.cleanup()
+
+    def cleanup(self):
+        """Remove artifacts older than the configured TTL"""
+        cutoff = time.time() - self.artifact_ttl
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                # Removed by another web worker meanwhile
+                pass
+        return removed
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
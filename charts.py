@@ -0,0 +1,162 @@
+import base64
+import os
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+from metrics import CHART_RENDER_SECONDS
+
+# Charts are drawn with the object-oriented Figure API rather than pyplot so
+# that they share no global state and can be rendered concurrently.
+# matplotlib is imported on the first render, so that processes which never
+# draw a chart do not pay for loading it.
+
+# Screen resolution by default; 300 dpi only for explicit export requests
+SCREEN_DPI = 100
+EXPORT_DPI = 300
+MIN_DPI = 50
+MAX_DPI = 300
+
+FIGSIZES = {
+    'categories': (10, 8),
+    'trends': (12, 6),
+    'category_trends': (14, 8),
+}
+
+
+_style_lock = threading.Lock()
+_style_applied = False
+
+
+def apply_style():
+    """Apply the chart style; only the first call in a process does any work"""
+    global _style_applied
+    with _style_lock:
+        if _style_applied:
+            return
+        import matplotlib
+        matplotlib.use('Agg')  # Use non-interactive backend
+        from matplotlib import style
+        try:
+            import seaborn as sns
+            sns.set_palette("husl")
+            style.use('seaborn-v0_8')
+        except ImportError:
+            style.use('default')
+        _style_applied = True
+
+
+def _figure(name):
+    """Empty Figure sized for the named chart, styled on first use"""
+    apply_style()
+    from matplotlib.figure import Figure
+    return Figure(figsize=FIGSIZES[name])
+
+
+def _period(data):
+    """Chart title suffix for the window of a trend series"""
+    if data.get('days'):
+        return f"Last {data['days']} days"
+    return f"{data['from'][:10]} to {data['to'][:10]}"
+
+
+def render_category_chart(data, fmt='png', dpi=SCREEN_DPI):
+    """Render a pie chart of report categories from {'labels', 'values'}"""
+    fig = _figure('categories')
+    ax = fig.subplots()
+    ax.pie(data['values'], labels=data['labels'],
+           autopct='%1.1f%%', startangle=90)
+    ax.set_title('Distribution of Incident Reports by Category',
+                 fontsize=16, fontweight='bold')
+    return _save(fig, fmt, dpi)
+
+
+def render_trends_chart(data, fmt='png', dpi=SCREEN_DPI):
+    """Render a line chart of report counts per bucket from a trends series
+    ({'dates', 'counts', 'granularity', ...})"""
+    fig = _figure('trends')
+    ax = fig.subplots()
+    dates = [datetime.fromisoformat(d) for d in data['dates']]
+    ax.plot(dates, data['counts'], marker='o', linewidth=2, markersize=6)
+    ax.set_title(f"Report Trends per {data.get('granularity', 'day')} ({_period(data)})",
+                 fontsize=16, fontweight='bold')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of Reports')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, alpha=0.3)
+    return _save(fig, fmt, dpi)
+
+
+def render_category_trends_chart(data, fmt='png', dpi=SCREEN_DPI):
+    """Render a stacked bar chart of counts per bucket and category from
+    {'dates', 'series': {category: counts}, 'granularity', ...}"""
+    fig = _figure('category_trends')
+    ax = fig.subplots()
+    positions = range(len(data['dates']))
+    bottom = [0] * len(data['dates'])
+    for category, counts in data['series'].items():
+        ax.bar(positions, counts, bottom=bottom, label=category)
+        bottom = [b + c for b, c in zip(bottom, counts)]
+    # At most ~20 labels, however many buckets there are
+    step = max(1, len(data['dates']) // 20)
+    ax.set_xticks(list(positions)[::step])
+    ax.set_xticklabels(data['dates'][::step], rotation=45)
+    ax.set_title(f"Report Categories per {data.get('granularity', 'day')} ({_period(data)})",
+                 fontsize=16, fontweight='bold')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Number of Reports')
+    ax.legend(title='Category', bbox_to_anchor=(1.05, 1), loc='upper left')
+    return _save(fig, fmt, dpi)
+
+
+RENDERERS = {
+    'categories': render_category_chart,
+    'trends': render_trends_chart,
+    'category_trends': render_category_trends_chart,
+}
+
+
+def _save(fig, fmt, dpi):
+    buffer = BytesIO()
+    fig.savefig(buffer, format=fmt, bbox_inches='tight', dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_chart(name, data, fmt='png', dpi=SCREEN_DPI):
+    """Render the named chart and return the image bytes"""
+    start = time.perf_counter()
+    try:
+        return RENDERERS[name](data, fmt=fmt, dpi=dpi)
+    finally:
+        CHART_RENDER_SECONDS.observe(time.perf_counter() - start, chart=name, format=fmt)
+
+
+def render_chart_base64(name, data, fmt='png', dpi=SCREEN_DPI):
+    """Render the named chart as a base64 string for embedding in JSON"""
+    return base64.b64encode(render_chart(name, data, fmt=fmt, dpi=dpi)).decode()
+
+
+def resolve_dpi(name, dpi=None, width=None, export=False):
+    """Pick the render resolution from an explicit dpi, a pixel width or the
+    export flag, clamped to a sane range"""
+    if dpi is None and width:
+        dpi = width / FIGSIZES[name][0]
+    if dpi is None:
+        dpi = EXPORT_DPI if export else SCREEN_DPI
+    return int(min(max(dpi, MIN_DPI), MAX_DPI))
+
+
+def render_to_file(path, name, data, fmt='png', dpi=SCREEN_DPI):
+    """Render a chart into `path` atomically; runs inside pool worker processes
+
+    Returns the render time for the pool to record: metrics observed in a
+    worker process are never scraped.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    start = time.perf_counter()
+    image = RENDERERS[name](data, fmt=fmt, dpi=dpi)
+    seconds = time.perf_counter() - start
+    with open(tmp_path, 'wb') as f:
+        f.write(image)
+    os.replace(tmp_path, path)
+    return seconds
@@ -1,6 +1,137 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { useTranslation } from 'react-i18next';
+import {
+  PieChart, Pie, Cell, LineChart, Line, BarChart, Bar,
+  XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer
+} from 'recharts';
+
+const COLORS = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899', '#14B8A6', '#F97316'];
+
+// Convert the /reports/analytics/charts/*.json series into recharts rows
+const toTrendRows = (data) => (
+  data ? data.dates.map((date, i) => ({ date, count: data.counts[i] })) : []
+);
+
+const toCategoryTrendRows = (data) => (
+  data ? data.dates.map((date, i) => {
+    const row = { date };
+    Object.entries(data.series).forEach(([category, counts]) => {
+      row[category] = counts[i];
+    });
+    return row;
+  }) : []
+);
+
+// "as of" label for the freshness block of the analytics JSON (UTC timestamps)
+const describeFreshness = (freshness) => {
+  if (!freshness || !freshness.as_of) return null;
+  const asOf = new Date(`${freshness.as_of}Z`);
+  const minutes = Math.max(0, Math.round((Date.now() - asOf.getTime()) / 60000));
+  const age = minutes < 1 ? 'just now' : `${minutes} min ago`;
+  const source = freshness.source === 'snapshot' ? 'Snapshot' : 'Live data';
+  return `${source} as of ${asOf.toLocaleString()} (${age})`;
+};
+
+// Apply the counter changes of a /reports/events 'counts' event
+const sumDeltas = (changes, predicate = () => true) => (
+  changes.filter(predicate).reduce((total, change) => total + change.delta, 0)
+);
+
+// {key: count} with the deltas of one dimension applied, largest first
+const addDeltas = (counts, changes, field) => {
+  const result = { ...(counts || {}) };
+  changes.forEach((change) => {
+    const key = change[field];
+    result[key] = (result[key] || 0) + change.delta;
+    if (result[key] <= 0) delete result[key];
+  });
+  return Object.fromEntries(Object.entries(result).sort((a, b) => b[1] - a[1]));
+};
+
+const percentagesOf = (counts, total) => Object.fromEntries(
+  Object.entries(counts).map(([key, count]) => [
+    key, total ? Math.round((count / total) * 10000) / 100 : 0
+  ])
+);
+
+const applyToCategoryStats = (stats, changes, total) => {
+  const counts = addDeltas(stats.category_counts, changes, 'type');
+  const categories = Object.keys(counts);
+  return {
+    ...stats,
+    total_reports: total,
+    category_counts: counts,
+    category_percentages: percentagesOf(counts, total),
+    most_common_category: categories.length ? categories[0] : null,
+    unique_categories: categories.length
+  };
+};
+
+const applyToLanguageStats = (stats, changes, total) => {
+  const counts = addDeltas(stats.language_counts, changes, 'language');
+  const languages = Object.keys(counts);
+  return {
+    ...stats,
+    language_counts: counts,
+    language_percentages: percentagesOf(counts, total),
+    most_common_language: languages.length ? languages[0] : null
+  };
+};
+
+const applyToStatusStats = (stats, changes, total) => {
+  const counts = addDeltas(stats.status_counts, changes, 'status');
+  return {
+    ...stats,
+    status_counts: counts,
+    status_percentages: percentagesOf(counts, total),
+    finalized_count: (stats.finalized_count || 0) + sumDeltas(changes, c => c.finalized),
+    pending_count: counts.pending || 0
+  };
+};
+
+const applyToStats = (stats, changes) => {
+  if (!stats.category_stats) return stats;
+  const total = (stats.category_stats.total_reports || 0) + sumDeltas(changes);
+  return {
+    ...stats,
+    category_stats: applyToCategoryStats(stats.category_stats, changes, total),
+    language_stats: applyToLanguageStats(stats.language_stats || {}, changes, total),
+    status_stats: applyToStatusStats(stats.status_stats || {}, changes, total)
+  };
+};
+
+const applyToSummary = (summary, changes) => ({
+  ...summary,
+  total_reports: summary.total_reports + sumDeltas(changes),
+  pending_reports: summary.pending_reports + sumDeltas(changes, c => c.status === 'pending'),
+  finalized_reports: summary.finalized_reports + sumDeltas(changes, c => c.finalized)
+});
+
+// Day, week and month buckets are labelled by their first day; hourly
+// series are left alone until the next full load
+const bucketIndex = (rows, granularity, day) => {
+  if (granularity === 'hour' || !rows.length) return -1;
+  let index = -1;
+  rows.forEach((row, i) => { if (row.date <= day) index = i; });
+  return index;
+};
+
+const applyToTrends = (trends, changes) => {
+  const rows = trends.trends.map(row => ({ ...row }));
+  const categoryRows = trends.categoryTrends.map(row => ({ ...row }));
+  const categories = [...trends.categories];
+  changes.forEach(({ day, type, delta }) => {
+    const index = bucketIndex(rows, trends.granularity, day);
+    if (index < 0) return;
+    rows[index].count += delta;
+    if (categoryRows[index]) {
+      categoryRows[index][type] = (categoryRows[index][type] || 0) + delta;
+      if (!categories.includes(type)) categories.push(type);
+    }
+  });
+  return { ...trends, trends: rows, categoryTrends: categoryRows, categories };
+};
 
 function AnalyticsDashboard() {
   const { t } = useTranslation();
@@ -11,30 +142,89 @@ function AnalyticsDashboard() {
   const [error, setError] = useState(null);
   const [selectedPeriod, setSelectedPeriod] = useState(30);
 
+  // Deltas received while a load is in flight, applied on top of it
+  const pendingChanges = useRef(null);
+
+  const applyChanges = (changes) => {
+    setAnalyticsData(prev => prev && applyToStats(prev, changes));
+    setSummaryStats(prev => prev && applyToSummary(prev, changes));
+    setTrendsData(prev => prev && applyToTrends(prev, changes));
+  };
+
+  // Load the statistics once the event stream is live, so that no commit
+  // falls between the load and the first delta, then keep them current
+  // from pushed deltas instead of refetching; a 'reset' event means the
+  // deltas cannot be trusted any more and triggers a quiet reload
   useEffect(() => {
-    fetchAnalyticsData();
+    if (typeof EventSource === 'undefined') {
+      fetchAnalyticsData();
+      return undefined;
+    }
+    let loaded = false;
+    const load = () => {
+      fetchAnalyticsData({ quiet: loaded });
+      loaded = true;
+    };
+    const events = new EventSource('/reports/events');
+    // Sent on a fresh stream only; later reconnects resume with deltas or 'reset'
+    events.addEventListener('ready', () => { if (!loaded) load(); });
+    // Without a stream (refused or unreachable) the page still loads once
+    events.addEventListener('error', () => { if (!loaded) load(); });
+    events.addEventListener('counts', (message) => {
+      const { changes } = JSON.parse(message.data);
+      if (pendingChanges.current) {
+        pendingChanges.current.push(...changes);
+      } else {
+        applyChanges(changes);
+      }
+    });
+    events.addEventListener('reset', load);
+    return () => events.close();
   }, [selectedPeriod]);
 
-  const fetchAnalyticsData = async () => {
+  // The category count card follows the category statistics
+  useEffect(() => {
+    const stats = analyticsData && analyticsData.category_stats;
+    if (!stats || stats.unique_categories === undefined) return;
+    setSummaryStats(prev => (
+      prev && prev.unique_categories !== stats.unique_categories
+        ? { ...prev, unique_categories: stats.unique_categories }
+        : prev
+    ));
+  }, [analyticsData]);
+
+  const fetchAnalyticsData = async ({ quiet = false } = {}) => {
     try {
-      setLoading(true);
+      if (!quiet) setLoading(true);
       setError(null);
+      pendingChanges.current = pendingChanges.current || [];
       
-      // Fetch comprehensive analytics
-      const [statsResponse, summaryResponse, trendsResponse] = await Promise.all([
-        axios.get('/reports/analytics/stats'),
+      // Fetch statistics and chart series; charts are drawn client-side
+      const [statsResponse, summaryResponse, trendsResponse, categoryTrendsResponse] = await Promise.all([
+        axios.get('/reports/analytics/stats?charts=none'),
         axios.get('/reports/analytics/summary'),
-        axios.get(`/reports/analytics/trends?days=${selectedPeriod}`)
+        axios.get(`/reports/analytics/charts/trends.json?days=${selectedPeriod}`),
+        axios.get(`/reports/analytics/charts/category_trends.json?days=${selectedPeriod}`)
       ]);
       
       setAnalyticsData(statsResponse.data);
       setSummaryStats(summaryResponse.data);
-      setTrendsData(trendsResponse.data);
+      setTrendsData({
+        trends: toTrendRows(trendsResponse.data.data),
+        categoryTrends: toCategoryTrendRows(categoryTrendsResponse.data.data),
+        categories: categoryTrendsResponse.data.data ? Object.keys(categoryTrendsResponse.data.data.series) : [],
+        granularity: trendsResponse.data.data ? trendsResponse.data.data.granularity : null,
+        freshness: describeFreshness(trendsResponse.data.freshness)
+      });
+      const buffered = pendingChanges.current || [];
+      pendingChanges.current = null;
+      if (buffered.length) applyChanges(buffered);
     } catch (error) {
+      pendingChanges.current = null;
       console.error("Error fetching analytics:", error);
       setError('Failed to load analytics data');
     } finally {
-      setLoading(false);
+      if (!quiet) setLoading(false);
     }
   };
 
@@ -182,12 +372,24 @@ function AnalyticsDashboard() {
                   <i className="fas fa-chart-pie mr-2"></i>
                   Report Categories Distribution
                 </h3>
-                {analyticsData.category_chart ? (
-                  <img 
-                    src={`data:image/png;base64,${analyticsData.category_chart}`} 
-                    alt="Category Distribution Chart"
-                    className="w-full h-auto rounded"
-                  />
+                {Object.keys(analyticsData.category_stats.category_counts || {}).length > 0 ? (
+                  <ResponsiveContainer width="100%" height={320}>
+                    <PieChart>
+                      <Pie
+                        data={Object.entries(analyticsData.category_stats.category_counts).map(([name, value]) => ({ name: t(name) || name, value }))}
+                        dataKey="value"
+                        nameKey="name"
+                        outerRadius={110}
+                        label={({ percent }) => `${(percent * 100).toFixed(1)}%`}
+                      >
+                        {Object.keys(analyticsData.category_stats.category_counts).map((name, index) => (
+                          <Cell key={name} fill={COLORS[index % COLORS.length]} />
+                        ))}
+                      </Pie>
+                      <Tooltip />
+                      <Legend />
+                    </PieChart>
+                  </ResponsiveContainer>
                 ) : (
                   <p className="text-gray-500 text-center py-8">No data available for chart</p>
                 )}
@@ -230,33 +432,50 @@ function AnalyticsDashboard() {
           {/* Trends Charts */}
           {trendsData && (
             <div className="grid grid-cols-1 gap-8">
+              {trendsData.freshness && (
+                <p className="text-sm text-gray-500">
+                  <i className="fas fa-clock mr-1"></i>
+                  {trendsData.freshness}
+                </p>
+              )}
               {/* Daily Trends */}
-              {trendsData.trends_chart && (
+              {trendsData.trends.length > 0 && (
                 <div className="bg-white shadow rounded-lg p-6">
                   <h3 className="text-lg font-medium text-gray-900 mb-4">
                     <i className="fas fa-chart-line mr-2"></i>
                     Daily Report Trends (Last {selectedPeriod} days)
                   </h3>
-                  <img 
-                    src={`data:image/png;base64,${trendsData.trends_chart}`} 
-                    alt="Daily Trends Chart"
-                    className="w-full h-auto rounded"
-                  />
+                  <ResponsiveContainer width="100%" height={320}>
+                    <LineChart data={trendsData.trends}>
+                      <CartesianGrid strokeDasharray="3 3" />
+                      <XAxis dataKey="date" />
+                      <YAxis allowDecimals={false} />
+                      <Tooltip />
+                      <Line type="monotone" dataKey="count" name="Reports" stroke="#3B82F6" strokeWidth={2} />
+                    </LineChart>
+                  </ResponsiveContainer>
                 </div>
               )}
               
               {/* Category Trends */}
-              {trendsData.category_trends_chart && (
+              {trendsData.categoryTrends.length > 0 && (
                 <div className="bg-white shadow rounded-lg p-6">
                   <h3 className="text-lg font-medium text-gray-900 mb-4">
                     <i className="fas fa-chart-area mr-2"></i>
                     Category Trends by Day (Last {selectedPeriod} days)
                   </h3>
-                  <img 
-                    src={`data:image/png;base64,${trendsData.category_trends_chart}`} 
-                    alt="Category Trends Chart"
-                    className="w-full h-auto rounded"
-                  />
+                  <ResponsiveContainer width="100%" height={360}>
+                    <BarChart data={trendsData.categoryTrends}>
+                      <CartesianGrid strokeDasharray="3 3" />
+                      <XAxis dataKey="date" />
+                      <YAxis allowDecimals={false} />
+                      <Tooltip />
+                      <Legend />
+                      {trendsData.categories.map((category, index) => (
+                        <Bar key={category} dataKey={category} name={t(category) || category} stackId="categories" fill={COLORS[index % COLORS.length]} />
+                      ))}
+                    </BarChart>
+                  </ResponsiveContainer>
                 </div>
               )}
             </div>
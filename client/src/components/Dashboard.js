@@ -3,10 +3,16 @@ import axios from 'axios';
 import { useTranslation } from 'react-i18next';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 
+const countByType = (data) => data.reduce((acc, report) => {
+  const type = report.type || 'Uncategorized';
+  acc[type] = (acc[type] || 0) + 1;
+  return acc;
+}, {});
+
 function Dashboard() {
   const { t } = useTranslation();
-  const [reports, setReports] = useState([]);
   const [stats, setStats] = useState({ total: 0, pending: 0, approved: 0, rejected: 0 });
+  const [typeCounts, setTypeCounts] = useState({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -15,9 +21,16 @@ function Dashboard() {
       try {
         setLoading(true);
         setError(null);
-        const response = await axios.get('/api/reports');
-        setReports(response.data || []);
-        calculateStats(response.data || []);
+        // Totals come from the server-side counters; the list itself is paged
+        const response = await axios.get('/api/reports?include_counts=1&limit=1');
+        const { counts } = response.data;
+        setTypeCounts(counts.type_counts || {});
+        setStats({
+          total: counts.total,
+          pending: counts.status_counts.pending || 0,
+          approved: counts.status_counts.approved || 0,
+          rejected: counts.status_counts.rejected || 0
+        });
       } catch (error) {
         console.error("Error fetching reports:", error);
         setError(t('failedToLoadReports'));
@@ -29,7 +42,7 @@ function Dashboard() {
           { type: 'harassment', status: 'rejected' },
           { type: 'other', status: 'approved' }
         ];
-        setReports(mockData);
+        setTypeCounts(countByType(mockData));
         calculateStats(mockData);
       } finally {
         setLoading(false);
@@ -46,11 +59,7 @@ function Dashboard() {
     setStats({ total, pending, approved, rejected });
   };
 
-  const reportsByType = reports.reduce((acc, report) => {
-    const type = report.type || 'Uncategorized';
-    acc[type] = (acc[type] || 0) + 1;
-    return acc;
-  }, {});
+  const reportsByType = typeCounts;
 
   const barChartData = Object.keys(reportsByType).map(type => ({
     name: type,
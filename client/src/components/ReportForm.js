@@ -1,8 +1,11 @@
 import React, { useState, useRef, useEffect, useCallback } from 'react';
 import axios from 'axios';
-import { addReportToQueue, getQueuedReports, clearQueuedReports } from '../db';
+import { addReportToQueue, getQueuedReports, removeQueuedReports } from '../db';
 import { useTranslation } from 'react-i18next';
 
+// Largest number of queued reports sent in one /reports/batch request
+const SYNC_BATCH_SIZE = 500;
+
 function ReportForm() {
   const { t, i18n } = useTranslation();
   const [type, setType] = useState('');
@@ -21,18 +24,29 @@ function ReportForm() {
       const queued = await getQueuedReports();
       if (queued.length === 0) return;
       
+      // Send the queue in batches; the server dedupes on report.id, so a
+      // batch that is retried after a partial failure is safe
       let syncedCount = 0;
-      for (const report of queued) {
+      for (let start = 0; start < queued.length; start += SYNC_BATCH_SIZE) {
+        const batch = queued.slice(start, start + SYNC_BATCH_SIZE);
         try {
-          await axios.post('/reports', report);
-          syncedCount++;
+          const response = await axios.post('/reports/batch', batch);
+          const acknowledged = response.data.results.map((result) => {
+            if (result.status === 'invalid') {
+              console.error('Server rejected queued report', batch[result.index].id, result.error);
+            }
+            return batch[result.index].id;
+          });
+          // Only items the server answered for leave the queue
+          await removeQueuedReports(acknowledged);
+          syncedCount += response.data.results.filter((r) => r.status !== 'invalid').length;
         } catch (e) {
-          console.error('Sync failed for report', report.id, e);
+          console.error('Sync failed for batch starting at', start, e);
+          break;
         }
       }
       
       if (syncedCount > 0) {
-        await clearQueuedReports();
         setStatusMessage(syncedCount === 1 ? t('reportSynced') : t('reportsSynced'));
       }
     } catch (error) {
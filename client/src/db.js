@@ -29,3 +29,10 @@ export async function clearQueuedReports() {
   await tx.store.clear();
   await tx.done;
 }
+
+export async function removeQueuedReports(ids) {
+  const db = await initDB();
+  const tx = db.transaction(STORE_NAME, 'readwrite');
+  await Promise.all(ids.map((id) => tx.store.delete(id)));
+  await tx.done;
+}
@@ -13,3 +13,106 @@ class Config:
     SQLALCHEMY_DATABASE_URI = environ.get('DATABASE_URI') or \
         'sqlite:///' + path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read-only engine (replica, or a mode=ro SQLite URI) for
+    # analytics queries; unset means analytics read the primary database
+    ANALYTICS_DATABASE_URI = environ.get('ANALYTICS_DATABASE_URI')
+    # Connection pool per engine (SQLite in-memory databases keep the default)
+    DB_POOL_SIZE = int(environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(environ.get('DB_POOL_RECYCLE', 1800))
+    # SQLite pragmas applied on every new connection
+    SQLITE_JOURNAL_MODE = environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    # Analytics cache shared by all workers on this host (SQLite file,
+    # defaults to instance/analytics_cache.db)
+    ANALYTICS_CACHE_ENABLED = environ.get('ANALYTICS_CACHE_ENABLED', '1') == '1'
+    ANALYTICS_CACHE_PATH = environ.get('ANALYTICS_CACHE_PATH')
+    ANALYTICS_CACHE_TTL = int(environ.get('ANALYTICS_CACHE_TTL', 300))
+    ANALYTICS_CACHE_MAX_ENTRIES = int(environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 256))
+    ANALYTICS_CACHE_MAX_BYTES = int(environ.get('ANALYTICS_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Background chart rendering (process pool; artifacts default to
+    # instance/charts)
+    CHART_RENDER_WORKERS = int(environ.get('CHART_RENDER_WORKERS', 2))
+    CHART_ARTIFACT_DIR = environ.get('CHART_ARTIFACT_DIR')
+    CHART_ARTIFACT_TTL = int(environ.get('CHART_ARTIFACT_TTL', 3600))
+    # Seconds before an unfinished render is considered lost and resubmitted
+    CHART_RENDER_TIMEOUT = int(environ.get('CHART_RENDER_TIMEOUT', 120))
+    # Least seconds between two sweeps of expired artifacts by one process
+    CHART_CLEANUP_INTERVAL = int(environ.get('CHART_CLEANUP_INTERVAL', 300))
+    # Seconds a chart endpoint waits for a render before returning a job
+    # handle (202); 0 answers at once unless the chart is already rendered.
+    # Keep it short, the wait holds a web worker
+    CHART_RENDER_WAIT = float(environ.get('CHART_RENDER_WAIT', 0))
+    # Read analytics counts and trends from the report_rollups counters
+    ANALYTICS_USE_ROLLUPS = environ.get('ANALYTICS_USE_ROLLUPS', '1') == '1'
+    # Columnar snapshot (Arrow files, needs pyarrow) for the trend charts;
+    # refreshed incrementally once older than ANALYTICS_SNAPSHOT_MAX_AGE seconds
+    ANALYTICS_SNAPSHOT_ENABLED = environ.get('ANALYTICS_SNAPSHOT_ENABLED', '0') == '1'
+    ANALYTICS_SNAPSHOT_DIR = environ.get('ANALYTICS_SNAPSHOT_DIR')
+    ANALYTICS_SNAPSHOT_MAX_AGE = int(environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', 300))
+    # Most points a trend series returns; finer buckets are merged to fit
+    TRENDS_MAX_POINTS = int(environ.get('TRENDS_MAX_POINTS', 120))
+    # Admin report list / /api/reports page sizes
+    REPORTS_PAGE_SIZE = int(environ.get('REPORTS_PAGE_SIZE', 50))
+    REPORTS_MAX_PAGE_SIZE = int(environ.get('REPORTS_MAX_PAGE_SIZE', 200))
+    # Full-text search: deepest result a search page may reach, and how many
+    # of the newest matches a broad query ranks
+    SEARCH_MAX_RESULTS = int(environ.get('SEARCH_MAX_RESULTS', 1000))
+    SEARCH_RANK_WINDOW = int(environ.get('SEARCH_RANK_WINDOW', 10000))
+    # Near-duplicate detection (MinHash/LSH over descriptions) at submission;
+    # reports at or above DUPLICATE_THRESHOLD estimated similarity are
+    # grouped under the earlier report
+    DUPLICATE_DETECTION = environ.get('DUPLICATE_DETECTION', '1') == '1'
+    DUPLICATE_THRESHOLD = float(environ.get('DUPLICATE_THRESHOLD', 0.7))
+    # Bulk ingestion (/reports/batch)
+    REPORTS_BATCH_MAX = int(environ.get('REPORTS_BATCH_MAX', 5000))
+    REPORTS_BATCH_CHUNK = int(environ.get('REPORTS_BATCH_CHUNK', 500))
+    # Batch status lookups (/reports/status): most ids per call, ids per IN (...)
+    REPORTS_STATUS_BATCH_MAX = int(environ.get('REPORTS_STATUS_BATCH_MAX', 1000))
+    REPORTS_STATUS_CHUNK = int(environ.get('REPORTS_STATUS_CHUNK', 500))
+    # Report locations given as coordinates are keyed by their geohash cell
+    # at this precision (7: about 150 m); changing it needs
+    # `flask reports backfill-locations --rebuild`
+    LOCATION_GEOHASH_PRECISION = int(environ.get('LOCATION_GEOHASH_PRECISION', 7))
+    HOTSPOTS_MAX_LIMIT = int(environ.get('HOTSPOTS_MAX_LIMIT', 100))
+    # `flask reports archive` moves finalized reports submitted and last
+    # changed more than ARCHIVE_AFTER_DAYS ago to report_archive, in
+    # transactions of ARCHIVE_BATCH_SIZE reports ARCHIVE_PAUSE_MS apart
+    ARCHIVE_AFTER_DAYS = int(environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_SIZE = int(environ.get('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_PAUSE_MS = int(environ.get('ARCHIVE_PAUSE_MS', 50))
+    # Rows fetched per chunk by /reports/export.<fmt> and `flask reports export`
+    REPORTS_EXPORT_CHUNK = int(environ.get('REPORTS_EXPORT_CHUNK', 5000))
+    # Write-behind report submission: queue single reports and insert them
+    # in batches every REPORT_WRITE_FLUSH_MS or REPORT_WRITE_BATCH_SIZE items
+    REPORT_WRITE_BEHIND = environ.get('REPORT_WRITE_BEHIND', '0') == '1'
+    REPORT_WRITE_QUEUE_SIZE = int(environ.get('REPORT_WRITE_QUEUE_SIZE', 10000))
+    REPORT_WRITE_BATCH_SIZE = int(environ.get('REPORT_WRITE_BATCH_SIZE', 500))
+    REPORT_WRITE_FLUSH_MS = int(environ.get('REPORT_WRITE_FLUSH_MS', 50))
+    # Spill files for queued reports (defaults to instance/spill)
+    REPORT_SPILL_DIR = environ.get('REPORT_SPILL_DIR')
+    # Server-sent counter deltas (/reports/events): events kept for
+    # Last-Event-ID resume, heartbeat seconds, concurrent streams per
+    # process, and seconds before a stream ends and the browser reconnects
+    # (and resumes). An open stream occupies a worker thread: serve with
+    # threaded or async workers (e.g. gunicorn -k gthread --threads N) and
+    # keep EVENTS_MAX_SUBSCRIBERS well below the threads of a process, or
+    # sync workers end up serving nothing but streams
+    EVENTS_HISTORY = int(environ.get('EVENTS_HISTORY', 1000))
+    EVENTS_HEARTBEAT = int(environ.get('EVENTS_HEARTBEAT', 15))
+    EVENTS_MAX_SUBSCRIBERS = int(environ.get('EVENTS_MAX_SUBSCRIBERS', 100))
+    EVENTS_STREAM_TIMEOUT = int(environ.get('EVENTS_STREAM_TIMEOUT', 45))
+    # React build served by static_assets (relative to the app); hashed
+    # files are cached for a year, other public files for STATIC_MAX_AGE
+    # seconds. Run `flask compress-static` after each build.
+    STATIC_BUILD_DIR = environ.get('STATIC_BUILD_DIR')
+    STATIC_MAX_AGE = int(environ.get('STATIC_MAX_AGE', 3600))
+    # Prometheus-format metrics at METRICS_PATH (per process, in memory)
+    METRICS_ENABLED = environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_PATH = environ.get('METRICS_PATH', '/metrics')
+    # Profile requests that send an X-Profile header (staging only)
+    METRICS_PROFILING = environ.get('METRICS_PROFILING', '0') == '1'
+    METRICS_PROFILE_LINES = int(environ.get('METRICS_PROFILE_LINES', 40))
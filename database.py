@@ -0,0 +1,104 @@
+from flask import current_app, g
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from extensions import db
+
+# Bind key of the optional read-only engine used for analytics queries
+ANALYTICS_BIND = 'analytics'
+
+
+def engine_options(uri, config):
+    """SQLAlchemy engine options for a database URI, sized per backend"""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}
+        # File databases get a QueuePool; the sqlite3 timeout is the busy
+        # handler used while the connection is being opened
+        return {
+            'pool_size': config.get('DB_POOL_SIZE', 5),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+            'connect_args': {
+                'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+            },
+        }
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+def _sqlite_pragmas(config, read_only=False):
+    pragmas = [
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)),
+    ]
+    if read_only:
+        # The journal mode is a property of the file, set by the writer
+        pragmas.append(('query_only', 'ON'))
+    else:
+        pragmas.insert(0, ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')))
+    return pragmas
+
+
+def _install_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def init_db(app):
+    """Configure the engines from Config and initialise extensions.db
+
+    Sets pool options per backend, applies the SQLite pragmas (WAL,
+    synchronous, busy timeout, mmap and cache size) on every new connection
+    and, when ANALYTICS_DATABASE_URI is set, adds a read-only engine that
+    analytics queries use through analytics_session().
+    """
+    config = app.config
+    options = dict(engine_options(config['SQLALCHEMY_DATABASE_URI'], config),
+                   **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    analytics_uri = config.get('ANALYTICS_DATABASE_URI')
+    if analytics_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[ANALYTICS_BIND] = dict(engine_options(analytics_uri, config), url=analytics_uri)
+        config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                _install_pragmas(engine, _sqlite_pragmas(config, read_only=key == ANALYTICS_BIND))
+
+    app.teardown_appcontext(_close_analytics_session)
+
+
+def analytics_session():
+    """Session for read-only analytics queries
+
+    Uses the analytics engine (replica or read-only connection) when one is
+    configured and the primary db.session otherwise.
+    """
+    if ANALYTICS_BIND not in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+        return db.session
+    if 'analytics_session' not in g:
+        g.analytics_session = Session(bind=db.engines[ANALYTICS_BIND])
+    return g.analytics_session
+
+
+def _close_analytics_session(exc):
+    session = g.pop('analytics_session', None)
+    if session is not None:
+        session.close()
@@ -0,0 +1,256 @@
+import functools
+import hashlib
+import unicodedata
+import zlib
+from flask import current_app
+from sqlalchemy import func, tuple_
+from extensions import db
+from models import ReportSignature, ReportBucket
+import archive
+
+# Signature layout. Stored signatures and buckets depend on these; change
+# them only together with `flask reports backfill-duplicates --rebuild`.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+
+# Pairs whose estimated Jaccard similarity reaches this are duplicates
+DEFAULT_THRESHOLD = 0.7
+
+# Permutations h(x) = (a*x + b) mod p over 31-bit shingle hashes; products
+# stay below 2**62 so uint64 arithmetic cannot overflow
+_PRIME = (1 << 31) - 1
+
+# Rows per IN (...) lookup
+_CHUNK = 500
+
+
+@functools.cache
+def _permutations():
+    """(a, b) coefficient arrays; numpy is loaded on the first signature"""
+    import numpy as np
+    rng = np.random.RandomState(20261016)
+    return (rng.randint(1, _PRIME, NUM_PERM).astype(np.uint64),
+            rng.randint(0, _PRIME, NUM_PERM).astype(np.uint64))
+
+
+def normalize(text):
+    """Lowercase, with punctuation, symbols and runs of whitespace collapsed to one space"""
+    chars = (' ' if unicodedata.category(c)[0] in 'PSZC' else c for c in (text or '').lower())
+    return ' '.join(''.join(chars).split())
+
+
+def shingles(text):
+    """Character 5-grams of the normalized text; works in every script"""
+    text = normalize(text)
+    if len(text) <= SHINGLE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32 values) of `text`, None if it has no words"""
+    import numpy as np
+    hashed = np.fromiter((zlib.crc32(s.encode()) & _PRIME for s in shingles(text)),
+                         dtype=np.uint64)
+    if not hashed.size:
+        return None
+    a, b = _permutations()
+    return ((np.outer(hashed, a) + b) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float((a == b).sum()) / NUM_PERM
+
+
+def band_keys(sig):
+    """One bucket key per band; reports sharing any key are candidates"""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                 digest_size=8, person=band.to_bytes(2, 'big')).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def _decode(blob):
+    import numpy as np
+    return np.frombuffer(blob, dtype=np.uint32)
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _CHUNK):
+        yield values[start:start + _CHUNK]
+
+
+def _field(report, name):
+    return report[name] if isinstance(report, dict) else getattr(report, name)
+
+
+def enabled():
+    return current_app.config.get('DUPLICATE_DETECTION', True)
+
+
+def _threshold():
+    return current_app.config.get('DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD)
+
+
+def _lookup(session, keys):
+    """{bucket key: [report id, ...]} for the stored buckets among `keys`"""
+    found = {}
+    for chunk in _chunks(keys):
+        for bucket, report_id in (session.query(ReportBucket.bucket, ReportBucket.report_id)
+                                  .filter(ReportBucket.bucket.in_(chunk))):
+            found.setdefault(bucket, []).append(report_id)
+    return found
+
+
+def _signatures(session, report_ids):
+    found = {}
+    for chunk in _chunks(report_ids):
+        for report_id, blob in (session.query(ReportSignature.report_id, ReportSignature.signature)
+                                .filter(ReportSignature.report_id.in_(chunk))):
+            found[report_id] = _decode(blob)
+    return found
+
+
+def index_reports(reports, session=None, threshold=None):
+    """Sign new reports and link near-duplicates to their cluster
+
+    Call in the transaction that inserts the reports (dicts or Report
+    objects, oldest first). Only the first report of each cluster is put in
+    the LSH buckets, so a lookup costs one indexed read per band however
+    many copies a text has. Returns {report id: id of the report it
+    duplicates} for the duplicates found.
+    """
+    session = session or db.session
+    threshold = threshold if threshold is not None else _threshold()
+    entries = []
+    for report in reports:
+        sig = signature(_field(report, 'description'))
+        if sig is not None:
+            entries.append((_field(report, 'id'), sig, band_keys(sig)))
+    if not entries:
+        return {}
+
+    buckets = _lookup(session, {key for _, _, keys in entries for key in keys})
+    known = _signatures(session, {rid for ids in buckets.values() for rid in ids})
+    duplicates = {}
+    signature_rows, bucket_rows = [], []
+    for report_id, sig, keys in entries:
+        scored = sorted((-similarity(sig, known[rid]), rid)
+                        for rid in {rid for key in keys for rid in buckets.get(key, ())})
+        if scored and -scored[0][0] >= threshold:
+            score, best = -scored[0][0], scored[0][1]
+            duplicates[report_id] = best
+            signature_rows.append({'report_id': report_id, 'signature': sig.tobytes(),
+                                   'duplicate_of': best, 'similarity': score})
+            continue
+        # A new original; later reports of this batch can match it
+        signature_rows.append({'report_id': report_id, 'signature': sig.tobytes(),
+                               'duplicate_of': None, 'similarity': None})
+        known[report_id] = sig
+        for key in keys:
+            buckets.setdefault(key, []).append(report_id)
+            bucket_rows.append({'bucket': key, 'report_id': report_id})
+
+    session.execute(db.insert(ReportSignature), signature_rows)
+    if bucket_rows:
+        session.execute(db.insert(ReportBucket), bucket_rows)
+    return duplicates
+
+
+def candidates(text, session=None, threshold=None):
+    """[(report id, similarity), ...] of stored originals similar to `text`, best first"""
+    session = session or db.session
+    threshold = threshold if threshold is not None else _threshold()
+    sig = signature(text)
+    if sig is None:
+        return []
+    ids = {rid for found in _lookup(session, band_keys(sig)).values() for rid in found}
+    scored = [(rid, similarity(sig, other)) for rid, other in _signatures(session, ids).items()]
+    return sorted([pair for pair in scored if pair[1] >= threshold], key=lambda p: (-p[1], p[0]))
+
+
+def duplicate_of(report_ids, session=None):
+    """{report id: original report id} for the duplicates among `report_ids`"""
+    session = session or db.session
+    found = {}
+    for chunk in _chunks(report_ids):
+        found.update(session.query(ReportSignature.report_id, ReportSignature.duplicate_of)
+                     .filter(ReportSignature.report_id.in_(chunk),
+                             ReportSignature.duplicate_of.isnot(None)))
+    return found
+
+
+def cluster(report_id, session=None):
+    """(original, [(duplicate, similarity), ...]) for the cluster containing `report_id`"""
+    session = session or db.session
+    original = session.query(ReportSignature.duplicate_of).filter_by(report_id=report_id).scalar() \
+        or report_id
+    members = (session.query(ReportSignature.report_id, ReportSignature.similarity)
+               .filter(ReportSignature.duplicate_of == original)
+               .order_by(ReportSignature.similarity.desc(), ReportSignature.report_id)
+               .all())
+    return original, [(rid, score) for rid, score in members]
+
+
+def clusters(limit=50, offset=0, session=None):
+    """[(original Report, duplicate count), ...], largest clusters first"""
+    session = session or db.session
+    size = func.count(ReportSignature.report_id)
+    rows = (session.query(ReportSignature.duplicate_of, size)
+            .filter(ReportSignature.duplicate_of.isnot(None))
+            .group_by(ReportSignature.duplicate_of)
+            .order_by(size.desc(), ReportSignature.duplicate_of)
+            .limit(limit).offset(offset)
+            .all())
+    originals = archive.get_many([original for original, _ in rows], session)
+    return [(originals[original], n) for original, n in rows if original in originals]
+
+
+def count_suppressed(session=None):
+    """Number of reports recognised as near-duplicates of an earlier one"""
+    session = session or db.session
+    return (session.query(func.count(ReportSignature.report_id))
+            .filter(ReportSignature.duplicate_of.isnot(None))
+            .scalar() or 0)
+
+
+def backfill(session=None, chunk_size=2000, rebuild=False):
+    """Sign every report and archived report that has no signature yet, oldest first
+
+    With rebuild=True all signatures and buckets are recomputed. Commits
+    once per chunk; returns (reports signed, duplicates found).
+    """
+    from analytics_cache import mark_reports_changed
+    session = session or db.session
+    if rebuild:
+        session.query(ReportBucket).delete()
+        session.query(ReportSignature).delete()
+        session.commit()
+
+    signed = found = 0
+    last = None
+    while True:
+        # The next chunk of both tables together, so originals stay the oldest
+        rows = []
+        for model in archive.MODELS:
+            query = (session.query(model.id, model.description, model.timestamp)
+                     .outerjoin(ReportSignature, ReportSignature.report_id == model.id)
+                     .filter(ReportSignature.report_id.is_(None)))
+            if last is not None:
+                query = query.filter(tuple_(model.timestamp, model.id) > last)
+            rows += query.order_by(model.timestamp, model.id).limit(chunk_size).all()
+        rows = sorted(rows, key=lambda r: (r.timestamp, r.id))[:chunk_size]
+        if not rows:
+            return signed, found
+        found += len(index_reports([{'id': r.id, 'description': r.description} for r in rows],
+                                   session=session))
+        mark_reports_changed(session)
+        session.commit()
+        signed += len(rows)
+        last = (rows[-1].timestamp, rows[-1].id)
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from collections import deque
+from uuid import uuid4
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Brokers initialised in this process; committed deltas go to all of them
+_brokers = set()
+
+
+def record_delta(session, key, delta):
+    """Queue a rollup counter change (see rollups._key) until the session commits"""
+    deltas = session.info.setdefault('report_deltas', {})
+    key = tuple(key.items())
+    deltas[key] = deltas.get(key, 0) + delta
+
+
+def record_reset(session):
+    """Tell subscribers to reload their snapshot once the session commits"""
+    session.info['report_reset'] = True
+
+
+def _frame(event_id, name, data):
+    lines = [f'id: {event_id}'] if event_id else []
+    lines += [f'event: {name}', f'data: {data}']
+    return '\n'.join(lines) + '\n\n'
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class EventBroker:
+    """In-process fan-out of report counter deltas to server-sent event streams
+
+    Every commit that changes the rollup counters publishes one 'counts'
+    event listing the changed counters, so a dashboard can load the full
+    statistics once and keep them current from the deltas. Recent events
+    are kept for Last-Event-ID resume; a subscriber that asks for an event
+    no longer kept (or one from another process or an earlier run) gets a
+    'reset' event and reloads its snapshot. Each process only sees its own
+    commits, so with several workers dashboards should also resync now and
+    then. Each open stream holds the thread serving it until the stream
+    times out, so streams need threaded or async workers.
+    """
+
+    def __init__(self, app=None):
+        # Event ids are "<epoch>-<sequence>"; the epoch tells runs apart
+        self.epoch = uuid4().hex[:8]
+        self.subscribers = 0
+        self._sequence = 0
+        self._history = deque()
+        self._condition = threading.Condition()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.history_size = app.config.get('EVENTS_HISTORY', 1000)
+        self.heartbeat = app.config.get('EVENTS_HEARTBEAT', 15)
+        self.max_subscribers = app.config.get('EVENTS_MAX_SUBSCRIBERS', 100)
+        self.stream_timeout = app.config.get('EVENTS_STREAM_TIMEOUT', 45)
+        app.extensions['events'] = self
+
+        if not event.contains(Session, 'after_commit', _publish_after_commit):
+            event.listen(Session, 'after_commit', _publish_after_commit)
+            event.listen(Session, 'after_rollback', _clear_after_rollback)
+        _brokers.add(self)
+
+    @property
+    def last_event_id(self):
+        return f'{self.epoch}-{self._sequence}'
+
+    def publish(self, name, data):
+        """Send an event to every subscriber; returns its id"""
+        payload = json.dumps(data, separators=(',', ':'), default=str)
+        with self._condition:
+            self._sequence += 1
+            self._history.append((self._sequence, name, payload))
+            while len(self._history) > self.history_size:
+                self._history.popleft()
+            self._condition.notify_all()
+            return self.last_event_id
+
+    def _resume_from(self, last_event_id):
+        """Sequence to resume after, or None when the events are gone"""
+        epoch, _, sequence = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if sequence > self._sequence or sequence < oldest - 1:
+            return None
+        return sequence
+
+    def stream(self, last_event_id=None):
+        """SSE frames for one subscriber, starting after `last_event_id`
+
+        Raises TooManySubscribers when the limit is reached. The stream ends
+        after EVENTS_STREAM_TIMEOUT seconds; browsers reconnect and resume.
+        A fresh stream opens with 'ready', one that cannot resume with
+        'reset', and a resumed one carries straight on with its events.
+        The subscriber slot is freed when the returned iterable is closed.
+        """
+        with self._condition:
+            # Checked and taken together, so concurrent connects cannot overshoot
+            if self.subscribers >= self.max_subscribers:
+                raise TooManySubscribers()
+            self.subscribers += 1
+            cursor = self._resume_from(last_event_id) if last_event_id else None
+            fresh = cursor is None
+            if fresh:
+                cursor = self._sequence
+        first = ('reset' if last_event_id else 'ready') if fresh else None
+        return _Subscription(self._frames(cursor, first), self._release)
+
+    def _release(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    def _frames(self, cursor, first):
+        deadline = time.monotonic() + self.stream_timeout
+        yield 'retry: 3000\n\n'
+        if first:
+            # 'ready' lets the client know the stream is live before it loads data
+            yield _frame(f'{self.epoch}-{cursor}', first, '{}')
+        while time.monotonic() < deadline:
+            with self._condition:
+                if self._sequence <= cursor:
+                    self._condition.wait(timeout=self.heartbeat)
+                oldest = self._history[0][0] if self._history else self._sequence + 1
+                pending = [entry for entry in self._history if entry[0] > cursor]
+                latest = self._sequence
+            if cursor < oldest - 1:
+                # Fell further behind than the history reaches
+                cursor = latest
+                yield _frame(f'{self.epoch}-{cursor}', 'reset', '{}')
+                continue
+            if not pending:
+                yield ': heartbeat\n\n'
+                continue
+            for sequence, name, payload in pending:
+                cursor = sequence
+                yield _frame(f'{self.epoch}-{sequence}', name, payload)
+
+
+class _Subscription:
+    """Frames of one stream; closing it (as WSGI servers do) frees its slot
+
+    A generator's own cleanup never runs when it is closed before its first
+    frame, so the slot is released here, exactly once.
+    """
+
+    def __init__(self, frames, release):
+        self._frames = frames
+        self._release = release
+        self._open = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._frames)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        self._frames.close()
+        if self._open:
+            self._open = False
+            self._release()
+
+
+def _publish_after_commit(session):
+    reset = session.info.pop('report_reset', False)
+    deltas = session.info.pop('report_deltas', None)
+    if not (reset or deltas) or not _brokers:
+        return
+    if reset:
+        for broker in _brokers:
+            broker.publish('reset', {})
+        return
+    changes = [dict(key, delta=delta) for key, delta in deltas.items() if delta]
+    if changes:
+        for broker in _brokers:
+            broker.publish('counts', {'changes': changes})
+
+
+def _clear_after_rollback(session):
+    session.info.pop('report_deltas', None)
+    session.info.pop('report_reset', None)
@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from database import analytics_session
+import archive
+from models import Report
+
+# Exported columns, in file order
+EXPORT_COLUMNS = ('id', 'timestamp', 'type', 'description', 'location',
+                  'language', 'status', 'finalized', 'notes', 'client_id')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+FILTERS = ('since', 'until', 'language', 'status', 'type')
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise InvalidFilter(f'Invalid {name} date: {value}') from e
+
+
+def parse_filters(args):
+    """Export filters from request args or CLI options
+
+    `since` and `until` are ISO dates or datetimes; a bare `until` date
+    includes that whole day.
+    """
+    filters = {name: args.get(name) for name in FILTERS if args.get(name)}
+    if 'since' in filters:
+        filters['since'] = _parse_date(filters['since'], 'since')
+    if 'until' in filters:
+        until = filters['until']
+        filters['until'] = _parse_date(until, 'until')
+        if len(until) == 10:
+            filters['until'] += timedelta(days=1)
+    return filters
+
+
+def export_query(filters, model=Report):
+    """Column-only select of the filtered reports, oldest first"""
+    stmt = select(*(getattr(model, column) for column in EXPORT_COLUMNS))
+    if 'since' in filters:
+        stmt = stmt.where(model.timestamp >= filters['since'])
+    if 'until' in filters:
+        stmt = stmt.where(model.timestamp < filters['until'])
+    for column in ('language', 'status', 'type'):
+        if column in filters:
+            stmt = stmt.where(getattr(model, column) == filters[column])
+    return stmt.order_by(model.timestamp, model.id)
+
+
+def _order(row):
+    # SQL sorts NULL timestamps first
+    return row.timestamp or datetime.min, row.id
+
+
+def iter_chunks(filters, chunk_size=5000, session=None):
+    """Yield lists of row tuples, `chunk_size` rows at a time
+
+    Reports and archived reports are read with server-side cursors where
+    the driver supports them and merged in timestamp order, so only a chunk
+    per table is held in memory at any point.
+    """
+    session = session or analytics_session()
+    return archive.iter_merged([export_query(filters, model) for model in archive.MODELS],
+                               key=_order, session=session, chunk_size=chunk_size)
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_csv(chunks):
+    """CSV text, one chunk of rows per yielded string"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows([_plain(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(chunks):
+    """NDJSON text, one chunk of rows per yielded string"""
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), ensure_ascii=False) + '\n'
+            for row in chunk)
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        (column, pa.timestamp('us') if column == 'timestamp'
+         else pa.bool_() if column == 'finalized' else pa.string())
+        for column in EXPORT_COLUMNS])
+
+
+def iter_parquet(chunks):
+    """Parquet bytes, one row group per chunk (requires pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _parquet_schema()
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    for chunk in chunks:
+        columns = list(zip(*chunk)) if chunk else [[] for _ in EXPORT_COLUMNS]
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'parquet': iter_parquet,
+}
+
+
+def export_reports(fmt, filters, chunk_size=5000, session=None):
+    """Yield the filtered reports encoded as `fmt`, chunk by chunk"""
+    return WRITERS[fmt](iter_chunks(filters, chunk_size, session))
@@ -1,7 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
+from analytics_cache import AnalyticsCache
+from chart_pool import ChartRenderPool
+from write_buffer import ReportWriteBuffer
+from snapshot_store import SnapshotStore
+from metrics import Metrics
+from events import EventBroker
+from static_assets import StaticAssets
 
 db = SQLAlchemy()
 migrate = Migrate()
 cors = CORS()
+analytics_cache = AnalyticsCache()
+chart_pool = ChartRenderPool()
+write_buffer = ReportWriteBuffer()
+snapshot_store = SnapshotStore()
+metrics = Metrics()
+event_broker = EventBroker()
+static_assets = StaticAssets()
@@ -0,0 +1,22 @@
+def try_lock(f):
+    """Lock an open file exclusively without waiting; False if another process holds it
+
+    The lock lasts until the file is closed. Uses flock on POSIX and a
+    one-byte msvcrt lock on Windows; the platform module is imported on
+    first use so that importing the app never needs it.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
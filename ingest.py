@@ -0,0 +1,166 @@
+import json
+from datetime import datetime
+from uuid import uuid4
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Report
+from analytics_cache import mark_reports_changed
+import rollups
+import duplicates
+import locations
+import archive
+
+REQUIRED_FIELDS = ['type', 'description', 'language']
+
+# Column limits of the reports table
+MAX_LENGTHS = {'type': 50, 'language': 8, 'location': 255, 'client_id': 64}
+
+
+class InvalidItem:
+    """Placeholder for a batch item that could not be parsed"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def validate_report(data):
+    """Return (fields, None) for a valid submission or (None, error message)"""
+    if isinstance(data, InvalidItem):
+        return None, data.error
+    if not isinstance(data, dict):
+        return None, 'Report must be a JSON object'
+    missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        return None, f'Missing fields: {", ".join(missing)}'
+
+    client_id = data.get('id')
+    fields = {
+        'type': data['type'],
+        'description': data['description'],
+        'location': data.get('location', ''),
+        'language': data['language'],
+        'client_id': str(client_id) if client_id not in (None, '') else None
+    }
+    for name, value in fields.items():
+        if value is not None and not isinstance(value, str):
+            return None, f'Field {name} must be a string'
+        if value and len(value) > MAX_LENGTHS.get(name, len(value)):
+            return None, f'Field {name} is longer than {MAX_LENGTHS[name]} characters'
+    return fields, None
+
+
+def _existing_client_ids(session, client_ids):
+    if not client_ids:
+        return {}
+    # Archived reports keep their client id, so resubmissions stay duplicates
+    return archive.find_client_ids(client_ids, session)
+
+
+def new_row(fields):
+    """Complete validated fields into a reports row with its server-side id"""
+    return dict(fields, id=str(uuid4()), timestamp=datetime.utcnow(),
+                status='pending', finalized=False)
+
+
+def insert_rows(rows, session=None):
+    """Insert complete report rows with one multi-row INSERT and commit
+
+    The rollup and location counters and duplicate signatures are updated
+    in the same transaction. Returns {report id: original report id} for the rows found
+    to be near-duplicates.
+    """
+    session = session or db.session
+    found = {}
+    try:
+        locations.index_reports(rows, session=session)
+        session.execute(insert(Report).values(rows))
+        rollups.record_many(rows, session=session)
+        if duplicates.enabled():
+            found = duplicates.index_reports(rows, session=session)
+        mark_reports_changed(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return found
+
+
+def ingest_chunk(items, offset=0, session=None):
+    """Validate and insert one chunk of submissions in a single transaction
+
+    Submissions carrying a client id ('id') that is already stored, or that
+    repeats earlier in the chunk, are reported as duplicates and not
+    inserted again. Returns one result dict per item.
+    """
+    session = session or db.session
+    results = []
+    valid = []
+    for index, data in enumerate(items, start=offset):
+        fields, error = validate_report(data)
+        if error:
+            results.append({'index': index, 'id': data.get('id') if isinstance(data, dict) else None,
+                            'status': 'invalid', 'error': error})
+        else:
+            results.append({'index': index, 'id': fields['client_id']})
+            valid.append((results[-1], fields))
+
+    for attempt in range(2):
+        existing = _existing_client_ids(
+            session, [fields['client_id'] for _, fields in valid if fields['client_id']])
+        rows = []
+        for result, fields in valid:
+            client_id = fields['client_id']
+            if client_id and client_id in existing:
+                result.update(status='duplicate', reportId=existing[client_id])
+                continue
+            row = new_row(fields)
+            if client_id:
+                existing[client_id] = row['id']
+            rows.append(row)
+            result.update(status='created', reportId=row['id'])
+
+        if not rows:
+            return results
+        try:
+            found = insert_rows(rows, session=session)
+            for result in results:
+                if result.get('reportId') in found:
+                    result['duplicateOf'] = found[result['reportId']]
+            return results
+        except IntegrityError:
+            # A concurrent request stored one of the client ids first;
+            # re-read the stored ids and retry once
+            if attempt:
+                raise
+    return results
+
+
+def ingest(items, chunk_size=500, session=None):
+    """Ingest an iterable of submissions in chunks; returns per-item results"""
+    results = []
+    chunk = []
+    for data in items:
+        chunk.append(data)
+        if len(chunk) >= chunk_size:
+            results.extend(ingest_chunk(chunk, offset=len(results), session=session))
+            chunk = []
+    if chunk:
+        results.extend(ingest_chunk(chunk, offset=len(results), session=session))
+    return results
+
+
+def iter_ndjson(stream):
+    """Yield one object per non-empty line of an NDJSON byte stream
+
+    Lines that are not valid JSON are yielded as InvalidItem so that they
+    show up as invalid items in the results.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidItem(f'Invalid JSON: {e}')
@@ -0,0 +1,156 @@
+import math
+from sqlalchemy import delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from analytics_cache import mark_reports_changed
+from extensions import db
+from models import ReportLatencyBucket
+import archive
+
+# Quantiles come out within this relative error of the exact ones (DDSketch)
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+# Shorter latencies (and negative ones from clock skew) share the lowest bucket
+MIN_SECONDS = 1.0
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def bucket_of(seconds):
+    """Index of the log-scale bucket holding a latency"""
+    return math.ceil(math.log(max(seconds, MIN_SECONDS)) / _LOG_GAMMA)
+
+
+def bucket_value(bucket):
+    """Latency standing for a bucket, within RELATIVE_ACCURACY of all it holds"""
+    return 2 * GAMMA ** bucket / (GAMMA + 1)
+
+
+class LatencySketch:
+    """Mergeable log-bucketed latency histogram (a DDSketch without collapsing)
+
+    Bucket counts simply add up, so the sketches of any set of days, types
+    and languages merge into the sketch of their union.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def add(self, seconds, n=1):
+        bucket = bucket_of(seconds)
+        self.counts[bucket] = self.counts.get(bucket, 0) + n
+
+    def merge(self, other):
+        for bucket, n in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + n
+        return self
+
+    def quantile(self, q):
+        """Estimated q-quantile in seconds, None for an empty sketch"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                return bucket_value(bucket)
+        return bucket_value(max(self.counts))
+
+    def summary(self, quantiles=DEFAULT_QUANTILES):
+        """{'count', 'p50', ...} with quantiles in seconds, to a tenth"""
+        result = {'count': self.count}
+        for q in quantiles:
+            value = self.quantile(q)
+            result[_label(q)] = round(value, 1) if value is not None else None
+        return result
+
+
+def _label(q):
+    return f'p{q * 100:g}'.replace('.', '_')
+
+
+def _key(report, seconds):
+    return {
+        'day': report.finalized_at.date(),
+        'type': report.type,
+        'language': report.language,
+        'bucket': bucket_of(seconds)
+    }
+
+
+def _apply(session, key, delta):
+    """Add `delta` to one sketch bucket with a single upsert"""
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(ReportLatencyBucket).values(count=delta, **key)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={'count': ReportLatencyBucket.count + delta})
+        session.execute(stmt)
+        return
+
+    updated = (session.query(ReportLatencyBucket)
+               .filter_by(**key)
+               .update({ReportLatencyBucket.count: ReportLatencyBucket.count + delta},
+                       synchronize_session=False))
+    if not updated:
+        session.add(ReportLatencyBucket(count=delta, **key))
+
+
+def record_finalized(report, session=None):
+    """Add a report's time to finalization; call before committing the finalize"""
+    if report.finalized_at is None or report.timestamp is None:
+        return
+    seconds = (report.finalized_at - report.timestamp).total_seconds()
+    _apply(session or db.session, _key(report, seconds), 1)
+
+
+def rebuild(session=None, chunk_size=10000):
+    """Recompute every sketch from the finalized_at of reports and archived reports"""
+    session = session or db.session
+    totals = {}
+    for model in archive.MODELS:
+        rows = session.execute(
+            db.select(model.timestamp, model.finalized_at, model.type, model.language)
+            .where(model.finalized_at.isnot(None), model.timestamp.isnot(None))
+            .execution_options(yield_per=chunk_size))
+        for row in rows:
+            key = tuple(_key(row, (row.finalized_at - row.timestamp).total_seconds()).values())
+            totals[key] = totals.get(key, 0) + 1
+    session.execute(delete(ReportLatencyBucket))
+    columns = ('day', 'type', 'language', 'bucket')
+    rows = [dict(zip(columns, key), count=n) for key, n in totals.items()]
+    for start in range(0, len(rows), chunk_size):
+        session.execute(db.insert(ReportLatencyBucket), rows[start:start + chunk_size])
+    mark_reports_changed(session)
+    session.commit()
+    return len(rows)
+
+
+def sketches(since, until, by=(), session=None, **filters):
+    """{group: LatencySketch} of reports finalized on days in [since, until)
+
+    `by` names the dimensions to group on ('type', 'language'); the group
+    is a tuple of their values, () without grouping. Keyword arguments
+    filter on a dimension, e.g. language='en'. Reads one row per bucket,
+    never the reports themselves.
+    """
+    session = session or db.session
+    dimensions = [getattr(ReportLatencyBucket, name) for name in by]
+    query = (session.query(*dimensions, ReportLatencyBucket.bucket,
+                           func.sum(ReportLatencyBucket.count))
+             .filter(ReportLatencyBucket.day >= since, ReportLatencyBucket.day < until)
+             .filter_by(**filters)
+             .group_by(*dimensions, ReportLatencyBucket.bucket))
+    result = {}
+    for *group, bucket, n in query:
+        sketch = result.setdefault(tuple(group), LatencySketch())
+        sketch.counts[bucket] = int(n)
+    return result
@@ -0,0 +1,281 @@
+import re
+import unicodedata
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from analytics_cache import mark_reports_changed
+from extensions import db
+from models import Location, ReportLocationRollup
+import archive
+
+# Address abbreviations expanded so that spelling variants share a key
+ABBREVIATIONS = {
+    'st': 'street', 'str': 'street', 'rd': 'road', 'ave': 'avenue', 'av': 'avenue',
+    'ln': 'lane', 'blvd': 'boulevard', 'hwy': 'highway', 'nr': 'near', 'opp': 'opposite',
+    'bldg': 'building', 'apt': 'apartment', 'mkt': 'market', 'stn': 'station',
+    'dist': 'district', 'dt': 'district', 'vill': 'village', 'sec': 'sector',
+    'ngr': 'nagar', 'clny': 'colony', 'jn': 'junction', 'jct': 'junction',
+}
+# "12.9716, 77.5946" or "12.9716° N 77.5946° E", possibly inside other text;
+# decimals are required so that "Sector 12, 45" is not read as coordinates
+COORDINATES = re.compile(
+    r'(-?\d{1,2}\.\d+)\s*°?\s*([NS])?\s*[,;/ ]\s*(-?\d{1,3}\.\d+)\s*°?\s*([EW])?', re.I)
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEO_PREFIX = 'geo:'
+
+
+def geohash(lat, lon, precision):
+    """Standard base32 geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_center(cell):
+    """(lat, lon) at the middle of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            span = lon_range if even else lat_range
+            middle = (span[0] + span[1]) / 2
+            span[0 if value >> shift & 1 else 1] = middle
+            even = not even
+    return (round((lat_range[0] + lat_range[1]) / 2, 6),
+            round((lon_range[0] + lon_range[1]) / 2, 6))
+
+
+def parse_coordinates(text):
+    """(lat, lon) written in a location, or None"""
+    match = COORDINATES.search(text)
+    if not match:
+        return None
+    lat, north_south, lon, east_west = match.groups()
+    lat, lon = float(lat), float(lon)
+    if north_south and north_south.upper() == 'S':
+        lat = -abs(lat)
+    if east_west and east_west.upper() == 'W':
+        lon = -abs(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def normalize(text):
+    """Canonical form of a free-text location: '' when nothing is left
+
+    Case, width, punctuation, spacing, Latin accents and common address
+    abbreviations are folded; other scripts keep their combining signs,
+    which carry vowels, but lose zero-width joiners.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    chars = []
+    for char in unicodedata.normalize('NFKD', text):
+        category = unicodedata.category(char)
+        if (category == 'Mn' and chars and chars[-1].isascii()) or category == 'Cf':
+            # An accent on a Latin letter, or a zero-width joiner
+            continue
+        chars.append(' ' if category[0] in 'PSZ' or category == 'Cc' else char)
+    tokens, initials = [], False
+    for token in unicodedata.normalize('NFC', ''.join(chars)).split():
+        initial = len(token) == 1 and token.isalpha()
+        if initial and initials:
+            # Initials: "M.G. Road" and "MG Road" are the same place
+            tokens[-1] += token
+            continue
+        initials = initial
+        tokens.append(ABBREVIATIONS.get(token, token))
+    return ' '.join(tokens)[:255]
+
+
+def parse(text, precision=None):
+    """(key, geohash) of a report location, or None when it has no content
+
+    Locations giving coordinates are keyed by their geohash cell at
+    `precision` (LOCATION_GEOHASH_PRECISION), so nearby points share one.
+    """
+    if not text or not text.strip():
+        return None
+    point = parse_coordinates(text)
+    if point:
+        precision = precision or current_app.config.get('LOCATION_GEOHASH_PRECISION', 7)
+        cell = geohash(*point, precision)
+        return GEO_PREFIX + cell, cell
+    key = normalize(text)
+    return (key, None) if key else None
+
+
+def location_ids(texts, session=None, chunk_size=500):
+    """{text: location id} for free-text locations, adding unknown ones"""
+    session = session or db.session
+    parsed = {}
+    for text in set(texts):
+        result = parse(text)
+        if result:
+            parsed[text] = result
+    labels = {}
+    for text, (key, cell) in parsed.items():
+        labels.setdefault(key, (text.strip()[:255], cell))
+    keys = list(labels)
+
+    ids = {}
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        ids.update(session.query(Location.key, Location.id).filter(Location.key.in_(chunk)))
+    missing = [key for key in keys if key not in ids]
+    if missing:
+        rows = [{'key': key, 'label': labels[key][0], 'geohash': labels[key][1]}
+                for key in missing]
+        dialect = session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            # Another writer may add the same location meanwhile
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            session.execute(insert(Location).on_conflict_do_nothing(index_elements=['key']), rows)
+        else:
+            session.execute(db.insert(Location), rows)
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start:start + chunk_size]
+            ids.update(session.query(Location.key, Location.id).filter(Location.key.in_(chunk)))
+    return {text: ids[key] for text, (key, _) in parsed.items() if key in ids}
+
+
+def _get(report, name):
+    return report[name] if isinstance(report, dict) else getattr(report, name)
+
+
+def _day(report):
+    return (_get(report, 'timestamp') or datetime.utcnow()).date()
+
+
+def _count(session, totals):
+    """Add {(day, type, location id): n} to the location counters"""
+    dialect = session.get_bind().dialect.name
+    for (day, type_, location_id), delta in totals.items():
+        key = {'day': day, 'type': type_, 'location_id': location_id}
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            stmt = insert(ReportLocationRollup).values(count=delta, **key)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key),
+                set_={'count': ReportLocationRollup.count + delta})
+            session.execute(stmt)
+            continue
+        updated = (session.query(ReportLocationRollup)
+                   .filter_by(**key)
+                   .update({ReportLocationRollup.count: ReportLocationRollup.count + delta},
+                           synchronize_session=False))
+        if not updated:
+            session.add(ReportLocationRollup(count=delta, **key))
+
+
+def index_reports(reports, session=None):
+    """Set the location_id of new reports (dicts or Report objects) and count them
+
+    Call in the transaction that inserts the reports, before inserting
+    them. Every dict gets a location_id key, None when its location is empty.
+    """
+    session = session or db.session
+    ids = location_ids([_get(r, 'location') for r in reports if _get(r, 'location')], session)
+    totals = {}
+    for report in reports:
+        location_id = ids.get(_get(report, 'location'))
+        if isinstance(report, dict):
+            report['location_id'] = location_id
+        else:
+            report.location_id = location_id
+        if location_id is not None:
+            key = (_day(report), _get(report, 'type'), location_id)
+            totals[key] = totals.get(key, 0) + 1
+    _count(session, totals)
+
+
+def backfill(chunk_size=2000, rebuild=False, session=None):
+    """Index the locations of existing reports and archived reports
+
+    Walks each table in (timestamp, id) order, one committed transaction
+    per chunk, so it can be interrupted and rerun; reports already indexed
+    are skipped. Run one backfill at a time. With `rebuild`, every report
+    is re-indexed (after the normalization rules change). Returns the
+    number of reports indexed.
+    """
+    session = session or db.session
+    if rebuild:
+        session.query(ReportLocationRollup).delete()
+        for model in archive.MODELS:
+            session.execute(update(model).values(location_id=None))
+        mark_reports_changed(session)
+        session.commit()
+
+    indexed = 0
+    for model in archive.MODELS:
+        last = None
+        while True:
+            query = (session.query(model.id, model.timestamp, model.type, model.location)
+                     .filter(model.location_id.is_(None), model.location.isnot(None)))
+            if last is not None:
+                query = query.filter(tuple_(model.timestamp, model.id) > last)
+            rows = query.order_by(model.timestamp, model.id).limit(chunk_size).all()
+            if not rows:
+                break
+            last = (rows[-1].timestamp, rows[-1].id)
+            reports = [row._asdict() for row in rows]
+            index_reports(reports, session)
+            updates = [{'id': r['id'], 'location_id': r['location_id']}
+                       for r in reports if r['location_id'] is not None]
+            if updates:
+                session.execute(update(model), updates)
+                mark_reports_changed(session)
+            session.commit()
+            indexed += len(updates)
+    return indexed
+
+
+def hotspots(since, until, limit=10, type_=None, cell_precision=None, session=None):
+    """Most reported locations (or geohash cells) among reports submitted in [since, until)
+
+    Reads the per-day location counters, never the reports. With
+    `cell_precision`, locations given as coordinates are grouped into
+    geohash cells of that many characters; text-only locations are left
+    out. Returns [(Location or cell, count), ...], largest first.
+    """
+    session = session or db.session
+    count = func.sum(ReportLocationRollup.count)
+    query = (session.query(ReportLocationRollup.location_id, count)
+             .filter(ReportLocationRollup.day >= since, ReportLocationRollup.day < until))
+    if type_:
+        query = query.filter(ReportLocationRollup.type == type_)
+
+    if cell_precision:
+        cell = func.substr(Location.geohash, 1, cell_precision)
+        rows = (query.with_entities(cell, count)
+                .join(Location, Location.id == ReportLocationRollup.location_id)
+                .filter(Location.geohash.isnot(None))
+                .group_by(cell)
+                .order_by(count.desc(), cell)
+                .limit(limit).all())
+        return [(value, int(n)) for value, n in rows]
+
+    rows = (query.group_by(ReportLocationRollup.location_id)
+            .order_by(count.desc(), ReportLocationRollup.location_id)
+            .limit(limit).all())
+    locations = {location.id: location for location in session.query(Location).filter(
+        Location.id.in_([location_id for location_id, _ in rows]))}
+    return [(locations[location_id], int(n)) for location_id, n in rows
+            if location_id in locations]
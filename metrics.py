@@ -0,0 +1,289 @@
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Default buckets (seconds) for latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Buckets for the number of SQL statements one request runs
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Values of the X-Profile header; anything else sorts by cumulative time
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls', 'filename', 'name')
+
+# Metrics created in this process, in registration order
+_registry = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}_total{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram:
+    """Cumulative histogram with a fixed set of label names"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # {label values: [per-bucket counts, sum]}
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+
+    def time(self, **labels):
+        """Decorator observing the wall time of each call"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorate
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = [('le', _number(bound))]
+                yield f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}'
+
+
+def instrument_methods(histogram, label='method'):
+    """Class decorator timing every public method into `histogram`"""
+    def decorate(cls):
+        for name, attr in list(vars(cls).items()):
+            if not name.startswith('_') and callable(attr):
+                setattr(cls, name, histogram.time(**{label: name})(attr))
+        return cls
+    return decorate
+
+
+def render():
+    """Every metric of this process in the Prometheus text exposition format"""
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint',
+    ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram(
+    'http_request_sql_queries', 'SQL statements run per request',
+    ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request', ('endpoint',))
+SQL_SECONDS = Histogram(
+    'sql_statement_duration_seconds', 'SQL statement latency by kind of statement',
+    ('statement',))
+ANALYTICS_SECONDS = Histogram(
+    'analytics_call_duration_seconds', 'ReportAnalytics method latency', ('method',))
+CHART_RENDER_SECONDS = Histogram(
+    'chart_render_duration_seconds', 'Time to draw and encode one chart',
+    ('chart', 'format'))
+CHART_JOB_SECONDS = Histogram(
+    'chart_job_duration_seconds', 'Chart pool jobs from submission to finished artifact',
+    ('chart', 'format', 'outcome'))
+PROFILED_REQUESTS = Counter(
+    'http_profiled_requests', 'Requests run under the profiler', ('endpoint',))
+
+
+def _statement_kind(statement):
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    SQL_SECONDS.observe(elapsed, statement=_statement_kind(statement))
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+        g.metrics_sql_seconds += elapsed
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('metrics_started'):
+        context.connection.info['metrics_started'].pop()
+
+
+class Metrics:
+    """Request, SQL, analytics and chart timings exposed at /metrics
+
+    Values are kept in memory per process; with several worker processes
+    each one reports its own, so scrape them individually or aggregate with
+    the usual Prometheus functions. With METRICS_PROFILING on, a request
+    carrying the X-Profile header runs under cProfile and its response is
+    replaced by the profile summary (the header value picks the sort key).
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._profile_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.profiling = app.config.get('METRICS_PROFILING', False)
+        self.profile_lines = app.config.get('METRICS_PROFILE_LINES', 40)
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics',
+                         self.metrics_view)
+
+    def metrics_view(self):
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_seconds = 0.0
+        if self.profiling and 'X-Profile' in request.headers \
+                and self._profile_lock.acquire(blocking=False):
+            # cProfile cannot run two profilers at once; concurrent requests
+            # asking for a profile are served normally
+            g.metrics_profiler = cProfile.Profile()
+            try:
+                g.metrics_profiler.enable()
+            except ValueError:
+                g.pop('metrics_profiler')
+                self._profile_lock.release()
+
+    def _after_request(self, response):
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method,
+                                status=str(response.status_code))
+        REQUEST_QUERIES.observe(g.metrics_queries, endpoint=endpoint)
+        REQUEST_SQL_SECONDS.observe(g.metrics_sql_seconds, endpoint=endpoint)
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={g.metrics_sql_seconds * 1000:.1f};desc="{g.metrics_queries} queries"')
+        if profiler is not None:
+            PROFILED_REQUESTS.inc(endpoint=endpoint)
+            return self._profile_response(profiler, response, elapsed)
+        return response
+
+    def _teardown_request(self, error=None):
+        # after_request is skipped when a request fails before a response
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+
+    def _profile_response(self, profiler, response, elapsed):
+        sort = request.headers.get('X-Profile') or 'cumulative'
+        if sort not in PROFILE_SORT_KEYS:
+            sort = 'cumulative'
+        out = io.StringIO()
+        out.write(f'{request.method} {request.full_path} -> {response.status_code}: '
+                  f'{elapsed * 1000:.1f} ms, {g.metrics_queries} SQL statements in '
+                  f'{g.metrics_sql_seconds * 1000:.1f} ms\n\n')
+        pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(self.profile_lines)
+        profiled = Response(out.getvalue(), mimetype='text/plain')
+        profiled.headers['X-Profiled-Status'] = str(response.status_code)
+        profiled.headers['Server-Timing'] = response.headers['Server-Timing']
+        return profiled
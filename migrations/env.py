@@ -51,6 +51,17 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(obj, name, type_, reflected, compare_to):
+    # The full-text search objects are created with raw DDL by the
+    # add_report_search and add_archive_search migrations and have no models
+    if reflected and compare_to is None and (
+            name.startswith(('report_search', 'report_archive_search'))
+            or name in ('search_vector', 'ix_reports_search_vector',
+                        'ix_report_archive_search_vector')):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -93,6 +104,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,114 @@
+"""add full-text search over archived reports
+
+Revision ID: 0b8e5d3a6c27
+Revises: f2a7c9e4b610
+Create Date: 2026-10-18 11:42:50.217604
+
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0b8e5d3a6c27'
+down_revision = 'f2a7c9e4b610'
+branch_labels = None
+depends_on = None
+
+# Same mapping as search.LANGUAGE_CONFIGS
+LANGUAGE_CONFIGS = {
+    'en': 'english',
+    'es': 'spanish',
+    'fr': 'french',
+    'hi': 'hindi',
+    'ta': 'tamil',
+}
+
+# SQLite: archived text is compressed, out of reach of triggers and views,
+# so the archive index keeps its own copy of the text and archive.move
+# indexes the reports it moves. A trigger drops deleted archived reports.
+SQLITE_UPGRADE = [
+    """CREATE TABLE report_archive_search_docs (
+        docid INTEGER PRIMARY KEY,
+        report_id VARCHAR(36) NOT NULL UNIQUE
+    )""",
+    """CREATE VIRTUAL TABLE report_archive_search USING fts5(
+        description, notes, location, language,
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER report_archive_search_delete AFTER DELETE ON report_archive BEGIN
+        DELETE FROM report_archive_search WHERE rowid = (
+            SELECT docid FROM report_archive_search_docs WHERE report_id = old.id);
+        DELETE FROM report_archive_search_docs WHERE report_id = old.id;
+    END""",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER report_archive_search_delete',
+    'DROP TABLE report_archive_search',
+    'DROP TABLE report_archive_search_docs',
+]
+
+
+def _decompress(value):
+    return None if value is None else zlib.decompress(value).decode()
+
+
+def _archived_reports(bind, chunk_size=1000):
+    """Archived reports with their text decompressed, oldest first, in chunks"""
+    select = ('SELECT id, timestamp, description, notes, location, language '
+              'FROM report_archive {} ORDER BY timestamp, id LIMIT :limit')
+    rows = bind.execute(sa.text(select.format('')), {'limit': chunk_size}).all()
+    while rows:
+        yield [{'id': row.id, 'description': _decompress(row.description),
+                'notes': _decompress(row.notes), 'location': row.location,
+                'language': row.language} for row in rows]
+        last = rows[-1]
+        rows = bind.execute(sa.text(select.format('WHERE (timestamp, id) > (:timestamp, :id)')),
+                            {'timestamp': last.timestamp, 'id': last.id, 'limit': chunk_size}).all()
+
+
+def _postgres_vector():
+    """tsvector of bound text parameters, as search.py computes it"""
+    available = set(op.get_bind().execute(sa.text('SELECT cfgname FROM pg_ts_config')).scalars())
+    cases = ' '.join(f"WHEN '{lang}' THEN '{config}'::regconfig"
+                     for lang, config in LANGUAGE_CONFIGS.items() if config in available)
+    config = f"CASE CAST(:language AS text) {cases} ELSE 'simple'::regconfig END"
+    return ' || '.join(
+        f"setweight(to_tsvector({config}, coalesce(CAST(:{column} AS text), '')), '{weight}')"
+        for column, weight in (('description', 'A'), ('notes', 'B'), ('location', 'C')))
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+        for rows in _archived_reports(bind):
+            bind.execute(sa.text('INSERT INTO report_archive_search_docs (report_id) VALUES (:id)'),
+                         rows)
+            bind.execute(sa.text(
+                'INSERT INTO report_archive_search (rowid, description, notes, location, language) '
+                'SELECT docid, :description, :notes, :location, :language '
+                'FROM report_archive_search_docs WHERE report_id = :id'), rows)
+    elif dialect == 'postgresql':
+        op.add_column('report_archive', sa.Column('search_vector', postgresql.TSVECTOR()))
+        op.execute('CREATE INDEX ix_report_archive_search_vector ON report_archive '
+                   'USING gin (search_vector)')
+        vector = _postgres_vector()
+        for rows in _archived_reports(bind):
+            bind.execute(sa.text(f'UPDATE report_archive SET search_vector = {vector} WHERE id = :id'),
+                         rows)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX ix_report_archive_search_vector')
+        op.drop_column('report_archive', 'search_vector')
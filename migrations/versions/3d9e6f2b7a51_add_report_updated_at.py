@@ -0,0 +1,27 @@
+"""add report updated_at
+
+Revision ID: 3d9e6f2b7a51
+Revises: 59c4374161b8
+Create Date: 2026-10-16 23:40:12.506118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9e6f2b7a51'
+down_revision = '59c4374161b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE: recreating reports in a batch would drop the
+    # full-text search triggers on SQLite
+    op.add_column('reports', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE reports SET updated_at = timestamp')
+
+
+def downgrade():
+    op.drop_column('reports', 'updated_at')
@@ -0,0 +1,43 @@
+"""add report signatures and lsh buckets
+
+Revision ID: 59c4374161b8
+Revises: a1cdd80a69c4
+Create Date: 2026-10-16 18:40:07.912334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '59c4374161b8'
+down_revision = 'a1cdd80a69c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_signatures',
+    sa.Column('report_id', sa.String(length=36), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.Column('duplicate_of', sa.String(length=36), nullable=True),
+    sa.Column('similarity', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('report_id')
+    )
+    with op.batch_alter_table('report_signatures', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_signatures_duplicate_of'), ['duplicate_of'], unique=False)
+
+    op.create_table('report_lsh_buckets',
+    sa.Column('bucket', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('report_id', sa.String(length=36), nullable=False),
+    sa.PrimaryKeyConstraint('bucket', 'report_id')
+    )
+    # Existing reports are signed by `flask reports backfill-duplicates`
+
+
+def downgrade():
+    op.drop_table('report_lsh_buckets')
+    with op.batch_alter_table('report_signatures', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_signatures_duplicate_of'))
+
+    op.drop_table('report_signatures')
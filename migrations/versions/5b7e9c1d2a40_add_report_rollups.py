@@ -0,0 +1,49 @@
+"""add report rollups
+
+Revision ID: 5b7e9c1d2a40
+Revises: 24e488500f58
+Create Date: 2026-10-16 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e9c1d2a40'
+down_revision = '24e488500f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rollups = op.create_table('report_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('language', sa.String(length=8), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('finalized', sa.Boolean(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'type', 'language', 'status', 'finalized')
+    )
+
+    # Backfill the counters from the existing reports
+    reports = sa.table('reports',
+                       sa.column('timestamp', sa.DateTime()),
+                       sa.column('type', sa.String()),
+                       sa.column('language', sa.String()),
+                       sa.column('status', sa.String()),
+                       sa.column('finalized', sa.Boolean()))
+    day = sa.func.date(reports.c.timestamp)
+    status = sa.func.coalesce(reports.c.status, 'pending')
+    finalized = sa.func.coalesce(reports.c.finalized, sa.false())
+    op.execute(rollups.insert().from_select(
+        ['day', 'type', 'language', 'status', 'finalized', 'count'],
+        sa.select(day, reports.c.type, reports.c.language, status, finalized,
+                  sa.func.count())
+        .where(reports.c.timestamp.isnot(None))
+        .group_by(day, reports.c.type, reports.c.language, status, finalized)))
+
+
+def downgrade():
+    op.drop_table('report_rollups')
@@ -0,0 +1,47 @@
+"""add report archive
+
+Revision ID: 7c2e4a9d1f38
+Revises: 3d9e6f2b7a51
+Create Date: 2026-10-17 09:14:27.630418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4a9d1f38'
+down_revision = '3d9e6f2b7a51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_archive',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('description', sa.LargeBinary(), nullable=False),
+    sa.Column('location', sa.String(length=255), nullable=True),
+    sa.Column('language', sa.String(length=8), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('finalized', sa.Boolean(), nullable=True),
+    sa.Column('notes', sa.LargeBinary(), nullable=True),
+    sa.Column('client_id', sa.String(length=64), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_report_archive_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_report_archive_language_timestamp_id', ['language', 'timestamp', 'id'], unique=False)
+    # Reports are moved in by `flask reports archive`
+
+
+def downgrade():
+    # Archived reports are dropped with the table
+    with op.batch_alter_table('report_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_archive_language_timestamp_id')
+        batch_op.drop_index('ix_report_archive_timestamp_id')
+
+    op.drop_table('report_archive')
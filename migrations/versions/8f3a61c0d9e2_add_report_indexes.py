@@ -0,0 +1,32 @@
+"""add report indexes
+
+Revision ID: 8f3a61c0d9e2
+Revises: 5b7e9c1d2a40
+Create Date: 2026-10-16 11:40:07.913552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a61c0d9e2'
+down_revision = '5b7e9c1d2a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.create_index('ix_reports_timestamp_id', ['timestamp', 'id'], unique=False)
+        batch_op.create_index('ix_reports_language_timestamp', ['language', 'timestamp'], unique=False)
+        batch_op.create_index('ix_reports_status_timestamp', ['status', 'timestamp'], unique=False)
+        batch_op.create_index('ix_reports_type_timestamp', ['type', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_reports_type_timestamp')
+        batch_op.drop_index('ix_reports_status_timestamp')
+        batch_op.drop_index('ix_reports_language_timestamp')
+        batch_op.drop_index('ix_reports_timestamp_id')
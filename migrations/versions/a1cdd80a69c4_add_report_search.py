@@ -0,0 +1,112 @@
+"""add full-text search over reports
+
+Revision ID: a1cdd80a69c4
+Revises: e7b2f4a81c63
+Create Date: 2026-10-16 17:02:18.553871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1cdd80a69c4'
+down_revision = 'e7b2f4a81c63'
+branch_labels = None
+depends_on = None
+
+# Same mapping as search.LANGUAGE_CONFIGS
+LANGUAGE_CONFIGS = {
+    'en': 'english',
+    'es': 'spanish',
+    'fr': 'french',
+    'hi': 'hindi',
+    'ta': 'tamil',
+}
+
+# SQLite: an FTS5 index over description, notes, location and language.
+# Report ids are strings and the implicit rowid of reports may change on
+# VACUUM, so report_search_docs assigns each report a stable integer docid.
+# The index reads its text through a view instead of keeping a copy.
+SQLITE_UPGRADE = [
+    """CREATE TABLE report_search_docs (
+        docid INTEGER PRIMARY KEY,
+        report_id VARCHAR(36) NOT NULL UNIQUE
+    )""",
+    """CREATE VIEW report_search_content AS
+        SELECT d.docid AS docid, r.description AS description, r.notes AS notes,
+               r.location AS location, r.language AS language
+        FROM report_search_docs AS d JOIN reports AS r ON r.id = d.report_id""",
+    # unicode61 splits on spaces and punctuation in every script the app
+    # supports and folds Latin accents; porter stems English terms
+    """CREATE VIRTUAL TABLE report_search USING fts5(
+        description, notes, location, language,
+        content='report_search_content', content_rowid='docid',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER reports_search_insert AFTER INSERT ON reports BEGIN
+        INSERT INTO report_search_docs (report_id) VALUES (new.id);
+        INSERT INTO report_search (rowid, description, notes, location, language)
+        SELECT docid, new.description, new.notes, new.location, new.language
+        FROM report_search_docs WHERE report_id = new.id;
+    END""",
+    """CREATE TRIGGER reports_search_delete AFTER DELETE ON reports BEGIN
+        INSERT INTO report_search (report_search, rowid, description, notes, location, language)
+        SELECT 'delete', docid, old.description, old.notes, old.location, old.language
+        FROM report_search_docs WHERE report_id = old.id;
+        DELETE FROM report_search_docs WHERE report_id = old.id;
+    END""",
+    """CREATE TRIGGER reports_search_update
+    AFTER UPDATE OF description, notes, location, language ON reports BEGIN
+        INSERT INTO report_search (report_search, rowid, description, notes, location, language)
+        SELECT 'delete', docid, old.description, old.notes, old.location, old.language
+        FROM report_search_docs WHERE report_id = old.id;
+        INSERT INTO report_search (rowid, description, notes, location, language)
+        SELECT docid, new.description, new.notes, new.location, new.language
+        FROM report_search_docs WHERE report_id = new.id;
+    END""",
+    # Docids follow submission order; search ranks the newest matches first
+    "INSERT INTO report_search_docs (report_id) SELECT id FROM reports ORDER BY timestamp, id",
+    "INSERT INTO report_search (report_search) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER reports_search_update',
+    'DROP TRIGGER reports_search_delete',
+    'DROP TRIGGER reports_search_insert',
+    'DROP TABLE report_search',
+    'DROP VIEW report_search_content',
+    'DROP TABLE report_search_docs',
+]
+
+
+def _postgres_vector():
+    """Generated tsvector expression, stemmed per row in the report's language"""
+    available = set(op.get_bind().execute(sa.text('SELECT cfgname FROM pg_ts_config')).scalars())
+    cases = ' '.join(f"WHEN '{lang}' THEN '{config}'::regconfig"
+                     for lang, config in LANGUAGE_CONFIGS.items() if config in available)
+    config = f"CASE language {cases} ELSE 'simple'::regconfig END"
+    return ' || '.join(
+        f"setweight(to_tsvector({config}, coalesce({column}, '')), '{weight}')"
+        for column, weight in (('description', 'A'), ('notes', 'B'), ('location', 'C')))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute(f'ALTER TABLE reports ADD COLUMN search_vector tsvector '
+                   f'GENERATED ALWAYS AS ({_postgres_vector()}) STORED')
+        op.execute('CREATE INDEX ix_reports_search_vector ON reports USING gin (search_vector)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX ix_reports_search_vector')
+        op.execute('ALTER TABLE reports DROP COLUMN search_vector')
@@ -0,0 +1,43 @@
+"""add report finalized_at and latency sketches
+
+Revision ID: b58d3e1c7f92
+Revises: 7c2e4a9d1f38
+Create Date: 2026-10-17 11:48:03.771905
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58d3e1c7f92'
+down_revision = '7c2e4a9d1f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ADD COLUMN: a batch rebuild of reports would drop its search triggers
+    op.add_column('reports', sa.Column('finalized_at', sa.DateTime(), nullable=True))
+    op.add_column('report_archive', sa.Column('finalized_at', sa.DateTime(), nullable=True))
+    # Since updated_at was added, finalizing is the only change that moves it
+    # past the submission time; older finalizations stay unknown
+    for table in ('reports', 'report_archive'):
+        op.execute(f'UPDATE {table} SET finalized_at = updated_at '
+                   f'WHERE finalized AND updated_at > timestamp')
+
+    op.create_table('report_latency_buckets',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('language', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'type', 'language', 'bucket')
+    )
+    # Sketches of existing reports are filled by `flask reports rebuild-latency`
+
+
+def downgrade():
+    op.drop_table('report_latency_buckets')
+    op.drop_column('report_archive', 'finalized_at')
+    op.drop_column('reports', 'finalized_at')
@@ -0,0 +1,29 @@
+"""extend language index for keyset pagination
+
+Revision ID: c41d7a9e3b15
+Revises: 8f3a61c0d9e2
+Create Date: 2026-10-16 14:05:52.227614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7a9e3b15'
+down_revision = '8f3a61c0d9e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pages order by (timestamp, id) within a language
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_reports_language_timestamp')
+        batch_op.create_index('ix_reports_language_timestamp_id', ['language', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_index('ix_reports_language_timestamp_id')
+        batch_op.create_index('ix_reports_language_timestamp', ['language', 'timestamp'], unique=False)
@@ -0,0 +1,51 @@
+"""add canonical locations and location rollups
+
+Revision ID: e49a6c2d8b13
+Revises: b58d3e1c7f92
+Create Date: 2026-10-17 15:22:41.093562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e49a6c2d8b13'
+down_revision = 'b58d3e1c7f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('locations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('label', sa.String(length=255), nullable=False),
+    sa.Column('geohash', sa.String(length=12), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    with op.batch_alter_table('locations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_locations_geohash'), ['geohash'], unique=False)
+
+    op.create_table('report_location_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=False),
+    sa.Column('location_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'type', 'location_id')
+    )
+    # Plain ADD COLUMN: a batch rebuild of reports would drop its search triggers
+    op.add_column('reports', sa.Column('location_id', sa.Integer(), nullable=True))
+    op.add_column('report_archive', sa.Column('location_id', sa.Integer(), nullable=True))
+    # Existing reports are indexed by `flask reports backfill-locations`
+
+
+def downgrade():
+    op.drop_column('report_archive', 'location_id')
+    op.drop_column('reports', 'location_id')
+    op.drop_table('report_location_rollups')
+    with op.batch_alter_table('locations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_locations_geohash'))
+
+    op.drop_table('locations')
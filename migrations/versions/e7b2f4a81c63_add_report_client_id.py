@@ -0,0 +1,28 @@
+"""add report client id
+
+Revision ID: e7b2f4a81c63
+Revises: c41d7a9e3b15
+Create Date: 2026-10-16 15:31:44.018392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2f4a81c63'
+down_revision = 'c41d7a9e3b15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_id', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_reports_client_id', ['client_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_reports_client_id', type_='unique')
+        batch_op.drop_column('client_id')
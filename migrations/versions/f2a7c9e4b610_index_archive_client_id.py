@@ -0,0 +1,27 @@
+"""index client ids of archived reports
+
+Revision ID: f2a7c9e4b610
+Revises: e49a6c2d8b13
+Create Date: 2026-10-18 10:05:12.418236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9e4b610'
+down_revision = 'e49a6c2d8b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Resubmissions are looked up by client id in the archive too
+    with op.batch_alter_table('report_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_report_archive_client_id', ['client_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_archive_client_id')
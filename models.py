@@ -1,10 +1,32 @@
+import zlib
 from uuid import uuid4
 from datetime import datetime
 from extensions import db
 
 
+class CompressedText(db.TypeDecorator):
+    """Text stored zlib-compressed in a binary column"""
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else zlib.compress(value.encode(), 6)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else zlib.decompress(value).decode()
+
+
 class Report(db.Model):
     __tablename__ = 'reports'
+    # Indexes follow the hot access paths; query_plans.py checks that the
+    # planner keeps using them
+    __table_args__ = (
+        db.Index('ix_reports_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_reports_language_timestamp_id', 'language', 'timestamp', 'id'),
+        db.Index('ix_reports_status_timestamp', 'status', 'timestamp'),
+        db.Index('ix_reports_type_timestamp', 'type', 'timestamp'),
+        db.UniqueConstraint('client_id', name='uq_reports_client_id'),
+    )
     id = db.Column(db.String(36), primary_key=True,
                    default=lambda: str(uuid4()))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -15,3 +37,99 @@ class Report(db.Model):
     status = db.Column(db.String(20), default="pending")
     finalized = db.Column(db.Boolean, default=False)
     notes = db.Column(db.Text, nullable=True)
+    # Idempotency key assigned by the submitting client (offline queue id)
+    client_id = db.Column(db.String(64), nullable=True)
+    # Last status change; versions the status for conditional GETs
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # First finalization; None for reports finalized before it was recorded
+    finalized_at = db.Column(db.DateTime, nullable=True)
+    # Canonical location (see locations.py); None until indexed
+    location_id = db.Column(db.Integer, nullable=True)
+
+
+class ArchivedReport(db.Model):
+    """Finalized report moved out of the reports table by archive.py
+
+    Same columns as Report, with the free text compressed. Read-only.
+    """
+    __tablename__ = 'report_archive'
+    __table_args__ = (
+        db.Index('ix_report_archive_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_report_archive_language_timestamp_id', 'language', 'timestamp', 'id'),
+        db.Index('ix_report_archive_client_id', 'client_id'),
+    )
+    id = db.Column(db.String(36), primary_key=True)
+    timestamp = db.Column(db.DateTime)
+    type = db.Column(db.String(50), nullable=False)
+    description = db.Column(CompressedText, nullable=False)
+    location = db.Column(db.String(255), nullable=True)
+    language = db.Column(db.String(8), nullable=False)
+    status = db.Column(db.String(20))
+    finalized = db.Column(db.Boolean, default=True)
+    notes = db.Column(CompressedText, nullable=True)
+    client_id = db.Column(db.String(64), nullable=True)
+    updated_at = db.Column(db.DateTime)
+    finalized_at = db.Column(db.DateTime)
+    location_id = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ReportRollup(db.Model):
+    """Per-day report counters by type, language and status, kept up to date on write"""
+    __tablename__ = 'report_rollups'
+    day = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    language = db.Column(db.String(8), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    finalized = db.Column(db.Boolean, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ReportLatencyBucket(db.Model):
+    """Time-to-finalization sketches per finalization day, type and language
+
+    Each row is one bucket of a log-scale (DDSketch) histogram; see latency.py.
+    """
+    __tablename__ = 'report_latency_buckets'
+    day = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    language = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Location(db.Model):
+    """Canonical location that free-text report locations are mapped to"""
+    __tablename__ = 'locations'
+    id = db.Column(db.Integer, primary_key=True)
+    # Normalized text, or 'geo:<geohash>' for coordinates (see locations.py)
+    key = db.Column(db.String(255), nullable=False, unique=True)
+    # The first spelling seen, for display
+    label = db.Column(db.String(255), nullable=False)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+
+
+class ReportLocationRollup(db.Model):
+    """Per-day report counters by type and canonical location"""
+    __tablename__ = 'report_location_rollups'
+    day = db.Column(db.Date, primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    location_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ReportSignature(db.Model):
+    """MinHash signature of a report's description (see duplicates.py)"""
+    __tablename__ = 'report_signatures'
+    report_id = db.Column(db.String(36), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+    # Original report this one near-duplicates, None for originals
+    duplicate_of = db.Column(db.String(36), nullable=True, index=True)
+    similarity = db.Column(db.Float, nullable=True)
+
+
+class ReportBucket(db.Model):
+    """LSH band buckets of the original reports' signatures"""
+    __tablename__ = 'report_lsh_buckets'
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    report_id = db.Column(db.String(36), primary_key=True)
@@ -0,0 +1,72 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
+from models import Report
+
+# Columns rendered by list views; description and notes stay unloaded
+LIST_COLUMNS = (Report.id, Report.type, Report.location, Report.timestamp,
+                Report.language, Report.status, Report.finalized)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(report):
+    """Opaque cursor for the (timestamp, id) position of a report"""
+    raw = f'{report.timestamp.isoformat()}|{report.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, report_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), report_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def _page_rows(query, limit, after=None, before=None):
+    """Up to limit + 1 rows past a cursor: oldest first with `before`, else newest first"""
+    model = query.column_descriptions[0]['entity']
+    key = tuple_(model.timestamp, model.id)
+    query = query.options(load_only(*(getattr(model, column.key) for column in LIST_COLUMNS)))
+    if before:
+        return (query.filter(key > decode_cursor(before))
+                .order_by(model.timestamp, model.id)
+                .limit(limit + 1).all())
+    if after:
+        query = query.filter(key < decode_cursor(after))
+    return (query.order_by(model.timestamp.desc(), model.id.desc())
+            .limit(limit + 1).all())
+
+
+def keyset_page(query, limit, after=None, before=None, archived=None):
+    """Return one page of reports, newest first, using keyset pagination
+
+    `after` continues to older reports, `before` goes back to newer ones.
+    Each page is a single index range read on (timestamp, id), so its cost
+    does not depend on how deep into the list it is. With `archived`, the
+    same query on ArchivedReport, both tables are read that way and the
+    pages merged. Returns (reports, next_cursor, prev_cursor).
+    """
+    rows = _page_rows(query, limit, after, before)
+    if archived is not None:
+        rows = sorted(rows + _page_rows(archived, limit, after, before),
+                      key=lambda report: (report.timestamp, report.id),
+                      reverse=not before)[:limit + 1]
+
+    if before:
+        # Walked forward in time from the cursor; flip back to newest first
+        has_more = len(rows) > limit
+        reports = list(reversed(rows[:limit]))
+        has_newer, has_older = has_more, True
+    else:
+        reports = rows[:limit]
+        has_newer, has_older = bool(after), len(rows) > limit
+
+    next_cursor = encode_cursor(reports[-1]) if reports and has_older else None
+    prev_cursor = encode_cursor(reports[0]) if reports and has_newer else None
+    return reports, next_cursor, prev_cursor
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_
+from extensions import db
+from models import Report
+import archive
+from aggregations import SQLAggregator
+from timebuckets import TrendWindow
+
+
+def hot_queries():
+    """The report queries that must stay on an index
+
+    Returns {name: (query, sorted_groups)}; sorted_groups marks queries that
+    order by an aggregate, where sorting the (small) grouped result is
+    expected.
+    """
+    aggregator = SQLAggregator()
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=30)
+    # Keyset page of the admin list, as built by pagination.keyset_page
+    page_key = tuple_(Report.timestamp, Report.id) < (now, 'x')
+    newest_first = (Report.timestamp.desc(), Report.id.desc())
+    return {
+        'get_report': (Report.query.filter(Report.id == 'x'), False),
+        # Keyset walk of `flask reports archive`
+        'archive_candidates': (Report.query.from_statement(
+            archive.candidates_query(cutoff, after=(cutoff, 'x'))), False),
+        'admin_list': (Report.query.filter(page_key).order_by(*newest_first), False),
+        'admin_list_by_language': (Report.query.filter_by(language='en')
+                                   .filter(page_key).order_by(*newest_first), False),
+        'pending_by_status': (Report.query.filter_by(status='pending')
+                              .order_by(Report.timestamp.desc()), False),
+        'count_by_type': (aggregator.count_by_query('type'), True),
+        'count_by_language': (aggregator.count_by_query('language'), True),
+        'count_by_status': (aggregator.count_by_query('status'), True),
+        'daily_counts': (aggregator.daily_counts_query(cutoff), False),
+        'daily_counts_by_type': (aggregator.daily_counts_by_type_query(cutoff), False),
+        # Hourly trend buckets in a non-UTC zone (rollups cannot serve these)
+        'trend_buckets_by_type': (aggregator.bucket_counts_query(
+            TrendWindow.last_days(3, granularity='hour', tz='Asia/Kolkata'), by_type=True), True),
+    }
+
+
+def explain(query, session=None):
+    """Return the SQLite EXPLAIN QUERY PLAN detail lines for a query"""
+    session = session or db.session
+    connection = session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    params = tuple(
+        value.isoformat(' ') if isinstance(value, datetime) else value
+        for value in (compiled.params[name] for name in compiled.positiontup))
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+    return [row[-1] for row in rows]
+
+
+def plan_problems(plan, table='reports', sorted_groups=False):
+    """Full table scans and sorts that could not use an index"""
+    problems = []
+    for detail in plan:
+        if detail.startswith(f'SCAN {table}') and 'USING' not in detail:
+            problems.append(detail)
+        elif detail.startswith('USE TEMP B-TREE FOR') and 'ORDER BY' in detail \
+                and not sorted_groups:
+            problems.append(detail)
+    return problems
+
+
+def check_plans(session=None):
+    """Explain every hot query; returns {name: (plan, problems)}"""
+    session = session or db.session
+    if session.get_bind().dialect.name != 'sqlite':
+        raise RuntimeError('Query plan checks run on SQLite only')
+    results = {}
+    for name, (query, sorted_groups) in hot_queries().items():
+        plan = explain(query, session)
+        results[name] = (plan, plan_problems(plan, sorted_groups=sorted_groups))
+    return results
@@ -0,0 +1,92 @@
+from datetime import datetime
+from sqlalchemy import func, false, delete, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from analytics_cache import mark_reports_changed
+from extensions import db
+from models import Report, ReportRollup
+import archive
+import events
+
+
+def _key(report, status=None, finalized=None):
+    """Rollup key of a report, optionally with an earlier status/finalized"""
+    timestamp = report.timestamp or datetime.utcnow()
+    return {
+        'day': timestamp.date(),
+        'type': report.type,
+        'language': report.language,
+        'status': (status if status is not None else report.status) or 'pending',
+        'finalized': bool(finalized if finalized is not None else report.finalized)
+    }
+
+
+def _apply(session, key, delta):
+    """Add `delta` to the counter for `key` with a single upsert"""
+    events.record_delta(session, key, delta)
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(ReportRollup).values(count=delta, **key)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={'count': ReportRollup.count + delta})
+        session.execute(stmt)
+        return
+
+    # Generic fallback: update in place, insert when the row is missing
+    updated = (session.query(ReportRollup)
+               .filter_by(**key)
+               .update({ReportRollup.count: ReportRollup.count + delta},
+                       synchronize_session=False))
+    if not updated:
+        session.add(ReportRollup(count=delta, **key))
+
+
+def record_created(report, session=None):
+    """Count a newly inserted report; call before committing the insert"""
+    _apply(session or db.session, _key(report), 1)
+
+
+def record_many(reports, session=None):
+    """Count a batch of newly inserted reports (dicts or Report objects)"""
+    session = session or db.session
+    totals = {}
+    for report in reports:
+        if isinstance(report, dict):
+            report = Report(**report)
+        key = tuple(_key(report).items())
+        totals[key] = totals.get(key, 0) + 1
+    for key, delta in totals.items():
+        _apply(session, dict(key), delta)
+
+
+def record_status_change(report, old_status, old_finalized, session=None):
+    """Move a report between status counters; call before committing the update"""
+    old_key = _key(report, status=old_status, finalized=bool(old_finalized))
+    new_key = _key(report)
+    if old_key == new_key:
+        return
+    session = session or db.session
+    _apply(session, old_key, -1)
+    _apply(session, new_key, 1)
+
+
+def rebuild(session=None):
+    """Recompute every rollup counter from the reports table and the archive"""
+    session = session or db.session
+    reports = union_all(*(
+        select(model.timestamp, model.type, model.language, model.status, model.finalized)
+        .where(model.timestamp.isnot(None))
+        for model in archive.MODELS)).subquery()
+    day = func.date(reports.c.timestamp)
+    status = func.coalesce(reports.c.status, 'pending')
+    finalized = func.coalesce(reports.c.finalized, false())
+    session.execute(delete(ReportRollup))
+    session.execute(ReportRollup.__table__.insert().from_select(
+        ['day', 'type', 'language', 'status', 'finalized', 'count'],
+        select(day, reports.c.type, reports.c.language, status, finalized, func.count())
+        .group_by(day, reports.c.type, reports.c.language, status, finalized)))
+    events.record_reset(session)
+    mark_reports_changed(session)
+    session.commit()
+    return session.query(func.count()).select_from(ReportRollup).scalar()
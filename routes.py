@@ -1,66 +1,433 @@
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for
-from extensions import db
-from models import Report
-from sqlalchemy import desc
+import hashlib
+import itertools
+from datetime import date, datetime, timedelta, timezone
+import click
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, send_file, current_app, \
+    Response, stream_with_context
+from sqlalchemy.exc import IntegrityError
+from extensions import db, analytics_cache, chart_pool, write_buffer, snapshot_store, event_broker
+from events import TooManySubscribers
+from write_buffer import BufferFull
+from chart_pool import MIMETYPES
+import charts
+import archive
+from models import ArchivedReport, Report
+import rollups
+from ingest import ingest, iter_ndjson, validate_report
+import query_plans
+import export
+import search
+import duplicates
+import latency
+import locations
+from aggregations import RollupAggregator
+from database import analytics_session
+from pagination import keyset_page, InvalidCursor
+from timebuckets import TrendWindow, InvalidWindow
 from analytics import ReportAnalytics
 
 reports_bp = Blueprint('reports', __name__)
+api_bp = Blueprint('api', __name__)
 
 
 @reports_bp.route('', methods=['POST'])
 def create_report():
-    data = request.get_json() or {}
-    # Validate required fields
-    required_fields = ['type', 'description', 'language']
-    missing = [field for field in required_fields if field not in data]
-    if missing:
-        return jsonify({'error': f'Missing fields: {', '.join(missing)}'}), 400
-
-    report = Report(
-        type=data['type'],
-        description=data['description'],
-        location=data.get('location', ''),
-        language=data['language']
-    )
-    db.session.add(report)
-    db.session.commit()
-    return jsonify({'reportId': report.id}), 201
+    data = request.get_json(silent=True) or {}
+    fields, error = validate_report(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    # A resubmission of the same client-side report returns the stored one
+    if fields['client_id']:
+        existing = archive.find_client_ids([fields['client_id']]).get(fields['client_id'])
+        if existing:
+            return jsonify({'reportId': existing}), 200
+
+    if write_buffer.enabled:
+        try:
+            report_id, created = write_buffer.submit(fields)
+        except BufferFull:
+            response = jsonify({'error': 'Server busy, retry shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        # Accepted and durable; the background writer inserts it shortly
+        return jsonify({'reportId': report_id}), 202 if created else 200
+
+    report = Report(**fields)
+    try:
+        locations.index_reports([report])
+        db.session.add(report)
+        db.session.flush()
+        rollups.record_created(report)
+        duplicate_of = None
+        if duplicates.enabled():
+            duplicate_of = duplicates.index_reports([report]).get(report.id)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # A concurrent resubmission stored the same client-side report first
+        existing = fields['client_id'] and \
+            archive.find_client_ids([fields['client_id']]).get(fields['client_id'])
+        if not existing:
+            raise
+        return jsonify({'reportId': existing}), 200
+    body = {'reportId': report.id}
+    if duplicate_of:
+        body['duplicateOf'] = duplicate_of
+    return jsonify(body), 201
+
+
+@reports_bp.route('/batch', methods=['POST'])
+def create_reports_batch():
+    """Bulk, idempotent report submission for offline sync
+
+    Accepts a JSON array (or {"reports": [...]}) or an NDJSON stream
+    (Content-Type: application/x-ndjson). Each report may carry the client's
+    id as an idempotency key. Returns one result per item, in order.
+    """
+    max_items = current_app.config.get('REPORTS_BATCH_MAX', 5000)
+    chunk_size = current_app.config.get('REPORTS_BATCH_CHUNK', 500)
+
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        items = iter_ndjson(request.stream)
+    else:
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('reports')
+        if not isinstance(payload, list):
+            return jsonify({'error': 'Expected a JSON array of reports'}), 400
+        if len(payload) > max_items:
+            return jsonify({'error': f'At most {max_items} reports per batch'}), 413
+        items = iter(payload)
+
+    results = ingest(itertools.islice(items, max_items), chunk_size=chunk_size)
+    summary = {status: sum(1 for r in results if r['status'] == status)
+               for status in ('created', 'duplicate', 'invalid')}
+    # Streams longer than the limit are cut off; the client resends the rest
+    truncated = next(items, None) is not None
+    return jsonify({'results': results, 'summary': summary,
+                    'truncated': truncated}), 200
+
+
+@reports_bp.route('/export.<fmt>', methods=['GET'])
+def export_reports(fmt):
+    """Stream the reports table as CSV, NDJSON or Parquet
+
+    Filters: since, until (ISO dates), language, status, type.
+    """
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f'Unsupported export format: {fmt}'}), 404
+    if fmt == 'parquet' and not export.parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+    try:
+        filters = export.parse_filters(request.args)
+    except export.InvalidFilter as e:
+        return jsonify({'error': str(e)}), 400
+
+    chunks = export.export_reports(
+        fmt, filters, chunk_size=current_app.config.get('REPORTS_EXPORT_CHUNK', 5000))
+    filename = f'reports-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}'
+    return Response(stream_with_context(chunks), mimetype=export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def _status_version(rows):
+    """(ETag, Last-Modified) of (id, status, updated_at) rows"""
+    digest = hashlib.sha1()
+    for report_id, status, updated_at in sorted(rows, key=lambda row: row[0]):
+        digest.update(f'{report_id}:{status}:{updated_at}\n'.encode())
+    last_modified = max((row[2] for row in rows if row[2]), default=None)
+    return digest.hexdigest()[:32], last_modified
+
+
+def _conditional(response, etag, last_modified):
+    """Tag a status response and answer 304 if the client's copy is current
+
+    Checked by hand rather than with make_conditional so that POSTed batch
+    lookups can revalidate too.
+    """
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Clients may keep the response but must revalidate before using it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    if request.if_none_match:
+        unchanged = etag in request.if_none_match
+    else:
+        unchanged = bool(last_modified and request.if_modified_since and
+                         last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+                         <= request.if_modified_since)
+    if unchanged:
+        response.status_code = 304
+        response.set_data(b'')
+    return response
 
 
 @reports_bp.route('/<string:report_id>', methods=['GET'])
 def get_report(report_id):
-    report = Report.query.get(report_id)
-    if not report:
+    row = archive.get_many([report_id], columns=('id', 'status', 'updated_at')).get(report_id)
+    if not row:
+        if write_buffer.pending(report_id):
+            return jsonify({'reportId': report_id, 'status': 'pending'}), 200
         return jsonify({'error': 'Report not found'}), 404
-    return jsonify({'reportId': report.id, 'status': report.status}), 200
+    etag, last_modified = _status_version([tuple(row)])
+    return _conditional(jsonify({'reportId': row.id, 'status': row.status}),
+                        etag, last_modified)
 
 
-@reports_bp.route('/admin/reports', methods=['GET'])
-def get_all_reports():
+def _requested_ids():
+    """Report ids of a batch status lookup, deduplicated in request order
+
+    Taken from ?ids=a,b (or repeated ids=) on GET, or from a JSON list or
+    {"ids": [...]} on POST.
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            payload = payload.get('ids')
+        if not isinstance(payload, list):
+            raise ValueError('Expected a JSON array of report ids')
+        ids = payload
+    else:
+        ids = [i for value in request.args.getlist('ids') for i in value.split(',')]
+    if not all(isinstance(i, str) for i in ids):
+        raise ValueError('Report ids must be strings')
+    return list(dict.fromkeys(i.strip() for i in ids if i.strip()))
+
+
+@reports_bp.route('/status', methods=['GET', 'POST'])
+def get_report_statuses():
+    """Statuses of many reports in one call, for clients polling for review
+
+    Reports still queued by the write-behind buffer are 'pending'; unknown
+    ids are listed under notFound. Supports If-None-Match and
+    If-Modified-Since like the single report lookup.
+    """
+    try:
+        ids = _requested_ids()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    max_ids = current_app.config.get('REPORTS_STATUS_BATCH_MAX', 1000)
+    if len(ids) > max_ids:
+        return jsonify({'error': f'At most {max_ids} report ids per lookup'}), 413
+
+    chunk_size = current_app.config.get('REPORTS_STATUS_CHUNK', 500)
+    found = {}
+    for start in range(0, len(ids), chunk_size):
+        rows = archive.get_many(ids[start:start + chunk_size],
+                                columns=('id', 'status', 'updated_at'))
+        found.update((report_id, tuple(row)) for report_id, row in rows.items())
+    for report_id in ids:
+        if report_id not in found and write_buffer.pending(report_id):
+            found[report_id] = (report_id, 'pending', None)
+
+    reports = [{'reportId': report_id, 'status': found[report_id][1],
+                'updatedAt': found[report_id][2].isoformat() if found[report_id][2] else None}
+               for report_id in ids if report_id in found]
+    not_found = [report_id for report_id in ids if report_id not in found]
+    etag, last_modified = _status_version(list(found.values()) + [(i, None, None) for i in not_found])
+    return _conditional(jsonify({'reports': reports, 'notFound': not_found}),
+                        etag, last_modified)
+
+
+def _report_page():
+    """Keyset-paginated reports for the admin list and /api/reports"""
     filter_language = request.args.get('language', '')
+    limit = request.args.get('limit', current_app.config.get('REPORTS_PAGE_SIZE', 50), type=int)
+    limit = max(1, min(limit, current_app.config.get('REPORTS_MAX_PAGE_SIZE', 200)))
 
-    query = Report.query
+    query, archived = Report.query, ArchivedReport.query
     if filter_language:
         query = query.filter_by(language=filter_language)
+        archived = archived.filter_by(language=filter_language)
+
+    reports, next_cursor, prev_cursor = keyset_page(
+        query, limit,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        archived=archived)
+    return filter_language, limit, reports, next_cursor, prev_cursor
+
+
+def _search_page():
+    """Ranked full-text search results for the admin list and /api/reports/search
+
+    Query parameters: q, language, limit and page (from 1).
+    """
+    filter_language = request.args.get('language', '')
+    limit = request.args.get('limit', current_app.config.get('REPORTS_PAGE_SIZE', 50), type=int)
+    limit = max(1, min(limit, current_app.config.get('REPORTS_MAX_PAGE_SIZE', 200)))
+    page = max(1, request.args.get('page', 1, type=int))
+    if page * limit > current_app.config.get('SEARCH_MAX_RESULTS', 1000):
+        raise search.InvalidQuery('Refine the search to see more results')
 
-    reports = query.order_by(desc(Report.timestamp)).all()
+    hits, has_more = search.search_reports(
+        request.args.get('q', ''), language=filter_language or None,
+        limit=limit, offset=(page - 1) * limit,
+        window=current_app.config.get('SEARCH_RANK_WINDOW', 10000), session=analytics_session())
+    return filter_language, limit, page, hits, has_more
+
+
+def _report_json(report):
+    return {
+        'reportId': report.id,
+        'type': report.type,
+        'location': report.location,
+        'language': report.language,
+        'status': report.status,
+        'finalized': bool(report.finalized),
+        'timestamp': report.timestamp.isoformat() if report.timestamp else None
+    }
+
+
+def _status_counts(filter_language):
+    filters = {'language': filter_language} if filter_language else {}
+    return dict(RollupAggregator(analytics_session()).count_by('status', **filters))
+
+
+@reports_bp.route('/admin/reports', methods=['GET'])
+def get_all_reports():
+    query = request.args.get('q', '').strip()
+    page, has_more, snippets = None, False, {}
+    try:
+        if query:
+            filter_language, limit, page, hits, has_more = _search_page()
+            reports = [hit['report'] for hit in hits]
+            snippets = {hit['report'].id: hit['snippet'] for hit in hits}
+            next_cursor = prev_cursor = None
+        else:
+            filter_language, limit, reports, next_cursor, prev_cursor = _report_page()
+    except (InvalidCursor, search.InvalidQuery) as e:
+        return str(e), 400
+
+    status_counts = _status_counts(filter_language)
     return render_template('reports_list.html',
+                           duplicate_of=duplicates.duplicate_of([r.id for r in reports]),
                            reports=reports,
-                           filter_language=filter_language)
+                           filter_language=filter_language,
+                           status_counts=status_counts,
+                           total_count=sum(status_counts.values()),
+                           limit=limit,
+                           next_cursor=next_cursor,
+                           prev_cursor=prev_cursor,
+                           query=query,
+                           page=page,
+                           has_more=has_more,
+                           snippets=snippets)
+
+
+@api_bp.route('/reports', methods=['GET'])
+def list_reports():
+    """JSON list of reports, newest first, with keyset pagination
+
+    Query parameters: language, limit, after/before (cursors from a previous
+    page) and include_counts=1 for per-status and per-type totals.
+    """
+    try:
+        filter_language, limit, reports, next_cursor, prev_cursor = _report_page()
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    body = {
+        'reports': [_report_json(r) for r in reports],
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
+    if request.args.get('include_counts') == '1':
+        filters = {'language': filter_language} if filter_language else {}
+        status_counts = _status_counts(filter_language)
+        body['counts'] = {
+            'total': sum(status_counts.values()),
+            'status_counts': status_counts,
+            'type_counts': dict(RollupAggregator(analytics_session()).count_by('type', **filters))
+        }
+    return jsonify(body), 200
+
+
+@api_bp.route('/reports/search', methods=['GET'])
+def search_reports():
+    """Full-text search over report descriptions, notes and locations
+
+    Query parameters: q (terms, "phrases", OR, -term, prefix*), language,
+    limit and page. Results are ordered by relevance; each carries its
+    score and an HTML snippet with the matches in <mark> tags.
+    """
+    try:
+        filter_language, limit, page, hits, has_more = _search_page()
+    except search.InvalidQuery as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'results': [dict(_report_json(hit['report']), score=hit['score'],
+                         snippet=str(hit['snippet'])) for hit in hits],
+        'query': request.args.get('q', ''),
+        'language': filter_language or None,
+        'page': page,
+        'limit': limit,
+        'has_more': has_more
+    }), 200
+
+
+@reports_bp.route('/admin/duplicates', methods=['GET'])
+def duplicate_clusters():
+    limit = current_app.config.get('REPORTS_PAGE_SIZE', 50)
+    page = max(1, request.args.get('page', 1, type=int))
+    clusters = duplicates.clusters(limit=limit + 1, offset=(page - 1) * limit,
+                                   session=analytics_session())
+    return render_template('duplicates.html',
+                           clusters=clusters[:limit],
+                           page=page,
+                           has_more=len(clusters) > limit,
+                           suppressed=duplicates.count_suppressed(analytics_session()),
+                           original=None)
+
+
+@reports_bp.route('/admin/duplicates/<string:report_id>', methods=['GET'])
+def duplicate_cluster(report_id):
+    original_id, members = duplicates.cluster(report_id)
+    original = archive.get_or_404(original_id)
+    reports = archive.get_many([rid for rid, _ in members])
+    return render_template('duplicates.html',
+                           original=original,
+                           members=[(reports[rid], score) for rid, score in members if rid in reports],
+                           suppressed=duplicates.count_suppressed(analytics_session()))
+
+
+@api_bp.route('/reports/<string:report_id>/duplicates', methods=['GET'])
+def get_report_duplicates(report_id):
+    """The near-duplicate cluster of a report: its original and the duplicates"""
+    if not archive.get(report_id):
+        return jsonify({'error': 'Report not found'}), 404
+    original, members = duplicates.cluster(report_id)
+    return jsonify({
+        'reportId': report_id,
+        'original': original,
+        'duplicates': [{'reportId': rid, 'similarity': score} for rid, score in members]
+    }), 200
 
 
 @reports_bp.route('/admin/reports/<string:report_id>/finalize', methods=['GET'])
 def finalize_view(report_id):
-    report = Report.query.get_or_404(report_id)
+    report = db.session.get(Report, report_id)
+    if report is None:
+        # Archived reports are finalized and read-only
+        archive.get_or_404(report_id)
+        return redirect(url_for('reports.view_report', report_id=report_id))
     return render_template('report_finalize.html', report=report)
 
 
 @reports_bp.route('/admin/reports/<string:report_id>/finalize', methods=['POST'])
 def finalize_report(report_id):
-    report = Report.query.get_or_404(report_id)
+    report = db.session.get(Report, report_id)
+    if report is None:
+        archive.get_or_404(report_id)
+        return "Archived reports are read-only", 409
 
     action = request.form.get('action')
     notes = request.form.get('notes', '')
+    old_status, old_finalized = report.status, report.finalized
 
     if action == 'approve':
         report.status = 'approved'
@@ -71,6 +438,12 @@ def finalize_report(report_id):
 
     report.finalized = True
     report.notes = notes
+    report.updated_at = datetime.utcnow()
+    rollups.record_status_change(report, old_status, old_finalized)
+    if report.finalized_at is None:
+        # Review latency counts the first decision only
+        report.finalized_at = report.updated_at
+        latency.record_finalized(report)
 
     db.session.commit()
     return redirect(url_for('reports.get_all_reports'))
@@ -78,17 +451,163 @@ def finalize_report(report_id):
 
 @reports_bp.route('/admin/reports/<string:report_id>/view', methods=['GET'])
 def view_report(report_id):
-    report = Report.query.get_or_404(report_id)
+    report = archive.get_or_404(report_id)
     return render_template('report_view.html', report=report)
 
 
+@reports_bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the report_rollups counters from the reports table."""
+    rows = rollups.rebuild()
+    print(f'Rebuilt report rollups: {rows} counter rows')
+
+
+@reports_bp.cli.command('rebuild-latency')
+def rebuild_latency_command():
+    """Recompute the time-to-finalization sketches from finalized_at."""
+    rows = latency.rebuild()
+    print(f'Rebuilt latency sketches: {rows} bucket rows')
+
+
+@reports_bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Re-index every report for full-text search."""
+    search.rebuild()
+    print('Rebuilt the report search index')
+
+
+@reports_bp.cli.command('backfill-duplicates')
+@click.option('--rebuild', is_flag=True, help='Recompute every signature, not only missing ones.')
+@click.option('--chunk-size', default=2000, show_default=True)
+def backfill_duplicates_command(rebuild, chunk_size):
+    """Sign existing reports and group near-duplicates."""
+    signed, found = duplicates.backfill(chunk_size=chunk_size, rebuild=rebuild)
+    print(f'Signed {signed} reports, {found} near-duplicates')
+
+
+@reports_bp.cli.command('backfill-locations')
+@click.option('--rebuild', is_flag=True, help='Re-index every report, not only new ones.')
+@click.option('--chunk-size', default=2000, show_default=True)
+def backfill_locations_command(rebuild, chunk_size):
+    """Map existing report locations to canonical locations."""
+    indexed = locations.backfill(chunk_size=chunk_size, rebuild=rebuild)
+    print(f'Indexed the locations of {indexed} reports')
+
+
+@reports_bp.cli.command('check-plans')
+def check_plans_command():
+    """Fail if a hot reports query falls back to a full scan (SQLite only)."""
+    failed = False
+    for name, (plan, problems) in query_plans.check_plans().items():
+        print(f"{'FAIL' if problems else 'ok  '} {name}: {'; '.join(plan)}")
+        failed = failed or bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+
+@reports_bp.cli.command('refresh-snapshot')
+@click.option('--full', is_flag=True, help='Rebuild the snapshot instead of appending')
+def refresh_snapshot_command(full):
+    """Bring the columnar analytics snapshot up to date."""
+    if not snapshot_store.enabled:
+        raise click.ClickException('ANALYTICS_SNAPSHOT_ENABLED is off (or pyarrow is missing)')
+    added = snapshot_store.refresh(full=full)
+    if added is None:
+        raise click.ClickException('Another process is refreshing the snapshot')
+    print(f"Snapshot {'rebuilt' if full else 'refreshed'}: {added} reports added, "
+          f"as of {snapshot_store.freshness()['as_of']}")
+
+
+@reports_bp.cli.command('archive')
+@click.option('--older-than', 'days', type=int, help='Days since submission and last change '
+              '[default: ARCHIVE_AFTER_DAYS]')
+@click.option('--batch-size', type=int, help='Reports moved per transaction '
+              '[default: ARCHIVE_BATCH_SIZE]')
+def archive_command(days, batch_size):
+    """Move old finalized reports to the archive table."""
+    config = current_app.config
+    moved = archive.run(days if days is not None else config.get('ARCHIVE_AFTER_DAYS', 90),
+                        batch_size=batch_size or config.get('ARCHIVE_BATCH_SIZE', 500),
+                        pause=config.get('ARCHIVE_PAUSE_MS', 50) / 1000,
+                        lock_dir=current_app.instance_path)
+    if moved is None:
+        raise click.ClickException('Another process is archiving reports')
+    print(f'Archived {moved} reports')
+
+
+@reports_bp.cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(sorted(export.FORMATS)), default='csv')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), required=True)
+@click.option('--since', help='ISO date or datetime (inclusive)')
+@click.option('--until', help='ISO date (whole day included) or datetime (exclusive)')
+@click.option('--language')
+@click.option('--status')
+@click.option('--type', 'type_')
+def export_command(fmt, output, since, until, language, status, type_):
+    """Stream the reports table to a CSV, NDJSON or Parquet file."""
+    if fmt == 'parquet' and not export.parquet_available():
+        raise click.ClickException('Parquet export requires pyarrow')
+    try:
+        filters = export.parse_filters({'since': since, 'until': until, 'language': language,
+                                        'status': status, 'type': type_})
+    except export.InvalidFilter as e:
+        raise click.ClickException(str(e))
+    chunks = export.export_reports(
+        fmt, filters, chunk_size=current_app.config.get('REPORTS_EXPORT_CHUNK', 5000))
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+    print(f'Exported reports to {output}')
+
+
 # Analytics endpoints
+def _async_charts():
+    """Whether the caller asked for chart job handles instead of inline images"""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+
+def _chart_handle(job_id):
+    if job_id is None:
+        return None
+    return chart_pool.handle(job_id, url_for('reports.get_chart_job', job_id=job_id))
+
+
+def _submit_chart(name, data):
+    """Handle of a chart rendered from cached series, or None without data
+
+    Only the series are cached: jobs live in this host's pool, so every
+    request submits again, which costs nothing for charts already rendered
+    or rendering and re-renders those lost to a restart or a failure.
+    """
+    return _chart_handle(chart_pool.submit(name, data) if data is not None else None)
+
+
+def _chart_response(body, handles):
+    """202 while any of the queued charts is still rendering"""
+    pending = any(h and h['status'] == 'pending' for h in handles)
+    return jsonify(body), 202 if pending else 200
+
+
 @reports_bp.route('/analytics/stats', methods=['GET'])
 def get_analytics_stats():
     """Get comprehensive analytics statistics"""
     try:
-        analytics = ReportAnalytics()
-        report = analytics.generate_comprehensive_report()
+        if _async_charts():
+            report = analytics_cache.get_or_compute(
+                'stats:chart-data',
+                lambda: ReportAnalytics().generate_comprehensive_report(chart_data=True))
+            report['charts'] = {name: _submit_chart(name, data)
+                                for name, data in report.pop('chart_data').items()}
+            return _chart_response(report, report['charts'].values())
+        if request.args.get('charts') == 'none':
+            # Statistics only, for clients that draw charts from the data endpoints
+            report = analytics_cache.get_or_compute(
+                'stats:nocharts',
+                lambda: ReportAnalytics().generate_comprehensive_report(include_charts=False))
+            return jsonify(report), 200
+
+        report = analytics_cache.get_or_compute(
+            'stats', lambda: ReportAnalytics().generate_comprehensive_report())
         return jsonify(report), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -97,51 +616,304 @@ def get_analytics_stats():
 @reports_bp.route('/analytics/categories', methods=['GET'])
 def get_category_analytics():
     """Get category-specific analytics"""
-    try:
+    use_pool = _async_charts()
+
+    def compute():
         analytics = ReportAnalytics()
-        stats = analytics.get_category_statistics()
-        chart = analytics.generate_category_chart()
-        return jsonify({
-            'statistics': stats,
-            'chart': chart
-        }), 200
+        if use_pool:
+            chart = analytics.get_category_chart_data()
+        else:
+            chart = analytics.generate_category_chart()
+        return {
+            'statistics': analytics.get_category_statistics(),
+            'chart': chart,
+            'freshness': analytics.get_freshness('categories')
+        }
+
+    try:
+        key = 'categories:chart-data' if use_pool else 'categories'
+        result = analytics_cache.get_or_compute(key, compute)
+        if use_pool:
+            result['chart'] = _submit_chart('categories', result['chart'])
+            return _chart_response(result, [result['chart']])
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _trend_window():
+    """TrendWindow from the from/to/days/granularity/tz query parameters"""
+    return TrendWindow.from_args(
+        request.args, max_points=current_app.config.get('TRENDS_MAX_POINTS', 120))
+
+
 @reports_bp.route('/analytics/trends', methods=['GET'])
 def get_trends_analytics():
-    """Get time-based trend analytics"""
+    """Get time-based trend analytics
+
+    Query parameters: from/to (ISO dates or datetimes) or days, granularity
+    (hour, day, week, month or auto) and tz.
+    """
     try:
-        days = request.args.get('days', 30, type=int)
+        window = _trend_window()
+    except InvalidWindow as e:
+        return jsonify({'error': str(e)}), 400
+    use_pool = _async_charts()
+
+    def compute():
         analytics = ReportAnalytics()
-        trends_chart = analytics.generate_trends_chart(days)
-        category_trends_chart = analytics.generate_category_trends_chart(days)
-        return jsonify({
-            'trends_chart': trends_chart,
-            'category_trends_chart': category_trends_chart,
-            'period_days': days
-        }), 200
+        if use_pool:
+            return {
+                'trends_chart': analytics.get_trends_data(window=window),
+                'category_trends_chart': analytics.get_category_trends_data(window=window),
+                'period_days': window.days,
+                'window': window.describe(),
+                'freshness': analytics.get_freshness('trends')
+            }
+        return {
+            'trends_chart': analytics.generate_trends_chart(window=window),
+            'category_trends_chart': analytics.generate_category_trends_chart(window=window),
+            'period_days': window.days,
+            'window': window.describe(),
+            'freshness': analytics.get_freshness('trends')
+        }
+
+    try:
+        key = f'trends:{window.key}:chart-data' if use_pool else f'trends:{window.key}'
+        result = analytics_cache.get_or_compute(key, compute)
+        if use_pool:
+            result['trends_chart'] = _submit_chart('trends', result['trends_chart'])
+            result['category_trends_chart'] = _submit_chart('category_trends',
+                                                            result['category_trends_chart'])
+            return _chart_response(
+                result, [result['trends_chart'], result['category_trends_chart']])
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/analytics/charts/<string:name>.<string:fmt>', methods=['GET'])
+def get_chart(name, fmt):
+    """Serve a chart as a raw image, or its aggregated series with the .json format
+
+    Query parameters: the trend window (from/to or days, granularity, tz)
+    for trend charts, dpi or width (pixels), export=1 for print resolution.
+    Answers 202 with the job handle while an image is still rendering.
+    """
+    if name not in charts.RENDERERS:
+        return jsonify({'error': f'Unknown chart: {name}'}), 404
+    if fmt != 'json' and fmt not in MIMETYPES:
+        return jsonify({'error': f'Unsupported chart format: {fmt}'}), 400
+    try:
+        window = _trend_window()
+    except InvalidWindow as e:
+        return jsonify({'error': str(e)}), 400
+
+    def compute():
+        analytics = ReportAnalytics()
+        return {'data': analytics.get_chart_data(name, window=window),
+                'freshness': analytics.get_freshness(name)}
+
+    try:
+        key = 'chart-data:categories' if name == 'categories' else f'chart-data:{name}:{window.key}'
+        result = analytics_cache.get_or_compute(key, compute)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    data = result['data']
+
+    if fmt == 'json':
+        response = jsonify({'name': name, 'data': data, 'freshness': result['freshness']})
+        response.set_etag(chart_pool.job_id(name, result, 'json'))
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        return response.make_conditional(request)
+
+    if data is None:
+        return jsonify({'error': 'No data available for chart'}), 404
+    dpi = charts.resolve_dpi(name,
+                             dpi=request.args.get('dpi', type=int),
+                             width=request.args.get('width', type=int),
+                             export=request.args.get('export') == '1')
+
+    # The job id hashes data and render options, so it doubles as a strong
+    # ETag and lets revalidation skip rendering entirely
+    job_id = chart_pool.job_id(name, data, fmt, dpi)
+    if job_id in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        # A rendered artifact is served at once; otherwise the request holds
+        # its worker for at most CHART_RENDER_WAIT before handing back the job
+        chart_pool.submit(name, data, fmt, dpi)
+        status = chart_pool.wait(job_id, timeout=current_app.config.get('CHART_RENDER_WAIT', 0))
+        if status == 'pending':
+            response = jsonify(_chart_handle(job_id))
+            response.status_code = 202
+            response.headers['Retry-After'] = '1'
+            return response
+        if status != 'done':
+            return jsonify({'job_id': job_id, 'status': status,
+                            'error': chart_pool.error(job_id)}), 500
+        response = send_file(chart_pool.artifact_path(job_id),
+                             mimetype=MIMETYPES[fmt], conditional=False, etag=False,
+                             max_age=300)
+    response.set_etag(job_id)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
+
+@reports_bp.route('/analytics/charts/jobs/<string:job_id>', methods=['GET'])
+def get_chart_job(job_id):
+    """Serve a rendered chart, or the job status while it is still rendering"""
+    status = chart_pool.status(job_id)
+    if status == 'done':
+        path = chart_pool.artifact_path(job_id)
+        mimetype = MIMETYPES[path.rsplit('.', 1)[1]]
+        return send_file(path, mimetype=mimetype, max_age=3600)
+    if status == 'pending':
+        response = jsonify(_chart_handle(job_id))
+        response.headers['Retry-After'] = '1'
+        return response, 202
+    if status == 'error':
+        return jsonify({'job_id': job_id, 'status': status,
+                        'error': chart_pool.error(job_id)}), 500
+    return jsonify({'error': 'Chart job not found'}), 404
 
 
 @reports_bp.route('/analytics/summary', methods=['GET'])
 def get_analytics_summary():
     """Get quick summary statistics"""
-    try:
+    def compute():
         analytics = ReportAnalytics()
         category_stats = analytics.get_category_statistics()
         language_stats = analytics.get_language_statistics()
         status_stats = analytics.get_status_statistics()
 
-        return jsonify({
+        return {
             'total_reports': category_stats['total_reports'],
-            'unique_categories': category_stats['unique_categories'],
-            'most_common_category': category_stats['most_common_category'],
+            'unique_categories': category_stats.get('unique_categories', 0),
+            'most_common_category': category_stats.get('most_common_category'),
             'languages': len(language_stats.get('language_counts', {})),
             'pending_reports': status_stats.get('pending_count', 0),
-            'finalized_reports': status_stats.get('finalized_count', 0)
-        }), 200
+            'finalized_reports': status_stats.get('finalized_count', 0),
+            'duplicates_suppressed': duplicates.count_suppressed(analytics_session())
+        }
+
+    try:
+        return jsonify(analytics_cache.get_or_compute('summary', compute)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _day_window():
+    """[since, until) dates from the from/to (ISO dates, both included) or days parameters"""
+    args = request.args
+    try:
+        days = int(args.get('days') or 30)
+        until = date.fromisoformat(args['to']) if args.get('to') else datetime.utcnow().date()
+        until += timedelta(days=1)
+        since = date.fromisoformat(args['from']) if args.get('from') else until - timedelta(days=days)
+    except (ValueError, OverflowError) as e:
+        # OverflowError: dates at the ends of the calendar, e.g. to=9999-12-31
+        raise ValueError(f'Invalid window: {e}') from e
+    if days < 1 or since >= until:
+        raise ValueError('The window must cover at least one day')
+    return since, until
+
+
+def _latency_args():
+    """(since, until, by, quantiles, filters) from the latency query parameters"""
+    args = request.args
+    since, until = _day_window()
+    try:
+        quantiles = tuple(float(q) for q in args.get('q', '').split(',') if q.strip())
+    except ValueError as e:
+        raise ValueError(f'Invalid quantiles: {e}') from e
+    by = tuple(name for name in args.get('by', '').split(',') if name)
+    if not all(0 <= q <= 1 for q in quantiles) or len(quantiles) > 10:
+        raise ValueError('Give up to 10 quantiles between 0 and 1')
+    if any(name not in ('type', 'language') for name in by):
+        raise ValueError('by must be type, language or both')
+    filters = {name: args[name] for name in ('type', 'language') if args.get(name)}
+    return since, until, by, quantiles or latency.DEFAULT_QUANTILES, filters
+
+
+@reports_bp.route('/analytics/latency', methods=['GET'])
+def get_latency_analytics():
+    """Time from submission to finalization (p50, p90 and p99 by default)
+
+    Query parameters: from/to (ISO dates, both included) or days (default
+    30), by (type, language or type,language), type and language filters,
+    and q (quantiles, e.g. 0.5,0.95). Percentiles are within 1% of the
+    exact ones.
+    """
+    try:
+        since, until, by, quantiles, filters = _latency_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key = f"latency:{since}:{until}:{','.join(by)}:{quantiles}:{sorted(filters.items())}"
+    try:
+        return jsonify(analytics_cache.get_or_compute(
+            key, lambda: ReportAnalytics().get_review_latency(
+                since, until, by, quantiles, **filters))), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/analytics/hotspots', methods=['GET'])
+def get_hotspot_analytics():
+    """Locations with the most reports
+
+    Query parameters: from/to (ISO dates, both included) or days (default
+    30), type, limit (default 10), and cell=<precision> to rank geohash
+    cells of that many characters (of reports located by coordinates)
+    instead of canonical locations.
+    """
+    try:
+        since, until = _day_window()
+        limit = int(request.args.get('limit') or 10)
+        cell = int(request.args.get('cell') or 0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    max_limit = current_app.config.get('HOTSPOTS_MAX_LIMIT', 100)
+    max_cell = current_app.config.get('LOCATION_GEOHASH_PRECISION', 7)
+    if not 1 <= limit <= max_limit or not 0 <= cell <= max_cell:
+        return jsonify({'error': f'limit must be 1-{max_limit} and cell 0-{max_cell}'}), 400
+    type_ = request.args.get('type') or None
+
+    key = f'hotspots:{since}:{until}:{type_}:{limit}:{cell}'
+    try:
+        return jsonify(analytics_cache.get_or_compute(
+            key, lambda: ReportAnalytics().get_hotspots(
+                since, until, limit, type_=type_, cell_precision=cell or None))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@reports_bp.route('/events', methods=['GET'])
+def report_events():
+    """Server-sent events with the report counters changed by each commit
+
+    Load the statistics once, then apply the 'counts' deltas; reload on a
+    'reset' event. Resumes after the Last-Event-ID header (or the
+    lastEventId query parameter).
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        frames = event_broker.stream(last_event_id)
+    except TooManySubscribers:
+        response = jsonify({'error': 'Too many event streams, retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return Response(frames, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stops nginx from buffering the stream
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@reports_bp.route('/analytics/cache', methods=['GET'])
+def get_analytics_cache_stats():
+    """Get analytics cache hit/miss/eviction counters"""
+    return jsonify(analytics_cache.stats()), 200
@@ -0,0 +1,385 @@
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import func, or_, text, bindparam, tuple_
+from sqlalchemy.orm import load_only
+from extensions import db
+from models import ArchivedReport, Report
+from pagination import LIST_COLUMNS
+
+# Postgres text search configuration per report language. Languages without
+# a snowball stemmer (or on servers that lack one) use 'simple'. Keep in sync
+# with the add_report_search migration.
+LANGUAGE_CONFIGS = {
+    'en': 'english',
+    'es': 'spanish',
+    'fr': 'french',
+    'hi': 'hindi',
+    'ta': 'tamil',
+}
+
+# Relative weight of the searchable columns
+WEIGHTS = {'description': 4.0, 'notes': 2.0, 'location': 1.0}
+
+# Snippet markers, replaced by <mark> once the text is escaped
+_START, _STOP = '\x02', '\x03'
+
+# A "quoted phrase" (a missing closing quote runs to the end) or a bare term,
+# either of which may be negated with a leading -
+_TOKEN = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+MAX_TERMS = 16
+
+# Function words dropped from SQLite queries that have other terms (the
+# Postgres configurations drop their own); they match most reports and
+# would dominate the cost of ranking
+STOPWORDS = frozenset(
+    'a an and are as at be by for from in is it of on or the to was were with '
+    'de del el en la las los un una y que se por con para al '
+    'le les des du et un une est dans pour sur au aux'.split())
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def _phrase(words):
+    return '"' + ' '.join(words) + '"'
+
+
+def fts5_query(q, language=None):
+    """Translate a web-style query into an FTS5 MATCH expression
+
+    Terms are ANDed; "quoted phrases", OR between terms, -term to exclude
+    and term* for prefixes are supported. Anything else is matched as
+    plain text, so user input can never be an FTS5 syntax error.
+    """
+    positive, negative, stopwords = [], [], []
+    for negated, quoted, word in _TOKEN.findall(q)[:MAX_TERMS]:
+        if word == 'OR':
+            if positive and positive[-1] != 'OR':
+                positive.append('OR')
+            continue
+        if word.startswith('-') and len(word) > 1:
+            negated, word = '-', word[1:]
+        prefix = word.endswith('*')
+        words = (quoted or word).replace('"', ' ').replace('*', ' ').split()
+        if not any(c.isalnum() for c in ''.join(words)):
+            continue
+        term = _phrase(words) + ('*' if prefix else '')
+        if not (quoted or prefix or negated) and word.lower() in STOPWORDS:
+            stopwords.append(term)
+            continue
+        (negative if negated else positive).append(term)
+    while positive and positive[-1] == 'OR':
+        positive.pop()
+    if not positive:
+        positive = stopwords
+    if not positive:
+        raise InvalidQuery('Enter at least one search term')
+
+    expr = ' '.join(positive)
+    if negative:
+        expr = f'({expr}) NOT ' + ' NOT '.join(negative)
+    match = '{' + ' '.join(WEIGHTS) + '} : (' + expr + ')'
+    if language:
+        match += ' AND language : ' + _phrase([language])
+    return match
+
+
+def _highlight(fragment):
+    """HTML-safe snippet with the matches wrapped in <mark>"""
+    if not fragment:
+        return Markup('')
+    return Markup(str(escape(fragment)).replace(_START, '<mark>').replace(_STOP, '</mark>'))
+
+
+# SQLite: FTS5 table report_search, kept in sync by triggers on reports, and
+# report_archive_search, filled by archive.move (archived text is compressed)
+_SQLITE_INDEXES = (('report_search', 'report_search_docs'),
+                   ('report_archive_search', 'report_archive_search_docs'))
+
+# Only the newest :window matches are scored: docids grow with submission
+# (or archiving) order, so the floor is found by walking the match list backwards
+_SQLITE_RANKED = f"""
+    SELECT d.report_id, s.score, s.docid FROM (
+        SELECT rowid AS docid, -bm25({{index}}, {', '.join(map(str, WEIGHTS.values()))}, 0) AS score
+        FROM {{index}} WHERE {{index}} MATCH :match AND rowid >= coalesce((
+            SELECT rowid FROM {{index}} WHERE {{index}} MATCH :match
+            ORDER BY rowid DESC LIMIT 1 OFFSET :window), 0)
+        ORDER BY score DESC LIMIT :limit
+    ) AS s JOIN {{docs}} AS d ON d.docid = s.docid
+    ORDER BY s.score DESC
+"""
+
+# One pass over the docid range of the page: looking docids up one by one
+# would expand prefix terms again for each of them
+_SQLITE_SNIPPETS = """
+    SELECT rowid, snippet({index}, -1, :start, :stop, '…', :words)
+    FROM {index} WHERE {index} MATCH :match
+        AND rowid BETWEEN :first AND :last AND +rowid IN :docids
+"""
+
+
+def _sqlite_search(session, q, language, limit, offset, window, snippet_words):
+    # Each index ranks its own newest matches; the top of both makes the page
+    ranked = []
+    for index, docs in _SQLITE_INDEXES:
+        ranked += [(report_id, score, index, docid) for report_id, score, docid in session.execute(
+            text(_SQLITE_RANKED.format(index=index, docs=docs)),
+            {'match': fts5_query(q, language), 'window': window, 'limit': offset + limit})]
+    ranked = sorted(ranked, key=lambda hit: -hit[1])[offset:offset + limit]
+    snippets = {}
+    for index, _ in _SQLITE_INDEXES:
+        docids = {docid: report_id for report_id, _, hit_index, docid in ranked if hit_index == index}
+        if not docids:
+            continue
+        # Without the language filter, so snippets never pick the language column
+        by_docid = dict(session.execute(
+            text(_SQLITE_SNIPPETS.format(index=index)).bindparams(bindparam('docids', expanding=True)),
+            {'match': fts5_query(q), 'docids': list(docids), 'first': min(docids),
+             'last': max(docids), 'start': _START, 'stop': _STOP, 'words': snippet_words}).all())
+        snippets.update((report_id, by_docid.get(docid)) for docid, report_id in docids.items())
+    return [(report_id, score) for report_id, score, _, _ in ranked], snippets
+
+
+# Postgres: generated tsvector column reports.search_vector with a GIN index,
+# and a plain one on report_archive filled by archive.move
+
+_pg_configs_by_url = {}
+
+
+def _pg_configs(session):
+    """LANGUAGE_CONFIGS limited to the configurations this server has"""
+    url = str(session.get_bind().url)
+    if url not in _pg_configs_by_url:
+        available = set(session.execute(text('SELECT cfgname FROM pg_ts_config')).scalars())
+        _pg_configs_by_url[url] = {lang: config for lang, config in LANGUAGE_CONFIGS.items()
+                                   if config in available}
+    return _pg_configs_by_url[url]
+
+
+# ts_rank_cd weights of the {D, C, B, A} labels; the migration labels
+# description A, notes B and location C
+_PG_WEIGHTS = '{%s}' % ', '.join(
+    str(w / WEIGHTS['description']) for w in (0.0, WEIGHTS['location'], WEIGHTS['notes'],
+                                              WEIGHTS['description']))
+
+
+def _pg_config_sql(configs, column='language'):
+    cases = ' '.join(f"WHEN '{lang}' THEN '{config}'::regconfig"
+                     for lang, config in configs.items())
+    return f"CASE {column} {cases} ELSE 'simple'::regconfig END"
+
+
+def _pg_vector_sql(configs):
+    """tsvector of bound text parameters, as the generated reports column computes it"""
+    config = _pg_config_sql(configs, 'CAST(:language AS text)')
+    return ' || '.join(
+        f"setweight(to_tsvector({config}, coalesce(CAST(:{column} AS text), '')), '{weight}')"
+        for column, weight in (('description', 'A'), ('notes', 'B'), ('location', 'C')))
+
+
+def _postgres_search(session, q, language, limit, offset, window, snippet_words):
+    configs = _pg_configs(session)
+    if language:
+        query_sql = f"websearch_to_tsquery('{configs.get(language, 'simple')}', :q)"
+    else:
+        # Each row is stemmed with its own language's configuration
+        query_sql = ' || '.join(f"websearch_to_tsquery('{config}', :q)"
+                                for config in sorted(set(configs.values()) | {'simple'}))
+    where = 'search_vector @@ query' + (' AND language = :language' if language else '')
+    # Each table ranks its own newest matches; the top of both makes the page
+    ranked = session.execute(text(f"""
+        SELECT id, score FROM (
+            SELECT id, ts_rank_cd('{_PG_WEIGHTS}'::float4[], search_vector, query, 32) AS score
+            FROM (
+                SELECT id, search_vector, query FROM reports, {query_sql} AS query
+                WHERE {where}
+                ORDER BY timestamp DESC LIMIT :window
+            ) AS recent
+            UNION ALL
+            SELECT id, ts_rank_cd('{_PG_WEIGHTS}'::float4[], search_vector, query, 32) AS score
+            FROM (
+                SELECT id, search_vector, query FROM report_archive, {query_sql} AS query
+                WHERE {where}
+                ORDER BY timestamp DESC LIMIT :window
+            ) AS archived
+        ) AS hits
+        ORDER BY score DESC, id LIMIT :limit OFFSET :offset
+    """), {'q': q, 'language': language, 'window': window,
+          'limit': limit, 'offset': offset}).all()
+    snippets = {}
+    if ranked:
+        options = f'StartSel={_START}, StopSel={_STOP}, MaxWords={snippet_words}, ' \
+                  f'MinWords={max(1, snippet_words // 3)}, MaxFragments=2'
+        ids = [report_id for report_id, _ in ranked]
+        snippets = dict(session.execute(text(f"""
+            SELECT id, ts_headline({_pg_config_sql(configs)},
+                                   description || ' ' || coalesce(notes, ''), query, :options)
+            FROM reports, {query_sql} AS query
+            WHERE id IN :ids
+        """).bindparams(bindparam('ids', expanding=True)),
+            {'q': q, 'options': options, 'ids': ids}).all())
+        # Archived text is compressed, so it is highlighted from Python's copy
+        for report in session.query(ArchivedReport).filter(
+                ArchivedReport.id.in_([report_id for report_id in ids if report_id not in snippets])):
+            snippets[report.id] = session.execute(text(f"""
+                SELECT ts_headline({_pg_config_sql(configs, 'CAST(:language AS text)')},
+                                   :text, query, :options)
+                FROM {query_sql} AS query
+            """), {'q': q, 'options': options, 'language': report.language,
+                  'text': report.description + ' ' + (report.notes or '')}).scalar()
+    return ranked, snippets
+
+
+# Other databases: ILIKE over the reports table, without the archive (its
+# text is compressed). Only the newest :window matches are ranked, by the
+# weights of the columns each term appears in.
+
+def _like_terms(q):
+    """([term, ...], [excluded term, ...]) of a web-style query"""
+    terms, excluded = [], []
+    for negated, quoted, word in _TOKEN.findall(q)[:MAX_TERMS]:
+        if word == 'OR':
+            continue
+        if word.startswith('-') and len(word) > 1:
+            negated, word = '-', word[1:]
+        phrase = ' '.join((quoted or word).replace('"', ' ').replace('*', ' ').split())
+        if any(c.isalnum() for c in phrase):
+            (excluded if negated else terms).append(phrase)
+    if not terms:
+        raise InvalidQuery('Enter at least one search term')
+    return terms, excluded
+
+
+def _like_snippet(text, terms, words):
+    """About `words` words of `text` from just before the first match, matches marked"""
+    pattern = re.compile('|'.join(map(re.escape, sorted(terms, key=len, reverse=True))), re.I)
+    tokens = pattern.sub(lambda m: _START + m.group(0) + _STOP, text).split()
+    first = next((i for i, token in enumerate(tokens) if _START in token), 0)
+    begin = max(0, first - words // 3)
+    fragment = ' '.join(tokens[begin:begin + words])
+    if fragment.count(_START) > fragment.count(_STOP):
+        fragment += _STOP
+    return ('…' if begin else '') + fragment + ('…' if begin + words < len(tokens) else '')
+
+
+def _like_search(session, q, language, limit, offset, window, snippet_words):
+    terms, excluded = _like_terms(q)
+    columns = {name: getattr(Report, name) for name in WEIGHTS}
+
+    def contains(term):
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', term) + '%'
+        return or_(*(func.coalesce(column, '').ilike(pattern, escape='\\')
+                     for column in columns.values()))
+    query = (session.query(Report.id, *columns.values())
+             .filter(*map(contains, terms), *(~contains(term) for term in excluded)))
+    if language:
+        query = query.filter(Report.language == language)
+    scored = []
+    for row in query.order_by(Report.timestamp.desc()).limit(window):
+        score = sum(weight for term in terms for name, weight in WEIGHTS.items()
+                    if term.lower() in (getattr(row, name) or '').lower())
+        scored.append((row, score))
+    # Stable, so equal scores stay newest first
+    page = sorted(scored, key=lambda hit: -hit[1])[offset:offset + limit]
+    snippets = {row.id: _like_snippet(row.description + ' ' + (row.notes or ''), terms,
+                                      snippet_words) for row, _ in page}
+    return [(row.id, score) for row, score in page], snippets
+
+
+def search_reports(q, language=None, limit=20, offset=0, window=10000, snippet_words=16,
+                   session=None):
+    """Rank reports matching `q` by relevance
+
+    Searches description, notes and location, optionally within one
+    language. Scoring costs time per matching report, so a query matching
+    more than `window` reports ranks only the newest `window` of them.
+    Returns (hits, has_more); each hit is a dict with the report (list
+    columns only), its score and an HTML-safe highlighted snippet.
+    """
+    session = session or db.session
+    q = (q or '').strip()
+    if not q:
+        raise InvalidQuery('Enter at least one search term')
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        ranked, snippets = _sqlite_search(session, q, language, limit + 1, offset, window,
+                                           snippet_words)
+    elif dialect == 'postgresql':
+        ranked, snippets = _postgres_search(session, q, language, limit + 1, offset, window,
+                                             snippet_words)
+    else:
+        ranked, snippets = _like_search(session, q, language, limit + 1, offset, window,
+                                        snippet_words)
+
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+    reports = {}
+    for model in (Report, ArchivedReport):
+        missing = [report_id for report_id, _ in ranked if report_id not in reports]
+        if missing:
+            reports.update((r.id, r) for r in (
+                session.query(model)
+                .options(load_only(*(getattr(model, column.key) for column in LIST_COLUMNS)))
+                .filter(model.id.in_(missing))))
+    hits = [{'report': reports[report_id], 'score': float(score),
+             'snippet': _highlight(snippets.get(report_id))}
+            for report_id, score in ranked if report_id in reports]
+    return hits, has_more
+
+
+def index_archived(reports, session=None):
+    """Add reports just moved into the archive to its search index
+
+    `reports` are mappings with the id, plain description and notes,
+    location and language of each report. Archived text is stored
+    compressed, out of reach of triggers, so archive.move calls this in
+    the transaction that moves the reports.
+    """
+    session = session or db.session
+    rows = [{column: report[column] for column in ('id', 'description', 'notes', 'location',
+                                                   'language')} for report in reports]
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        session.execute(text('INSERT INTO report_archive_search_docs (report_id) VALUES (:id)'),
+                        rows)
+        session.execute(text(
+            'INSERT INTO report_archive_search (rowid, description, notes, location, language) '
+            'SELECT docid, :description, :notes, :location, :language '
+            'FROM report_archive_search_docs WHERE report_id = :id'), rows)
+    elif dialect == 'postgresql':
+        session.execute(text(f'UPDATE report_archive SET search_vector = '
+                             f'{_pg_vector_sql(_pg_configs(session))} WHERE id = :id'), rows)
+
+
+def rebuild(session=None, chunk_size=1000):
+    """Re-index every report and archived report (after a bulk load with the triggers disabled)"""
+    session = session or db.session
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        session.execute(text('DELETE FROM report_search_docs'))
+        session.execute(text('INSERT INTO report_search_docs (report_id) '
+                             'SELECT id FROM reports ORDER BY timestamp, id'))
+        session.execute(text("INSERT INTO report_search (report_search) VALUES ('rebuild')"))
+        session.execute(text('DELETE FROM report_archive_search'))
+        session.execute(text('DELETE FROM report_archive_search_docs'))
+    elif dialect == 'postgresql':
+        # The tsvector column is generated; only the index can need rebuilding
+        session.execute(text('REINDEX INDEX ix_reports_search_vector'))
+    else:
+        return
+    columns = ('timestamp', 'id', 'description', 'notes', 'location', 'language')
+    key = tuple_(ArchivedReport.timestamp, ArchivedReport.id)
+    last = None
+    while True:
+        query = session.query(*(getattr(ArchivedReport, column) for column in columns))
+        if last is not None:
+            query = query.filter(key > last)
+        rows = query.order_by(ArchivedReport.timestamp, ArchivedReport.id).limit(chunk_size).all()
+        if not rows:
+            break
+        index_archived([row._mapping for row in rows], session)
+        last = (rows[-1].timestamp, rows[-1].id)
+    session.commit()
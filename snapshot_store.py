@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from filelocks import try_lock
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+# Analytic columns kept in the snapshot; type, language and status are
+# dictionary-encoded
+COLUMNS = ('id', 'timestamp', 'type', 'language', 'status', 'finalized')
+# Columns handed to pandas, in SnapshotAggregator's layout
+FRAME_COLUMNS = ['type', 'language', 'status', 'finalized', 'timestamp']
+
+
+def _schema():
+    import pyarrow as pa
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('id', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+        ('type', category),
+        ('language', category),
+        ('status', category),
+        ('finalized', pa.bool_()),
+    ])
+
+
+def _month(day):
+    return f'{day:%Y-%m}'
+
+
+def _at_or_after(table, since):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    return table.filter(pc.greater_equal(table['timestamp'],
+                                         pa.scalar(since, type=pa.timestamp('us'))))
+
+
+class SnapshotStore:
+    """Columnar snapshot of the analytic report columns on local disk
+
+    Reports are materialized into Arrow IPC files partitioned by month of
+    `timestamp`, under a generation directory named in manifest.json. A
+    refresh appends the reports newer than the timestamp watermark as new
+    part files; a full refresh writes a new generation and swaps the
+    manifest. Readers memory-map only the months they need, so trend
+    queries over the snapshot do not touch the reports table.
+
+    Type and timestamp never change after submission, so trend series from
+    the snapshot are exact up to the watermark. Status and finalized are as
+    of the last full refresh.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ANALYTICS_SNAPSHOT_ENABLED', False)
+        self.directory = app.config.get('ANALYTICS_SNAPSHOT_DIR') or \
+            os.path.join(app.instance_path, 'snapshots')
+        self.max_age = app.config.get('ANALYTICS_SNAPSHOT_MAX_AGE', 300)
+        self.overlap = app.config.get('ANALYTICS_SNAPSHOT_OVERLAP', 300)
+        self.max_parts = app.config.get('ANALYTICS_SNAPSHOT_MAX_PARTS', 16)
+        if self.enabled:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                logger.warning('ANALYTICS_SNAPSHOT_ENABLED needs pyarrow; snapshots disabled')
+                self.enabled = False
+        app.extensions['snapshot_store'] = self
+
+    # Manifest
+
+    def manifest(self):
+        """The current manifest, or None before the first refresh"""
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest):
+        path = os.path.join(self.directory, MANIFEST)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def freshness(self):
+        """How current the snapshot is, for the analytics JSON"""
+        manifest = self.manifest()
+        if manifest is None:
+            return {'source': 'snapshot', 'as_of': None, 'refreshed_at': None}
+        return {
+            'source': 'snapshot',
+            'as_of': manifest['watermark'],
+            'refreshed_at': manifest['refreshed_at'],
+            'full_refreshed_at': manifest['full_refreshed_at'],
+        }
+
+    def is_stale(self):
+        manifest = self.manifest()
+        if manifest is None:
+            return True
+        refreshed_at = datetime.fromisoformat(manifest['refreshed_at'])
+        return (datetime.utcnow() - refreshed_at).total_seconds() > self.max_age
+
+    # Writing
+
+    def _lock(self):
+        """Exclusive refresh lock shared by every process; None if it is held"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, '.lock'), 'w')
+        if not try_lock(lock):
+            lock.close()
+            return None
+        return lock
+
+    def _query(self, model, since=None):
+        stmt = select(*(getattr(model, column) for column in COLUMNS))
+        if since is not None:
+            stmt = stmt.where(model.timestamp >= since)
+        return stmt.where(model.timestamp.isnot(None)).order_by(model.timestamp, model.id)
+
+    def _write_part(self, generation, month, table):
+        import pyarrow as pa
+        directory = os.path.join(self.directory, generation, month)
+        os.makedirs(directory, exist_ok=True)
+        name = f'part-{time.time_ns()}.arrow'
+        tmp = os.path.join(directory, f'.{name}')
+        # Uncompressed IPC files can be memory-mapped without a decode step
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, os.path.join(directory, name))
+        return name
+
+    def _append(self, manifest, rows):
+        """Write rows (sorted by timestamp) as one new part per month"""
+        import pyarrow as pa
+        schema = _schema()
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(_month(row[1]), []).append(row)
+        for month, month_rows in by_month.items():
+            columns = list(zip(*month_rows))
+            table = pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema)
+            parts = manifest['parts'].setdefault(month, [])
+            parts.append(self._write_part(manifest['generation'], month, table))
+            if len(parts) > self.max_parts:
+                self._compact(manifest, month)
+        if rows:
+            newest = max(row[1] for row in rows)
+            if manifest['watermark'] is None or \
+                    newest > datetime.fromisoformat(manifest['watermark']):
+                manifest['watermark'] = newest.isoformat()
+            manifest['rows'] += len(rows)
+
+    def _compact(self, manifest, month):
+        """Merge the parts of one month into a single file
+
+        The replaced parts are removed once the new manifest is written.
+        """
+        # An IPC file holds one dictionary per column
+        table = self._read_month(manifest, month).unify_dictionaries().combine_chunks()
+        self._obsolete.extend(os.path.join(self.directory, manifest['generation'], month, name)
+                              for name in manifest['parts'][month])
+        manifest['parts'][month] = [self._write_part(manifest['generation'], month, table)]
+
+    def refresh(self, full=False, session=None, chunk_size=50000):
+        """Bring the snapshot up to date; returns the number of rows added
+
+        Returns None when another process is already refreshing.
+        """
+        from database import analytics_session
+        session = session or analytics_session()
+        lock = self._lock()
+        if lock is None:
+            return None
+        self._obsolete = []
+        try:
+            manifest = self.manifest()
+            now = datetime.utcnow().isoformat()
+            if full or manifest is None:
+                previous = manifest and manifest['generation']
+                manifest = {'generation': f'gen-{time.time_ns()}', 'watermark': None,
+                            'rows': 0, 'parts': {}, 'full_refreshed_at': now}
+                since, known = None, set()
+            else:
+                # Rows committed late (write-behind, clock skew) can carry a
+                # timestamp just below the watermark; re-read an overlap
+                # window and skip the ids already stored
+                since = datetime.fromisoformat(manifest['watermark']) - \
+                    timedelta(seconds=self.overlap) if manifest['watermark'] else None
+                known = self._ids_since(manifest, since) if since else set()
+                previous = None
+
+            added = 0
+            import archive
+            # Incremental refreshes read recent reports, which are never
+            # archived; the timestamp index keeps that read of the archive cheap
+            partitions = archive.iter_merged(
+                [self._query(model, since) for model in archive.MODELS],
+                key=lambda row: (row[1], row[0]), session=session, chunk_size=chunk_size)
+            for partition in partitions:
+                rows = [row for row in partition if row[0] not in known]
+                self._append(manifest, rows)
+                added += len(rows)
+            manifest['refreshed_at'] = now
+            self._write_manifest(manifest)
+            for path in self._obsolete:
+                os.remove(path)
+            if previous:
+                # Open memory maps of the old generation stay valid after unlink
+                shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+            return added
+        finally:
+            lock.close()
+
+    # Reading
+
+    def _read_month(self, manifest, month):
+        import pyarrow as pa
+        tables = []
+        for name in manifest['parts'].get(month, []):
+            source = pa.memory_map(os.path.join(self.directory, manifest['generation'], month, name))
+            tables.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(tables) if tables else _schema().empty_table()
+
+    def _ids_since(self, manifest, since):
+        ids = set()
+        for month in sorted(manifest['parts']):
+            if month >= _month(since):
+                table = _at_or_after(self._read_month(manifest, month), since)
+                ids.update(table['id'].to_pylist())
+        return ids
+
+    def load(self, since=None):
+        """DataFrame of the snapshot (from `since` on) in SnapshotAggregator's layout
+
+        Only the partitions covering `since` are mapped; dictionary columns
+        become pandas categoricals.
+        """
+        import pyarrow as pa
+        for attempt in range(3):
+            manifest = self.manifest()
+            months = sorted(manifest['parts']) if manifest else []
+            if since is not None:
+                months = [m for m in months if m >= _month(since)]
+            try:
+                tables = [self._read_month(manifest, month) for month in months]
+                break
+            except FileNotFoundError:
+                # A refresh replaced the parts after we read the manifest
+                if attempt == 2:
+                    raise
+        table = pa.concat_tables(tables) if tables else _schema().empty_table()
+        if since is not None:
+            table = _at_or_after(table, since)
+        return table.select(FRAME_COLUMNS).unify_dictionaries().to_pandas()
+
+    def ensure_fresh(self):
+        """Refresh incrementally when the snapshot is older than the max age"""
+        if self.is_stale():
+            try:
+                self.refresh()
+            except Exception:
+                # Serve the previous snapshot rather than fail the request
+                logger.exception('Analytics snapshot refresh failed')
+
+    def aggregator(self):
+        """Aggregator over the snapshot; it refreshes the snapshot on first use"""
+        from aggregations import StoreAggregator
+        return StoreAggregator(self)
+
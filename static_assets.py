@@ -0,0 +1,165 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+import click
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+# Build output names carrying a content hash (CRA: main.3f2a1b9c.js,
+# 453.1a2b3c4d.chunk.js, logo.6ce24c58023cc2f8fd88fe9d219db6c6.svg)
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}(\.chunk)?\.[A-Za-z0-9]+$')
+# The app shell and files the browser must see changes to right away
+REVALIDATE = frozenset({'index.html', 'service-worker.js', 'asset-manifest.json',
+                        'manifest.json'})
+# Precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = frozenset({'.html', '.js', '.css', '.json', '.map', '.svg', '.txt', '.xml',
+                          '.ico', '.webmanifest'})
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Unknown paths under the server's own routes are 404s, never the shell
+SERVER_PREFIXES = ('api/', 'reports/', 'static/')
+
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+
+
+def brotli_available():
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def compress_build(directory, min_size=512, brotli=None):
+    """Write .gz (and, with the brotli package, .br) next to each text asset
+
+    Meant to run once after `npm run build`. Variants are skipped when they
+    would not be smaller and rewritten only when the asset is newer.
+    Returns {encoding: number of files written}.
+    """
+    brotli = brotli_available() if brotli is None else brotli
+    encoders = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        import brotli as brotli_module
+        encoders['br'] = lambda data: brotli_module.compress(data, quality=11)
+    written = dict.fromkeys(encoders, 0)
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE or os.path.getsize(path) < min_size:
+                continue
+            data = None
+            for encoding, suffix in ENCODINGS:
+                if encoding not in encoders:
+                    continue
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                compressed = encoders[encoding](data)
+                if len(compressed) >= len(data):
+                    continue
+                with open(target + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(target + '.tmp', target)
+                written[encoding] += 1
+    return written
+
+
+def _is_asset_path(path):
+    """Whether a missing path names a file or server route (a real 404)
+    rather than a client-side route"""
+    return path.startswith(SERVER_PREFIXES) or '.' in posixpath.basename(path)
+
+
+def _not_found():
+    return current_app.response_class('Not found', status=404, mimetype='text/plain')
+
+
+class StaticAssets:
+    """Serves the React build: precompressed variants, cache headers, SPA fallback
+
+    Files with a content hash in their name are cached for a year as
+    immutable; the shell (index.html), the service worker and the manifests
+    must be revalidated on every use; other public files get
+    STATIC_MAX_AGE. Every response supports ETag/If-None-Match and Range.
+    Missing files are 404s; any other unknown path is a client-side route
+    and gets the shell.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.root_path,
+                                      app.config.get('STATIC_BUILD_DIR') or 'client/build')
+        self.max_age = app.config.get('STATIC_MAX_AGE', 3600)
+        app.extensions['static_assets'] = self
+        app.cli.add_command(compress_static)
+
+    def cache_control(self, path):
+        """(max_age, immutable) for a file of the build"""
+        name = posixpath.basename(path)
+        if name in REVALIDATE:
+            return 0, False
+        if HASHED_NAME.search(name):
+            return IMMUTABLE_MAX_AGE, True
+        return self.max_age, False
+
+    def _variant(self, path):
+        """(file to send, content encoding) for the client's Accept-Encoding"""
+        if os.path.splitext(path)[1] not in COMPRESSIBLE:
+            return path, None
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+    def serve(self, path):
+        """Response for GET /<path>"""
+        path = path or 'index.html'
+        full_path = safe_join(self.directory, path)
+        if full_path is None or not os.path.isfile(full_path):
+            if full_path is None or _is_asset_path(path):
+                return _not_found()
+            # A client-side route: the shell boots the app, which renders it
+            path = 'index.html'
+            full_path = os.path.join(self.directory, path)
+            if not os.path.isfile(full_path):
+                return _not_found()
+
+        sent_path, encoding = self._variant(full_path)
+        max_age, immutable = self.cache_control(path)
+        mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        response = send_file(sent_path, mimetype=mimetype, conditional=True, etag=True,
+                             max_age=max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if os.path.splitext(full_path)[1] in COMPRESSIBLE:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.immutable = True
+        elif not max_age:
+            response.cache_control.no_cache = True
+        return response
+
+
+@click.command('compress-static')
+@click.option('--min-size', default=512, show_default=True,
+              help='Smallest file (bytes) worth compressing.')
+def compress_static(min_size):
+    """Precompress the React build (gzip, plus brotli when installed)."""
+    assets = current_app.extensions['static_assets']
+    if not os.path.isdir(assets.directory):
+        raise click.ClickException(f'No build at {assets.directory}; run npm run build first')
+    written = compress_build(assets.directory, min_size=min_size)
+    if 'br' not in written:
+        click.echo('brotli is not installed; wrote gzip variants only')
+    click.echo(', '.join(f'{n} {encoding}' for encoding, n in written.items()) + ' files written')
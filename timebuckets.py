@@ -0,0 +1,293 @@
+import math
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import case, func
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+# Bucket labels, as returned by the SQL bucket expressions and used in JSON
+KEY_FORMATS = {
+    'hour': '%Y-%m-%dT%H:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',
+    'month': '%Y-%m-%d',
+}
+_POSTGRES_FORMATS = {
+    'hour': 'YYYY-MM-DD"T"HH24:00',
+    'day': 'YYYY-MM-DD',
+    'week': 'YYYY-MM-DD',
+    'month': 'YYYY-MM-DD',
+}
+
+DEFAULT_MAX_POINTS = 120
+# Longest window a trend request may ask for
+MAX_RANGE = timedelta(days=366 * 50)
+
+
+class InvalidWindow(ValueError):
+    pass
+
+
+def _parse_time(value, name, tz):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as e:
+        raise InvalidWindow(f'Invalid {name}: {value}') from e
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _floor(local, granularity):
+    if granularity == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next(local, granularity):
+    if granularity == 'day':
+        return local + timedelta(days=1)
+    if granularity == 'week':
+        return local + timedelta(days=7)
+    if local.month == 12:
+        return local.replace(year=local.year + 1, month=1)
+    return local.replace(month=local.month + 1)
+
+
+class TrendWindow:
+    """Time range, bucket size and timezone of a trend series
+
+    `start` and `end` are naive UTC datetimes, like Report.timestamp; the
+    window covers [start, end) with `start` floored to the first local
+    bucket boundary. With granularity 'auto' the finest granularity that
+    fits in `max_points` buckets is used. An explicit granularity that does
+    not fit is coarsened, and beyond months adjacent buckets are merged
+    `merge` at a time, so a series never has more than `max_points` points.
+    """
+
+    def __init__(self, start, end, granularity='auto', tz='UTC',
+                 max_points=DEFAULT_MAX_POINTS, days=None):
+        if granularity != 'auto' and granularity not in GRANULARITIES:
+            raise InvalidWindow(f'Unknown granularity: {granularity}')
+        if start >= end:
+            raise InvalidWindow('The window must end after it starts')
+        if end - start > MAX_RANGE:
+            raise InvalidWindow('The window may span at most 50 years')
+        self.tz = self.zone(tz)
+        self.timezone = tz
+        self.days = days
+        self.requested = granularity
+        self.end = end
+        self.max_points = max(1, max_points)
+        self._offsets = None
+
+        candidates = GRANULARITIES if granularity == 'auto' else \
+            GRANULARITIES[GRANULARITIES.index(granularity):]
+        for candidate in candidates:
+            keys = self._bucket_keys(start, candidate)
+            if len(keys) <= self.max_points:
+                break
+        self.granularity = candidate
+        self.start = self._utc(_floor(self._local(start), candidate))
+        self.merge = math.ceil(len(keys) / self.max_points)
+        # Base buckets map onto the first bucket of their merged group
+        self.bucket_of = {key: keys[i - i % self.merge] for i, key in enumerate(keys)}
+        self.buckets = keys[::self.merge]
+
+    @staticmethod
+    def zone(name):
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            raise InvalidWindow(f'Unknown timezone: {name}') from e
+
+    @classmethod
+    def last_days(cls, days=30, granularity='auto', tz='UTC', max_points=DEFAULT_MAX_POINTS):
+        """Window over the last `days` days up to now"""
+        end = datetime.utcnow()
+        return cls(end - timedelta(days=days), end, granularity, tz, max_points, days=days)
+
+    @classmethod
+    def from_args(cls, args, max_points=DEFAULT_MAX_POINTS):
+        """Window from request args: from, to, days, granularity, tz
+
+        `from`/`to` are ISO dates or datetimes, read in `tz` unless they carry
+        an offset; a bare `to` date includes that whole day. Without `from`
+        the window covers the `days` (default 30) before `to`.
+        """
+        tz_name = args.get('tz') or 'UTC'
+        tz = cls.zone(tz_name)
+        granularity = args.get('granularity') or 'auto'
+        try:
+            days = int(args.get('days') or 30)
+        except ValueError as e:
+            raise InvalidWindow(f"Invalid days: {args.get('days')}") from e
+        if days < 1:
+            raise InvalidWindow('days must be at least 1')
+
+        try:
+            end = datetime.utcnow()
+            if args.get('to'):
+                end = _parse_time(args['to'], 'to', tz)
+                if len(args['to']) == 10:
+                    end += timedelta(days=1)
+            if args.get('from'):
+                start, days = _parse_time(args['from'], 'from', tz), None
+            else:
+                start = end - timedelta(days=days)
+                if args.get('to'):
+                    days = None
+            return cls(start, end, granularity, tz_name, max_points, days=days)
+        except InvalidWindow:
+            raise
+        except (OverflowError, ValueError) as e:
+            # Dates at the ends of the calendar, e.g. to=9999-12-31
+            raise InvalidWindow('The window is outside the supported date range') from e
+
+    def _local(self, utc):
+        return utc.replace(tzinfo=timezone.utc).astimezone(self.tz).replace(tzinfo=None)
+
+    def _utc(self, local):
+        return local.replace(tzinfo=self.tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+    def _bucket_keys(self, start, granularity):
+        """Labels of the local buckets covering [start, end)"""
+        fmt = KEY_FORMATS[granularity]
+        keys = []
+        if granularity == 'hour':
+            # Step in UTC so DST gaps and repeats come out right
+            utc = self._utc(_floor(self._local(start), 'hour'))
+            while utc < self.end and len(keys) <= self.max_points:
+                key = self._local(utc).strftime(fmt)
+                if not keys or keys[-1] != key:
+                    keys.append(key)
+                utc += timedelta(hours=1)
+            return keys
+        local, local_end = _floor(self._local(start), granularity), self._local(self.end)
+        while local < local_end:
+            keys.append(local.strftime(fmt))
+            local = _next(local, granularity)
+        return keys
+
+    @property
+    def key(self):
+        """Cache key; relative windows are keyed by their length"""
+        if self.days is not None:
+            span = f'{self.days}d'
+        else:
+            span = f'{self.start.isoformat()}/{self.end.isoformat()}'
+        return f'{span}:{self.requested}:{self.timezone}:{self.max_points}'
+
+    def describe(self):
+        """The window as reported alongside a series
+
+        Relative windows ("last N days") end now and report no `to`, so the
+        series, and the chart job hashed from it, stay stable between requests.
+        """
+        return {
+            'days': self.days,
+            'from': self.start.isoformat(),
+            'to': None if self.days is not None else self.end.isoformat(),
+            'granularity': self.granularity,
+            'buckets_merged': self.merge,
+            'timezone': self.timezone,
+        }
+
+    # SQL bucketing
+
+    def utc_offsets(self):
+        """[(utc_until, offset_minutes), ...] for the window; the last until is None
+
+        Lets SQL convert timestamps to local time with fixed offsets even
+        when the window crosses DST changes.
+        """
+        if self._offsets is not None:
+            return self._offsets
+
+        def offset(utc):
+            local = utc.replace(tzinfo=timezone.utc).astimezone(self.tz)
+            return int(local.utcoffset() / timedelta(minutes=1))
+
+        segments = []
+        current = offset(self.start)
+        day = self.start
+        while day < self.end:
+            following = min(day + timedelta(days=1), self.end)
+            if offset(following) != current:
+                # Bisect the day down to the minute of the change
+                low, high = day, following
+                while high - low > timedelta(minutes=1):
+                    middle = low + (high - low) / 2
+                    low, high = (middle, high) if offset(middle) == current else (low, middle)
+                segments.append((high.replace(second=0, microsecond=0), current))
+                current = offset(high)
+            day = following
+        segments.append((None, current))
+        self._offsets = segments
+        return segments
+
+    @property
+    def utc_aligned(self):
+        """True when local days coincide with UTC days over the whole window"""
+        return all(minutes == 0 for _, minutes in self.utc_offsets())
+
+    def bucket_sql(self, column, dialect, convert=True):
+        """SQL expression labelling `column` with its local bucket
+
+        `column` holds naive UTC datetimes; with convert=False it is used as
+        is (for the UTC day column of the rollups).
+        """
+        if dialect == 'postgresql':
+            local = func.timezone(self.timezone, func.timezone('UTC', column)) if convert else column
+            return func.to_char(func.date_trunc(self.granularity, local),
+                                _POSTGRES_FORMATS[self.granularity])
+        if dialect != 'sqlite':
+            raise ValueError(f'No SQL bucketing for {dialect}')
+
+        local = column
+        if convert:
+            shifted = [(until, func.datetime(column, f'{minutes:+d} minutes'))
+                       for until, minutes in self.utc_offsets()]
+            if len(shifted) == 1:
+                local = shifted[0][1] if self.utc_offsets()[0][1] else column
+            else:
+                local = case(*((column < until, expr) for until, expr in shifted[:-1]),
+                             else_=shifted[-1][1])
+        if self.granularity == 'hour':
+            return func.strftime(KEY_FORMATS['hour'], local)
+        if self.granularity == 'day':
+            return func.date(local)
+        if self.granularity == 'week':
+            # Monday of the week
+            return func.date(local, 'weekday 0', '-6 days')
+        return func.strftime('%Y-%m-01', local)
+
+    def bucket_frame(self, timestamps):
+        """Local bucket labels for a pandas Series of naive UTC timestamps"""
+        import pandas as pd
+        local = timestamps.dt.tz_localize('UTC').dt.tz_convert(self.tz).dt.tz_localize(None)
+        if self.granularity == 'hour':
+            floored = local.dt.floor('h')
+        else:
+            floored = local.dt.normalize()
+            if self.granularity == 'week':
+                floored = floored - pd.to_timedelta(local.dt.weekday, unit='D')
+            elif self.granularity == 'month':
+                floored = floored.dt.to_period('M').dt.start_time
+        return floored.dt.strftime(KEY_FORMATS[self.granularity])
+
+    def collect(self, rows):
+        """Sum (bucket, [type,] count) rows into the window's buckets"""
+        totals = {}
+        for *group, count in rows:
+            bucket = self.bucket_of.get(str(group[0]))
+            if bucket is None:
+                continue
+            key = (bucket, *group[1:])
+            totals[key] = totals.get(key, 0) + int(count)
+        return [(*key, count) for key, count in sorted(totals.items()) if count]
@@ -0,0 +1,219 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from filelocks import try_lock
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """Raised when the write-behind queue cannot take another report"""
+
+
+class ReportWriteBuffer:
+    """Write-behind buffer that group-commits report submissions
+
+    Submissions get their id immediately, are appended to a per-process
+    spill file (fsynced before the caller acknowledges them) and queued in
+    memory. A background writer inserts the queue in batches every
+    flush interval or batch size, whichever comes first. After a crash the
+    spill files of dead processes are replayed on the next start; rows keep
+    their ids, so replaying an already committed report is a no-op.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self._thread = None
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('REPORT_WRITE_BEHIND', False)
+        self.queue_size = app.config.get('REPORT_WRITE_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('REPORT_WRITE_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('REPORT_WRITE_FLUSH_MS', 50) / 1000
+        self.spill_dir = app.config.get('REPORT_SPILL_DIR') or \
+            os.path.join(app.instance_path, 'spill')
+        self.app = app
+        app.extensions['report_write_buffer'] = self
+
+    def _start(self):
+        """Open this process' spill file, replay orphans and start the writer"""
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pending = {}
+            self._pending_lock = threading.Lock()
+            self._spill_lock = threading.Lock()
+            self._sync_lock = threading.Lock()
+            self._written = self._synced = self._committed = 0
+
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self.replay()
+            self._spill_path = os.path.join(self.spill_dir, f'reports-{self._pid}.ndjson')
+            self._spill = open(self._spill_path, 'a+b')
+            # Held for the life of the process so that replay() skips live files
+            if not try_lock(self._spill):
+                raise RuntimeError(f'Spill file {self._spill_path} is locked by another process')
+
+            self._thread = threading.Thread(target=self._run, name='report-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def submit(self, fields):
+        """Durably accept a validated report
+
+        Returns (report_id, created); created is False when a report with
+        the same client id is already queued. Raises BufferFull when the
+        queue is at capacity.
+        """
+        from ingest import new_row
+        self._start()
+        row = new_row(fields)
+        line = json.dumps(dict(row, timestamp=row['timestamp'].isoformat())).encode() + b'\n'
+        with self._spill_lock:
+            if row['client_id']:
+                queued_id = self._find_client_id(row['client_id'])
+                if queued_id:
+                    return queued_id, False
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                raise BufferFull()
+            with self._pending_lock:
+                self._pending[row['id']] = row
+            self._spill.write(line)
+            self._written += 1
+            sequence = self._written
+        self._sync(sequence)
+        return row['id'], True
+
+    def _sync(self, sequence):
+        """fsync the spill file; concurrent submitters share one fsync"""
+        with self._sync_lock:
+            if self._synced >= sequence:
+                return
+            with self._spill_lock:
+                self._spill.flush()
+                target = self._written
+            os.fsync(self._spill.fileno())
+            self._synced = target
+
+    def pending(self, report_id):
+        """The queued row for `report_id` if it has not been written yet"""
+        if self._thread is None:
+            return None
+        with self._pending_lock:
+            return self._pending.get(report_id)
+
+    def _find_client_id(self, client_id):
+        with self._pending_lock:
+            for row in self._pending.values():
+                if row['client_id'] == client_id:
+                    return row['id']
+        return None
+
+    def _next_batch(self):
+        rows = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while True:
+            rows = self._next_batch()
+            while True:
+                try:
+                    with self.app.app_context():
+                        self._write(rows)
+                    break
+                except Exception:
+                    # The rows stay in the spill file; keep retrying
+                    logger.exception('Report write-behind flush failed, retrying')
+                    time.sleep(1)
+            with self._pending_lock:
+                for row in rows:
+                    self._pending.pop(row['id'], None)
+            self._committed += len(rows)
+            self._truncate_spill()
+
+    def _write(self, rows):
+        # Imported here: extensions.py creates the buffer before db exists
+        from ingest import insert_rows
+        try:
+            insert_rows(rows)
+        except IntegrityError:
+            # A duplicate client id (or a replayed row) in the batch; fall
+            # back to row-by-row inserts and skip the conflicting ones
+            for row in rows:
+                try:
+                    insert_rows([row])
+                except IntegrityError:
+                    logger.warning('Skipping duplicate report %s', row['id'])
+
+    def _truncate_spill(self):
+        """Empty the spill file once everything in it is committed"""
+        with self._spill_lock:
+            if self._committed == self._written:
+                self._spill.truncate(0)
+                self._spill.flush()
+                self._written = self._synced = self._committed = 0
+
+    def flush(self, timeout=10):
+        """Wait until the queue is drained (used on shutdown and in benchmarks)"""
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._pending_lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def replay(self):
+        """Insert the rows of spill files left behind by dead processes"""
+        replayed = 0
+        for path in glob.glob(os.path.join(self.spill_dir, 'reports-*.ndjson')):
+            with open(path, 'r+b') as f:
+                if not try_lock(f):
+                    continue  # owned by a live process
+                rows = []
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from the crash
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                    rows.append(row)
+                if rows:
+                    from extensions import db
+                    from models import Report
+                    with self.app.app_context():
+                        stored = {id_ for (id_,) in db.session.query(Report.id)
+                                  .filter(Report.id.in_([r['id'] for r in rows]))}
+                        missing = [r for r in rows if r['id'] not in stored]
+                        for start in range(0, len(missing), self.batch_size):
+                            self._write(missing[start:start + self.batch_size])
+                        replayed += len(missing)
+            os.remove(path)
+        if replayed:
+            logger.info('Replayed %d spilled reports', replayed)
+        return replayed